@@ -0,0 +1,130 @@
+"""Soğuk başlangıç ve yeniden çalıştırma (rerun) süresi ölçümü.
+
+Her örnek için taze bir Python süreci açar ve sayfayı Streamlit AppTest ile
+tarayıcısız çalıştırır. Ölçülenler: karşılama sayfasının ilk çalıştırması,
+ana sayfanın ilk çalıştırması, her iki sayfada rerun süreleri ve hangi ağır
+modüllerin yüklendiği.
+
+    python bench_startup.py --samples 5 --reruns 20 --output startup.json
+    python bench_startup.py --baseline startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "akıllı_ev.py")
+HEAVY_MODULES = ["numpy", "openai", "speech_recognition", "streamlit_mic_recorder", "tiktoken"]
+
+
+def worker(reruns, history=0):
+    """Tek bir soğuk süreçte ölçüm yapar; sonucu JSON olarak stdout'a yazar."""
+    if history:
+        # Uzun oturum senaryosu gerçek yolları izlesin diye sahte HA ve LLM sunucuları bu süreçte açılır
+        from stub_servers import FakeHomeAssistant, FakeLLM
+        ha, llm = FakeHomeAssistant().start(), FakeLLM().start()
+        os.environ.update(HA_URL=ha.base_url, HA_TOKEN=ha.token, HA_WS_URL=ha.ws_url, GROK_BASE_URL=llm.base_url)
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    result = {"streamlit_import": time.perf_counter() - start}
+
+    def timed_run(at):
+        t0 = time.perf_counter()
+        at.run()
+        if at.exception: raise RuntimeError(at.exception[0].value)
+        return time.perf_counter() - t0
+
+    at = AppTest.from_file(APP, default_timeout=60)
+    result["welcome_first"] = timed_run(at)
+    result["welcome_modules"] = [m for m in HEAVY_MODULES if m in sys.modules]
+    result["welcome_reruns"] = [timed_run(at) for _ in range(reruns)]
+
+    at.session_state.page, at.session_state.user_name = "main_app", "Bench"
+    result["main_first"] = timed_run(at)
+    result["main_modules"] = [m for m in HEAVY_MODULES if m in sys.modules]
+    if history:
+        # Uzun oturum: rehberdeki tüm komutlar sırayla gönderilir (yerel, önbellek ve LLM yolları)
+        from catalog import COMMAND_CATEGORIES
+        from prompt_builder import count_tokens
+        commands = [cmd for cmds in COMMAND_CATEGORIES.values() for cmd in cmds]
+        for i in range(history): at.chat_input[0].set_value(commands[i % len(commands)]).run()
+        conversation = at.session_state["conversation"]
+        messages = conversation.model_history(10)
+        result["history_tokens"] = sum(count_tokens(m["content"]) for m in messages if m["role"] != "system")
+        result["summary_tokens"] = sum(count_tokens(m["content"]) for m in messages if m["role"] == "system")
+        # Karşılaştırma: ekranda gösterilen son 10 mesajın (HTML/markdown) token sayısı
+        result["display_history_tokens"] = sum(count_tokens(t.content) for t in conversation.recent(10))
+        result["rendered_messages"] = len(at.chat_message)
+    result["main_reruns"] = [timed_run(at) for _ in range(reruns)]
+    print(json.dumps(result))
+
+
+def run_samples(samples, reruns, history=0):
+    env = {**os.environ, "GROK_API_KEY": os.environ.get("GROK_API_KEY", "bench"), "METRICS_PORT": "0", "LOG_LEVEL": "WARNING"}
+    for key in ["HA_URL", "HA_TOKEN", "OPENWEATHER_API_KEY"]: env.pop(key, None)  # dış servislere çıkılmasın
+    runs = []
+    with tempfile.TemporaryDirectory() as data_dir:
+        env["DATA_DIR"] = data_dir
+        for _ in range(samples):
+            proc = subprocess.run([sys.executable, os.path.abspath(__file__), "--worker", "--reruns", str(reruns), "--history", str(history)],
+                                  capture_output=True, text=True, env=env, timeout=300)
+            if proc.returncode != 0: raise RuntimeError(f"Ölçüm süreci başarısız:\n{proc.stderr[-2000:]}")
+            runs.append(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return runs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Streamlit sayfasının soğuk başlangıç ve rerun süreleri")
+    parser.add_argument("--samples", type=int, default=5, help="soğuk süreç sayısı")
+    parser.add_argument("--reruns", type=int, default=20, help="sayfa başına rerun sayısı")
+    parser.add_argument("--history", type=int, default=0, help="rerun ölçümünden önce gönderilecek komut sayısı (uzun oturum)")
+    parser.add_argument("--output", default="startup_results.json")
+    parser.add_argument("--baseline", help="karşılaştırılacak önceki sonuç dosyası")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.worker: return worker(args.reruns, args.history)
+    # benchmark openai'yi yükler; ölçüm sürecine sızmasın diye yalnızca burada içe aktarılır
+    from benchmark import git_version, summarize
+
+    runs = run_samples(args.samples, args.reruns, args.history)
+    results = {
+        "version": git_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "samples": args.samples,
+        "reruns": args.reruns,
+        "streamlit_import": summarize([r["streamlit_import"] for r in runs]),
+        "welcome_first": summarize([r["welcome_first"] for r in runs]),
+        "main_first": summarize([r["main_first"] for r in runs]),
+        "welcome_rerun": summarize([t for r in runs for t in r["welcome_reruns"]]),
+        "main_rerun": summarize([t for r in runs for t in r["main_reruns"]]),
+        "welcome_modules": runs[0]["welcome_modules"],
+        "main_modules": runs[0]["main_modules"],
+        "history": args.history,
+    }
+    if args.history:
+        for key in ["history_tokens", "summary_tokens", "display_history_tokens", "rendered_messages"]: results[key] = runs[0][key]
+    for key in ["welcome_first", "main_first", "welcome_rerun", "main_rerun"]:
+        stats = results[key]
+        line = f"{key:<14} p50={stats['p50'] * 1000:7.1f} ms  p95={stats['p95'] * 1000:7.1f} ms"
+        if args.baseline:
+            with open(args.baseline, encoding="utf-8") as f: before = json.load(f)[key]["p50"]
+            line += f"  (önce {before * 1000:.1f} ms, {(stats['p50'] - before) / before * 100:+.1f}%)"
+        print(line)
+    print(f"karşılama sayfasında yüklü ağır modüller: {results['welcome_modules'] or '-'}")
+    print(f"ana sayfada yüklü ağır modüller: {results['main_modules'] or '-'}")
+    if args.history:
+        print(f"{args.history} komut sonrası: modele giden son 10 mesaj {results['history_tokens']} token "
+              f"(ekran metniyle {results['display_history_tokens']} token) + özet {results['summary_tokens']} token, "
+              f"çizilen mesaj {results['rendered_messages']}")
+
+    with open(args.output, "w", encoding="utf-8") as f: json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"Sonuçlar yazıldı: {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
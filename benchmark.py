@@ -0,0 +1,270 @@
+"""Tarayıcısız uçtan uca gecikme ölçümü.
+
+Komut hattını (metin/STT sonucu → prompt → LLM → ayrıştırma → HA → zamanlayıcılar)
+yerel sahte sunuculara karşı çalıştırır; p50/p95/p99 gecikmeyi ve saniyedeki
+komut sayısını raporlar, sonuçları JSON olarak yazar.
+
+    python benchmark.py --concurrency 1 4 16 --requests 200 --llm-latency 0.4 --output bench.json
+    python benchmark.py --mode llm --baseline bench.json   # önceki sürümle karşılaştır
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+
+from catalog import COMMAND_CATEGORIES
+from ha_client import HADispatcher
+from ha_state import StateMirror
+from intent import EXTRA_ALIASES, IntentMatcher
+from metrics import Metrics, runtime_collector
+from pipeline import CommandPipeline
+from plan_cache import PlanCache
+from registry import EntityRegistry
+from resilience import CircuitBreakers
+from rules import RuleEngine
+from scheduler import TimerScheduler
+from timeseries import TimeSeriesStore
+from stub_servers import FakeHomeAssistant, FakeLLM, FakeWeather
+from weather import WeatherCache
+
+STAGES = ["intent", "cache", "prompt", "llm", "first_action", "parse", "reask", "dispatch", "timers"]
+
+
+def percentile(values, pct):
+    """En yakın sıra yöntemiyle yüzdelik (boş listede None)."""
+    if not values: return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(values):
+    if not values: return {}
+    return {"p50": percentile(values, 50), "p95": percentile(values, 95), "p99": percentile(values, 99),
+            "mean": sum(values) / len(values), "max": max(values), "n": len(values)}
+
+
+def default_commands():
+    # Rehberdeki açıklamalar "(...)" LLM'e de gönderildiği gibi bırakılır
+    return [cmd for cmds in COMMAND_CATEGORIES.values() for cmd in cmds]
+
+
+def git_version():
+    try:
+        return subprocess.run(["git", "describe", "--always", "--dirty"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def build_pipeline(args, ha, llm, weather):
+    client = openai.OpenAI(api_key="bench", base_url=llm.base_url, max_retries=0, timeout=args.llm_timeout)
+    breakers = CircuitBreakers(failure_threshold=args.breaker_failures, reset_timeout=args.breaker_reset)
+    weather_cache = WeatherCache("bench", ttl=args.weather_ttl, url=weather.url, breaker=breakers.get("weather")).start()
+    mirror = StateMirror(ha.base_url, ha.token, ws_url=ha.ws_url).start() if args.mirror else None
+    registry = EntityRegistry(ha.base_url, ha.token, ws_url=ha.ws_url).attach(mirror)
+    try:
+        registry.sync()  # ölçüm uygulamadaki gibi HA'dan üretilmiş katalog ve doğrulamayla yapılır
+    except Exception as e:
+        logging.warning("Entity kayıt defteri senkronize edilemedi, katalog tohumu kullanılıyor: %s", e)
+    dispatcher = HADispatcher(ha.base_url, ha.token, names=registry.names, pool_size=args.ha_pool, max_workers=args.ha_pool,
+                              timeout=args.ha_timeout, state_mirror=mirror, breaker=breakers.get("ha"), retries=args.ha_retries)
+    scheduler = TimerScheduler(lambda timer: None)  # zamanlayıcılar kurulur ama ölçüm süresince tetiklenmez
+    local = args.mode in ["auto", "local"]
+    plan_cache = PlanCache(max_size=256) if args.mode == "auto" else None
+    timeseries = TimeSeriesStore(names=registry.names)  # bellekte; her komutun eylem kaydı ve alışkanlık özeti ölçüme dahil
+    if mirror is not None: mirror.add_listener(timeseries.on_state)
+    # Kurallar yalnızca değerlendirilir; eylemleri ölçüme HA çağrısı eklemesin diye gönderilmez
+    rules = RuleEngine(lambda rule: "", state_mirror=mirror, names=registry.names)
+    for spec in synthetic_rules(registry, args.rules): rules.add_from_plan(spec)
+    if mirror is not None: mirror.add_listener(rules.on_state)
+    metrics = Metrics(trace_size=1)
+    metrics.add_collector(runtime_collector(scheduler, plan_cache, weather_cache, mirror, registry, breakers, timeseries=timeseries, rules=rules))
+    return CommandPipeline(client, weather_cache, dispatcher, scheduler=scheduler,
+                           intent_matcher=IntentMatcher(registry.control_names(), {**EXTRA_ALIASES, **registry.aliases()}) if local else None,
+                           plan_cache=plan_cache, state_mirror=mirror, names=registry.names, streaming=not args.no_stream,
+                           deadline=args.ha_deadline, metrics=metrics, registry=registry, llm_breaker=breakers.get("llm"),
+                           llm_timeout=args.llm_timeout, llm_retries=args.llm_retries, budget=args.budget, timeseries=timeseries,
+                           rules=rules.start())
+
+
+def synthetic_rules(registry, count, seed=0):
+    """Kayıtlı entity'ler üzerinde rastgele (ama tekrarlanabilir) koşullu kurallar."""
+    rng = random.Random(seed)
+    watched, controls = sorted(registry.entities), sorted(registry.control_names())
+    for i in range(count):
+        conditions = [{"entity_id": rng.choice(watched), "state": rng.choice(["on", "off"])},
+                      {"entity_id": rng.choice(watched), "below": rng.randint(0, 100)}]
+        yield {"conditions": conditions, "actions": [{"entity_id": rng.choice(controls), "state": "on", "brightness_pct": i % 100}]}
+
+
+def rule_stats(snapshot):
+    counters = {**snapshot["counters"], **snapshot["gauges"]}
+    changes, evaluations, seconds = (counters.get(k, 0) for k in ["rule_state_changes_total", "rule_evaluations_total", "rule_eval_seconds_total"])
+    return {"rules": counters.get("rules_active", 0), "state_changes": changes, "evaluations": evaluations,
+            "per_change_us": seconds / changes * 1e6 if changes else None, "per_test_us": seconds / evaluations * 1e6 if evaluations else None}
+
+
+def run_level(pipeline, commands, concurrency, requests_count):
+    samples = []
+
+    def one(i):
+        text = commands[i % len(commands)]
+        start = time.perf_counter()
+        try:
+            result = pipeline.run(text, "Bench")
+            return {"total": result.total, "timings": result.timings, "path": result.path, "reasked": result.reasked,
+                    "ok": result.parsed and not result.errors, "error": None if result.parsed else "json"}
+        except Exception as e:
+            return {"total": time.perf_counter() - start, "timings": {}, "path": "error", "reasked": False, "ok": False, "error": type(e).__name__}
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(one, range(requests_count)))
+    wall = time.perf_counter() - wall_start
+
+    paths, errors = {}, {}
+    for s in samples:
+        paths[s["path"]] = paths.get(s["path"], 0) + 1
+        if s["error"]: errors[s["error"]] = errors.get(s["error"], 0) + 1
+    return {
+        "concurrency": concurrency,
+        "requests": requests_count,
+        "wall_seconds": wall,
+        "throughput": requests_count / wall if wall else None,
+        "failed": sum(not s["ok"] for s in samples),
+        "errors": errors,
+        "paths": paths,
+        # LLM yoluna düşen komutlardan ikinci (düzeltme) çağrısı gerekenlerin oranı
+        "reask_rate": sum(s["reasked"] for s in samples) / paths["llm"] if paths.get("llm") else 0.0,
+        "latency": summarize([s["total"] for s in samples]),
+        "stages": {stage: summarize([s["timings"][stage] for s in samples if stage in s["timings"]])
+                   for stage in STAGES if any(stage in s["timings"] for s in samples)},
+    }
+
+
+def print_level(level):
+    lat = level["latency"]
+    print(f"eşzamanlılık={level['concurrency']:<3} istek={level['requests']:<5} "
+          f"p50={lat['p50'] * 1000:7.1f} ms  p95={lat['p95'] * 1000:7.1f} ms  p99={lat['p99'] * 1000:7.1f} ms  "
+          f"{level['throughput']:7.1f} komut/sn  başarısız={level['failed']}  yollar={level['paths']}  "
+          f"düzeltme isteği=%{level['reask_rate'] * 100:.1f}")
+    for stage, stats in level["stages"].items():
+        print(f"    {stage:<13} p50={stats['p50'] * 1000:7.1f} ms  p95={stats['p95'] * 1000:7.1f} ms")
+
+
+def compare(results, baseline_path, tolerance):
+    """Aynı eşzamanlılık seviyelerini önceki sonuçla karşılaştırır; gerilemeleri listeler."""
+    with open(baseline_path, encoding="utf-8") as f: baseline = {lvl["concurrency"]: lvl for lvl in json.load(f)["levels"]}
+    regressions = []
+    for level in results["levels"]:
+        old = baseline.get(level["concurrency"])
+        if not old: continue
+        for key in ["p50", "p95", "p99"]:
+            before, after = old["latency"].get(key), level["latency"].get(key)
+            if not before or after is None: continue
+            change = (after - before) / before * 100
+            flag = "  ⚠️ gerileme" if change > tolerance else ""
+            print(f"  c={level['concurrency']:<3} {key}: {before * 1000:.1f} → {after * 1000:.1f} ms ({change:+.1f}%){flag}")
+            if flag: regressions.append((level["concurrency"], key, change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sahte sunuculara karşı uçtan uca komut gecikmesi ölçümü")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=100, help="her eşzamanlılık seviyesi için komut sayısı")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--commands", help="her satırda bir komut (ya da STT çıktısı) içeren dosya; varsayılan rehber listesi")
+    parser.add_argument("--mode", choices=["auto", "llm", "local"], default="auto",
+                        help="auto: yerel eşleştirici + önbellek + LLM; llm: her komut LLM'e; local: önbelleksiz yerel + LLM")
+    parser.add_argument("--no-stream", action="store_true", help="LLM yanıtını akışsız al")
+    parser.add_argument("--mirror", action="store_true", help="HA durum aynasını (WebSocket) da çalıştır")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="ilk bayta kadar saniye")
+    parser.add_argument("--llm-token-delay", type=float, default=0.005, help="akış parçaları arası saniye")
+    parser.add_argument("--llm-failure-rate", type=float, default=0.0)
+    parser.add_argument("--llm-noise-rate", type=float, default=0.0, help="açıklama/çit/sondaki virgülle bozulan yanıt oranı")
+    parser.add_argument("--llm-retries", type=int, default=1)
+    parser.add_argument("--llm-timeout", type=float, default=30.0)
+    parser.add_argument("--ha-latency", type=float, default=0.02)
+    parser.add_argument("--ha-failure-rate", type=float, default=0.0)
+    parser.add_argument("--ha-timeout", type=float, default=2.0)
+    parser.add_argument("--ha-deadline", type=float, default=5.0)
+    parser.add_argument("--ha-pool", type=int, default=8)
+    parser.add_argument("--ha-retries", type=int, default=2)
+    parser.add_argument("--budget", type=float, default=30.0, help="komut başına toplam süre bütçesi (sn)")
+    parser.add_argument("--breaker-failures", type=int, default=3)
+    parser.add_argument("--breaker-reset", type=float, default=30.0)
+    parser.add_argument("--rules", type=int, default=0, help="yüklenecek sentetik kural sayısı (--mirror ile değerlendirilir)")
+    parser.add_argument("--weather-latency", type=float, default=0.1)
+    parser.add_argument("--weather-failure-rate", type=float, default=0.0)
+    parser.add_argument("--weather-ttl", type=int, default=600)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="karşılaştırılacak önceki sonuç dosyası")
+    parser.add_argument("--tolerance", type=float, default=10.0, help="gerileme sayılacak yüzde artış")
+    parser.add_argument("--log-level", default="WARNING")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level, format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+    commands = default_commands()
+    if args.commands:
+        with open(args.commands, encoding="utf-8") as f: commands = [line.strip() for line in f if line.strip()]
+
+    ha = FakeHomeAssistant(latency=args.ha_latency, failure_rate=args.ha_failure_rate).start()
+    llm = FakeLLM(latency=args.llm_latency, token_delay=args.llm_token_delay, failure_rate=args.llm_failure_rate, noise_rate=args.llm_noise_rate).start()
+    weather = FakeWeather(latency=args.weather_latency, failure_rate=args.weather_failure_rate).start()
+    pipeline = build_pipeline(args, ha, llm, weather)
+    try:
+        pipeline.weather_cache.refresh()
+    except Exception as e:
+        logging.warning("Başlangıç hava durumu okuması başarısız: %s", e)
+    if args.mirror:
+        deadline = time.time() + 5
+        while not len(pipeline.state_mirror) and time.time() < deadline: time.sleep(0.05)
+
+    for i in range(args.warmup): pipeline.run(commands[i % len(commands)], "Bench")
+
+    results = {
+        "version": git_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "config": {k: v for k, v in vars(args).items() if k not in ["output", "baseline"]},
+        "commands": len(commands),
+        "levels": [],
+    }
+    for concurrency in args.concurrency:
+        ha_calls, llm_requests = len(ha.calls), llm.requests
+        level = run_level(pipeline, commands, concurrency, args.requests)
+        level["ha_calls"] = len(ha.calls) - ha_calls
+        level["llm_requests"] = llm.requests - llm_requests
+        results["levels"].append(level)
+        print_level(level)
+
+    snapshot = pipeline.metrics.snapshot()
+    results["metrics"] = {"counters": snapshot["counters"], "gauges": snapshot["gauges"]}
+    if args.rules:
+        results["rules"] = stats = rule_stats(snapshot)
+        per_change = "-" if stats["per_change_us"] is None else f"{stats['per_change_us']:.1f} µs"
+        per_test = "-" if stats["per_test_us"] is None else f"{stats['per_test_us']:.2f} µs"
+        print(f"kurallar={stats['rules']}  durum değişikliği={stats['state_changes']}  koşul testi={stats['evaluations']}  "
+              f"değişiklik başına={per_change}  koşul testi başına={per_test}")
+    with open(args.output, "w", encoding="utf-8") as f: json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"Sonuçlar yazıldı: {args.output}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        if regressions: return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+# --- ENTITY TANIMLARI ---
+ENTITY_NAMES = {
+    "light.salon_isigi": "🛋️ Salon Işığı",
+    "light.yatak_odasi_isigi": "🛏️ Yatak Odası Işığı",
+    "light.mutfak_isigi": "🍳 Mutfak Işığı",
+    "climate.klima": "❄️/🔥 Klima",
+    "fan.fan_salon": "🌀 Salon Fanı",
+    "cover.perde_salon": "🪟 Salon Perdesi",
+    "media_player.tv_salon": "📺 Salon TV",
+    "media_player.muzik_sistemi": "🎵 Müzik Sistemi",
+    "switch.kahve_makinesi": "☕ Kahve Makinesi",
+    "switch.cay_makinesi": "🍵 Çay Makinesi",
+    "switch.robot_supurge": "🧹 Robot Süpürge",
+    "scene.sabah_rutini": "🌅 Sabah Rutini",
+    "scene.aksam_rahatlama": "🌙 Akşam Rahatlama",
+    "scene.film_gecesi": "🎬 Film Gecesi",
+    "scene.misafir_modu": "👨‍👩‍👧‍👦 Misafir Modu",
+    "scene.calisma_modu": "💻 Çalışma Modu",
+    "scene.enerji_tasarrufu": "🔋 Enerji Tasarrufu"
+}
+
+# System prompt'taki entity kataloğu (sıra korunur)
+ENTITY_DESCRIPTIONS = {
+    "light.salon_isigi": "Salon ışığı (aç/kapat, parlaklık %, RGB renk, transition saniye)",
+    "light.yatak_odasi_isigi": "Yatak odası ışığı",
+    "light.mutfak_isigi": "Mutfak ışığı",
+    "climate.klima": "Klima (sıcaklık, mod)",
+    "fan.fan_salon": "Salon fanı",
+    "cover.perde_salon": "Salon perdesi",
+    "media_player.tv_salon": "Salon TV",
+    "media_player.muzik_sistemi": "Müzik sistemi",
+    "switch.kahve_makinesi": "Kahve makinesi",
+    "switch.cay_makinesi": "Çay makinesi",
+    "switch.robot_supurge": "Robot süpürge",
+    "scene.sabah_rutini": "Sabah rutini",
+    "scene.aksam_rahatlama": "Akşam rahatlama",
+    "scene.film_gecesi": "Film gecesi",
+    "scene.misafir_modu": "Misafir modu",
+    "scene.calisma_modu": "Çalışma modu",
+    "scene.enerji_tasarrufu": "Enerji tasarrufu"
+}
+
+# Sorgulanabilir (salt okunur) sensörler; HA'ya bağlanılamadığında kayıt defterinin tohumu
+SENSOR_NAMES = {
+    "sensor.sicaklik_salon": "🌡️ Salon Sıcaklığı",
+    "sensor.sicaklik_dis": "🌡️ Dış Sıcaklık",
+    "sensor.nem_genel": "💧 Nem",
+    "sensor.guc_tuketimi": "⚡ Güç Tüketimi",
+    "sensor.isik_seviyesi_salon": "🔆 Salon Işık Seviyesi",
+    "binary_sensor.hareket_salon": "🚶 Salon Hareket"
+}
+
+# --- KATEGORİLİ KOMUT LİSTESİ (REHBER VE DROPDOWN) ---
+COMMAND_CATEGORIES = {
+    "💡 Aydınlatma": [
+        "Salon ışığını aç",
+        "Salon ışığını kapat",
+        "Yatak odası ışığını %10 yap (Gece Modu)",
+        "Mutfak ışığını kapat",
+        "Tüm ışıkları kapat"
+    ],
+    "🌡️ İklim & Konfor": [
+        "Klimayı 22 derece yap",
+        "Klimayı kapat",
+        "Fanı çalıştır",
+        "Salon perdesini aç",
+        "Salon perdesini kapat"
+    ],
+    "📺 Medya & Ev Aletleri": [
+        "Televizyonu aç",
+        "Müzik sistemini başlat",
+        "Robot süpürgeyi çalıştır",
+        "Kahve makinesini aç",
+        "Çay demle (Makineyi aç)"
+    ],
+    "🎬 Senaryolar (Tek Tuşla)": [
+        "Film modunu başlat (Işıklar kısılır, TV açılır)",
+        "Sabah rutinini başlat (Perde, Kahve)",
+        "Akşam rahatlama moduna geç",
+        "Misafir modu (Tüm ışıklar açık)",
+        "Enerji tasarrufu yap (Gereksizleri kapat)"
+    ],
+    "🧠 Akıllı / Koşullu Komutlar": [
+        "30 dakika sonra salon ışığını kapat",
+        "Hava durumuna göre evin sıcaklığını ayarla",
+        "Eğer dışarı soğuksa klimayı ısıtmaya al",
+        "Eğer hareket yoksa ışıkları kapat",
+        "Her sabah 8'de kahvemi hazırla"
+    ]
+}
+
+# Dropdown için düz liste (modül süreç başına bir kez yüklenir; rerun'larda yeniden kurulmaz)
+ALL_COMMANDS_FLAT = ["👇 Listeden Bir Komut Seçin..."] + [
+    f"[{category}] {cmd}" for category, commands in COMMAND_CATEGORIES.items() for cmd in commands
+]
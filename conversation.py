@@ -0,0 +1,149 @@
+"""Oturum başına sınırlı sohbet deposu.
+
+- Bellekte yalnızca son `window` tur tutulur; daha eskileri oturum dosyasına
+  (JSONL) sayfalanır ve istenirse tembelce geri okunur.
+- Dışarı atılan turlar kısa bir özet olarak (cihazların son durumu + son
+  istekler) modele verilmeye devam eder.
+- Modele ekranda gösterilen HTML değil, kullanıcı metni ve yürütülen planın
+  JSON'u gider.
+"""
+import json
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from dataclasses import asdict, dataclass
+
+logger = logging.getLogger(__name__)
+
+PLAN_KEYS = ["actions", "timers", "queries", "rules"]
+
+
+@dataclass
+class Turn:
+    role: str  # user | assistant
+    content: str  # ekranda gösterilen markdown
+    plan: dict = None  # asistan turunda yürütülen plan
+    model: str = None  # modele giden içerik; None ise tur modele gönderilmez
+    ts: float = None
+
+
+def compact_plan(plan):
+    """Yürütülen kısmı tutar; yanıt metni yalnızca plan eylemsizse (sohbet/soru yanıtı) gider."""
+    body = {k: plan[k] for k in PLAN_KEYS if plan.get(k)} or {"response": plan.get("response", "")}
+    return json.dumps(body, ensure_ascii=False, separators=(",", ":"))
+
+
+class Conversation:
+    def __init__(self, path=None, window=40, summary_requests=5, summary_chars=600):
+        self.path = path
+        self.window = window
+        self.summary_requests = summary_requests
+        self.summary_chars = summary_chars
+        self.turns = deque()  # bellekteki son turlar
+        self.paged = 0  # diske yazılmış (bellekten atılmış) tur sayısı
+        self._states = OrderedDict()  # entity_id -> son istenen durum (özet için)
+        self._requests = deque(maxlen=summary_requests)  # atılan son kullanıcı istekleri
+        if path and os.path.exists(path): self._restore()
+
+    def __len__(self):
+        return self.paged + len(self.turns)
+
+    # --- yazma ---
+    def add_user(self, text):
+        return self._append(Turn("user", text, model=text, ts=time.time()))
+
+    def add_assistant(self, content, plan=None, raw=None):
+        """`plan` ayrıştırılmış ve yürütülmüş plandır; çözülemeyen yanıtlarda `raw` kısaltılarak modele gider."""
+        model = compact_plan(plan) if plan is not None else (raw or "")[:500] or None
+        return self._append(Turn("assistant", content, plan=plan, model=model, ts=time.time()))
+
+    def add_notice(self, content):
+        """Yalnızca ekranda görünen asistan mesajı (karşılama vb.); modele gitmez."""
+        return self._append(Turn("assistant", content, ts=time.time()))
+
+    def clear(self):
+        self.turns.clear()
+        self.paged = 0
+        self._states.clear()
+        self._requests.clear()
+        if self.path and os.path.exists(self.path): os.remove(self.path)
+
+    def flush(self):
+        """Bellekteki turların hepsini diske sayfalar; bağlam bellekten atılırken geçmiş kaybolmaz."""
+        while self.turns: self._evict(self.turns.popleft())
+
+    def _restore(self):
+        """Daha önce sayfalanmış dosyadan tur sayısını ve özeti geri kurar (turlar diskte kalır)."""
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    self._fold(Turn(**json.loads(line)), self._states, self._requests)
+                    self.paged += 1
+        except (OSError, ValueError, TypeError) as e:
+            logger.warning("Sohbet geçmişi okunamadı (%s): %s", self.path, e)
+
+    def _append(self, turn):
+        self.turns.append(turn)
+        while len(self.turns) > self.window: self._evict(self.turns.popleft())
+        return turn
+
+    @staticmethod
+    def _fold(turn, states, requests):
+        if turn.role == "user": requests.append(turn.content[:80])
+        for action in (turn.plan or {}).get("actions") or []:
+            entity_id = action.get("entity_id")
+            if not entity_id: continue
+            states.pop(entity_id, None)
+            states[entity_id] = {k: v for k, v in action.items() if k != "entity_id"}
+
+    def _evict(self, turn):
+        self._fold(turn, self._states, self._requests)
+        if self.path:
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                with open(self.path, "a", encoding="utf-8") as f: f.write(json.dumps(asdict(turn), ensure_ascii=False) + "\n")
+            except OSError as e:
+                logger.warning("Sohbet geçmişi diske yazılamadı (%s): %s", self.path, e)
+        self.paged += 1
+
+    # --- okuma ---
+    def recent(self, count):
+        """Ekranda gösterilecek son `count` tur; bellekte yoksa eksik kısım diskten okunur."""
+        in_memory = list(self.turns)[-count:] if count else []
+        missing = count - len(in_memory)
+        if missing <= 0 or not self.paged: return in_memory
+        return self.older(missing) + in_memory
+
+    def older(self, count):
+        """Diske sayfalanmış turların son `count` tanesi (en eskiden yeniye)."""
+        if not self.path or not os.path.exists(self.path): return []
+        page = deque(maxlen=count)
+        with open(self.path, encoding="utf-8") as f:
+            for line in f: page.append(line)
+        return [Turn(**json.loads(line)) for line in page]
+
+    def summary(self, older=()):
+        """Diske atılmış turlar ile `older` turlarının kısa özeti (cihazların son komutları + son istekler)."""
+        states, requests = OrderedDict(self._states), deque(self._requests, maxlen=self.summary_requests)
+        for turn in older: self._fold(turn, states, requests)
+        count = self.paged + len(older)
+        if not count: return ""
+        parts = []
+        if states:
+            parts.append("cihazlara son verilen komutlar: " + ", ".join(
+                f"{eid}={'/'.join(str(v) for v in attrs.values())}" for eid, attrs in reversed(states.items())))
+        if requests: parts.append("son istekler: " + "; ".join(f"'{r}'" for r in requests))
+        return f"Önceki konuşma özeti ({count} mesaj): {' | '.join(parts)}"[: self.summary_chars]
+
+    def model_history(self, max_turns=10):
+        """Modele gidecek kompakt geçmiş: [özet] + son kullanıcı metinleri ve plan JSON'ları.
+
+        Son `max_turns` mesajın dışında kalan her şey (bellekte olsa da) özete katlanır.
+        """
+        turns = [t for t in self.turns if t.model]
+        recent, older = turns[-max_turns:], turns[:-max_turns] if len(turns) > max_turns else []
+        messages = [{"role": t.role, "content": t.model} for t in recent]
+        summary = self.summary(older)
+        if summary: messages.insert(0, {"role": "system", "content": summary})
+        return messages
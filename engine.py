@@ -0,0 +1,639 @@
+"""Komut motoru: intent → plan → gönderim → zamanlayıcı hattını arayüzden bağımsız çalıştırır.
+
+- CommandEngine: sınırlı asyncio kuyruğu + sabit sayıda işçi. Kuyruk doluysa komut
+  beklemeden `EngineBusy` ile reddedilir (HTTP'de 429 + Retry-After).
+- Kullanıcı başına bağlam: her kullanıcının kendi sohbet geçmişi vardır ve aynı
+  kullanıcının komutları sırayla işlenir; farklı kullanıcılar eşzamanlı ilerler.
+- EngineServer: aynı olay döngüsünde küçük bir HTTP/JSON ucu; duvar panelleri ve
+  betikler Streamlit arayüzüyle aynı motora komut gönderebilir.
+- CLI:
+    python engine.py serve --port 8765
+    python engine.py send "Salon ışığını aç" --user mutfak-paneli
+    python engine.py run "Salon ışığını aç"
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import asdict, dataclass, field
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from conversation import Conversation
+from ha_client import HADispatcher
+from ha_state import StateMirror
+from intent import EXTRA_ALIASES, IntentMatcher
+from metrics import Metrics, MetricsServer, runtime_collector
+from pipeline import CommandPipeline
+from plan_cache import PlanCache
+from planner import Debouncer, plan_calls
+from registry import EntityRegistry
+from resilience import CircuitBreakers, Deadline
+from rules import RuleEngine
+from scheduler import TimerScheduler
+from weather import OPENWEATHER_URL, WeatherCache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_USER = "default"
+MAX_BODY = 64 * 1024
+SAFE_NAME = re.compile(r"[^\w.-]")  # kullanıcı kimliğinden dosya adı
+
+
+class EngineBusy(Exception):
+    """Kuyruk dolu; komut kabul edilmedi."""
+
+    def __init__(self, retry_after=1.0):
+        super().__init__("Komut kuyruğu dolu, biraz sonra yeniden deneyin")
+        self.retry_after = retry_after
+
+
+@dataclass
+class Settings:
+    grok_api_key: str = None
+    grok_base_url: str = "https://api.x.ai/v1"
+    openweather_api_key: str = None
+    openweather_url: str = OPENWEATHER_URL
+    ha_url: str = None
+    ha_token: str = None
+    ha_ws_url: str = None
+    weather_ttl: int = 600
+    ha_pool_size: int = 8
+    ha_dispatch_deadline: float = 5.0
+    ha_debounce: float = 2.0
+    data_dir: str = "data"
+    plan_cache_size: int = 256
+    plan_cache_ttl: int = 3600
+    plan_cache_persist: bool = True
+    llm_streaming: bool = True
+    metrics_port: int = 0  # 0: /metrics uç noktası kapalı
+    metrics_jsonl: bool = True
+    metrics_trace_size: int = 50
+    chat_window: int = 40  # bellekte tutulan mesaj; eskileri diske sayfalanır
+    chat_history_turns: int = 10  # modele giden son mesaj sayısı
+    registry_refresh: int = 3600  # HA'dan tam yeniden okuma aralığı
+    llm_timeout: float = 20.0
+    llm_retries: int = 1
+    ha_retries: int = 2  # yalnızca idempotent servisler yeniden denenir
+    command_budget: float = 30.0  # komut başına toplam süre (LLM + HA)
+    breaker_failures: int = 3  # devreyi açan art arda hata sayısı
+    breaker_reset: float = 30.0  # açık devrenin yarı açığa geçme süresi
+    timeseries_enabled: bool = True
+    timeseries_raw_days: int = 7  # ham kayıtların tutulduğu gün; daha eskiler saatlik kovalara indirgenir
+    timeseries_retention_days: int = 90
+    habit_days: int = 28  # alışkanlık özetinin baktığı gün sayısı
+    rules_max: int = 10000  # etkin kural sınırı
+    engine_workers: int = 4  # eşzamanlı işlenen komut sayısı
+    engine_queue_size: int = 32  # bekleyebilecek komut sayısı; dolunca yeni komutlar reddedilir
+    engine_max_users: int = 256  # bellekte tutulan kullanıcı bağlamı
+    engine_host: str = "127.0.0.1"
+    engine_port: int = 0  # 0: HTTP ucu kapalı
+    engine_token: str = None  # verilirse HTTP istekleri "Authorization: Bearer <token>" ister
+
+    @classmethod
+    def from_env(cls):
+        env = os.getenv
+        return cls(
+            grok_api_key=env("GROK_API_KEY"),
+            grok_base_url=env("GROK_BASE_URL", cls.grok_base_url),
+            openweather_api_key=env("OPENWEATHER_API_KEY"),
+            openweather_url=env("OPENWEATHER_URL", cls.openweather_url),
+            ha_url=env("HA_URL"),
+            ha_token=env("HA_TOKEN"),
+            ha_ws_url=env("HA_WS_URL"),
+            weather_ttl=int(env("WEATHER_TTL_SECONDS", "600")),
+            ha_pool_size=int(env("HA_POOL_SIZE", "8")),
+            ha_dispatch_deadline=float(env("HA_DISPATCH_DEADLINE", "5")),
+            ha_debounce=float(env("HA_DEBOUNCE_SECONDS", "2")),
+            data_dir=env("DATA_DIR", "data"),
+            plan_cache_size=int(env("PLAN_CACHE_SIZE", "256")),
+            plan_cache_ttl=int(env("PLAN_CACHE_TTL", "3600")),
+            plan_cache_persist=env("PLAN_CACHE_PERSIST", "1") == "1",
+            llm_streaming=env("LLM_STREAMING", "1") == "1",
+            metrics_port=int(env("METRICS_PORT", "0")),
+            metrics_jsonl=env("METRICS_JSONL", "1") == "1",
+            metrics_trace_size=int(env("METRICS_TRACE_SIZE", "50")),
+            chat_window=int(env("CHAT_WINDOW", "40")),
+            chat_history_turns=int(env("CHAT_HISTORY_TURNS", "10")),
+            registry_refresh=int(env("REGISTRY_REFRESH_SECONDS", "3600")),
+            llm_timeout=float(env("LLM_TIMEOUT", "20")),
+            llm_retries=int(env("LLM_RETRIES", "1")),
+            ha_retries=int(env("HA_RETRIES", "2")),
+            command_budget=float(env("COMMAND_BUDGET_SECONDS", "30")),
+            breaker_failures=int(env("BREAKER_FAILURES", "3")),
+            breaker_reset=float(env("BREAKER_RESET_SECONDS", "30")),
+            timeseries_enabled=env("TIMESERIES_ENABLED", "1") == "1",
+            timeseries_raw_days=int(env("TIMESERIES_RAW_DAYS", "7")),
+            timeseries_retention_days=int(env("TIMESERIES_RETENTION_DAYS", "90")),
+            habit_days=int(env("HABIT_DAYS", "28")),
+            rules_max=int(env("RULES_MAX", "10000")),
+            engine_workers=int(env("ENGINE_WORKERS", "4")),
+            engine_queue_size=int(env("ENGINE_QUEUE_SIZE", "32")),
+            engine_max_users=int(env("ENGINE_MAX_USERS", "256")),
+            engine_host=env("ENGINE_HOST", "127.0.0.1"),
+            engine_port=int(env("ENGINE_PORT", "0")),
+            engine_token=env("ENGINE_TOKEN"),
+        )
+
+
+class Services:
+    """Süreç genelinde paylaşılan bileşenler; tüm kullanıcılar ve giriş noktaları aynılarını kullanır."""
+
+    def __init__(self, settings):
+        self.settings = s = settings
+        import requests
+        # Hava durumu, HA durum aynası ve kayıt defteri aynı bağlantı havuzunu paylaşır
+        self.http_session = requests.Session()
+        self.breakers = CircuitBreakers(failure_threshold=s.breaker_failures, reset_timeout=s.breaker_reset)
+        self.weather_cache = WeatherCache(s.openweather_api_key, city="Ankara", ttl=s.weather_ttl, url=s.openweather_url,
+                                          session=self.http_session, breaker=self.breakers.get("weather")).start()
+        # Tek toplu okuma + WebSocket aboneliği; HA yapılandırılmamışsa ayna yok
+        self.state_mirror = StateMirror(s.ha_url, s.ha_token, ws_url=s.ha_ws_url, session=self.http_session).start() if s.ha_url and s.ha_token else None
+        # Önbellek dosyası (yoksa catalog.py) ile hemen açılır; HA varsa arka planda senkronize olur
+        self.registry = EntityRegistry(s.ha_url, s.ha_token, ws_url=s.ha_ws_url, path=os.path.join(s.data_dir, "entity_registry.json"),
+                                       session=self.http_session, refresh_interval=s.registry_refresh).attach(self.state_mirror).start()
+        # names kayıt defterinin canlı sözlüğüdür; yeni/yeniden adlandırılan cihazlar anında görünür
+        self.dispatcher = HADispatcher(s.ha_url, s.ha_token, names=self.registry.names, pool_size=s.ha_pool_size, max_workers=s.ha_pool_size,
+                                       state_mirror=self.state_mirror, breaker=self.breakers.get("ha"), retries=s.ha_retries)
+        # Tüm giriş noktaları arasında paylaşılır: iki panelden gelen aynı komut da tek kez gider
+        self.debouncer = Debouncer(window=s.ha_debounce)
+        self.scheduler = TimerScheduler(self.process_timer, path=os.path.join(s.data_dir, "timers.json")).start()
+        self.plan_cache = PlanCache(max_size=s.plan_cache_size, ttl=s.plan_cache_ttl,
+                                    path=os.path.join(s.data_dir, "plan_cache.json") if s.plan_cache_persist else None)
+        # Durum değişiklikleri, gönderilen eylemler ve hava durumu örnekleri; alışkanlık özeti buradan çıkar
+        self.timeseries = None
+        if s.timeseries_enabled:
+            from timeseries import TimeSeriesStore  # numpy burada yüklenir; engine'i içe aktaran karşılama sayfası beklemez
+            self.timeseries = TimeSeriesStore(os.path.join(s.data_dir, "timeseries.bin"), raw_retention=s.timeseries_raw_days * 86400,
+                                              retention=s.timeseries_retention_days * 86400, habit_days=s.habit_days,
+                                              names=self.registry.names).start()
+            if self.state_mirror is not None: self.state_mirror.add_listener(self.timeseries.on_state)
+            self.weather_cache.add_listener(self.timeseries.on_weather)
+        # Koşullu ve tekrarlı istekler: LLM kuralı bir kez derler, motor yerelde sürekli değerlendirir
+        self.rules = RuleEngine(self.process_rule, state_mirror=self.state_mirror, path=os.path.join(s.data_dir, "rules.json"),
+                                names=self.registry.names, max_rules=s.rules_max)
+        if self.state_mirror is not None: self.state_mirror.add_listener(self.rules.on_state)
+        self.weather_cache.add_listener(self.rules.on_weather)
+        self.rules.start()
+        self.metrics = Metrics(trace_size=s.metrics_trace_size, jsonl_path=os.path.join(s.data_dir, "metrics.jsonl") if s.metrics_jsonl else None)
+        self.metrics.add_collector(runtime_collector(self.scheduler, self.plan_cache, self.weather_cache, self.state_mirror, self.registry, self.breakers,
+                                                      timeseries=self.timeseries, rules=self.rules))
+        if s.metrics_port: MetricsServer(self.metrics, port=s.metrics_port).start()
+        self._llm_client = None
+        self._intent_matcher = (None, None)  # (kayıt defteri sürümü, eşleştirici)
+        self._lock = threading.Lock()
+
+    @property
+    def llm_client(self):
+        # openai ilk LLM ihtiyacında yüklenir; yeniden deneme ve zaman aşımı hatta yönetilir
+        with self._lock:
+            if self._llm_client is None:
+                import openai
+                s = self.settings
+                self._llm_client = openai.OpenAI(api_key=s.grok_api_key, base_url=s.grok_base_url, timeout=s.llm_timeout, max_retries=0)
+            return self._llm_client
+
+    def intent_matcher(self):
+        # Dizin kayıt defterinin sürümüne bağlıdır; envanter değişince yeniden derlenir
+        version, matcher = self._intent_matcher
+        if version != self.registry.version:
+            version = self.registry.version
+            matcher = IntentMatcher(self.registry.control_names(), {**EXTRA_ALIASES, **self.registry.aliases()})
+            self._intent_matcher = (version, matcher)
+        return matcher
+
+    def pipeline(self):
+        s = self.settings
+        return CommandPipeline(self.llm_client, self.weather_cache, self.dispatcher, scheduler=self.scheduler,
+                               intent_matcher=self.intent_matcher(), plan_cache=self.plan_cache, debouncer=self.debouncer,
+                               state_mirror=self.state_mirror, names=self.registry.names, streaming=s.llm_streaming,
+                               deadline=s.ha_dispatch_deadline, metrics=self.metrics, registry=self.registry,
+                               llm_breaker=self.breakers.get("llm"), llm_timeout=s.llm_timeout, llm_retries=s.llm_retries,
+                               budget=s.command_budget, timeseries=self.timeseries, rules=self.rules)
+
+    def process_timer(self, timer):
+        res = ""
+        if timer.entity_id and timer.entity_id != "none":
+            res = self.dispatcher.send({"entity_id": timer.entity_id, **timer.action}).message
+        if timer.reminder: res = f"🔔 {timer.reminder}" + (f" | {res}" if res else "")
+        return res
+
+    def process_rule(self, rule):
+        # Komutlarla aynı yol: kayıt defteri doğrulaması, debouncer, servis gruplama ve süre sınırı
+        calls, report = plan_calls(rule.actions, debouncer=self.debouncer, registry=self.registry)
+        batch = self.dispatcher.batch(Deadline(self.settings.ha_dispatch_deadline))
+        for order, call in calls: batch.add(call, order=order)
+        messages = [f"🚫 {self.registry.names.get(eid, eid)} – {reason}" for eid, reason in report.rejected]
+        if report.dropped: messages.append(f"🧩 {report.summary()}")
+        for res in batch.results(self.settings.ha_dispatch_deadline):
+            if not res.ok:
+                for action in res.actions: self.debouncer.forget(action)
+            messages.append(res.message)
+        if self.timeseries is not None: self.timeseries.record_actions([a for _, call in calls for a in call.actions])
+        res = " | ".join(messages)
+        if rule.reminder: res = f"🔔 {rule.reminder}" + (f" | {res}" if res else "")
+        return res
+
+
+@dataclass
+class UserContext:
+    user_id: str
+    name: str
+    conversation: Conversation
+    last_seen: float = field(default_factory=time.time)
+
+
+@dataclass
+class Job:
+    text: str
+    user_id: str
+    user_name: str
+    future: asyncio.Future
+    on_text: object = None
+    queued_at: float = field(default_factory=time.perf_counter)
+
+
+def result_payload(result):
+    """CommandResult'ın JSON'a dönüştürülebilir hali (HTTP yanıtı ve CLI çıktısı)."""
+    return {
+        "text": result.text,
+        "reply": result.reply,
+        "markdown": result.markdown(),
+        "logs": result.logs,
+        "path": result.path,
+        "path_note": result.path_note,
+        "plan": result.data,
+        "timings": {k: round(v, 6) for k, v in result.timings.items()},
+        "total": round(result.total, 6),
+        "errors": result.errors,
+        "ha": result.ha_outcomes,
+        "rejected": [{"entity_id": eid, "reason": reason} for eid, reason in result.rejected],
+        "tokens": result.usage,
+    }
+
+
+class CommandEngine:
+    """Sınırlı kuyruk ve işçi havuzuyla komut işler; olay döngüsü kendi thread'inde çalışır.
+
+    `pipeline_factory` her komut için bir CommandPipeline döndürür (bkz. Services.pipeline).
+    """
+
+    def __init__(self, pipeline_factory, workers=4, queue_size=32, max_users=256, history_turns=10,
+                 conversation_dir=None, conversation_window=40, metrics=None, services=None, poll_interval=0.05):
+        self.pipeline_factory = pipeline_factory
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_users = max_users
+        self.history_turns = history_turns
+        self.conversation_dir = conversation_dir
+        self.conversation_window = conversation_window
+        self.metrics = metrics
+        self.services = services
+        self.poll_interval = poll_interval
+        self.loop = None
+        self.processed = 0
+        self.failed = 0
+        self.rejected = 0  # kuyruk dolu olduğu için reddedilen komutlar
+        self.in_flight = 0
+        self.server = None  # EngineServer; build_engine'de engine_port verilirse açılır
+        self._queue = None
+        self._tasks = []
+        self._contexts = OrderedDict()  # user_id -> UserContext (en son kullanılan sonda)
+        self._backlog = {}  # user_id -> işlenmekte olan kullanıcının bekleyen komutları (yalnızca olay döngüsünde)
+        self._parked = 0
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="engine")
+        self._started = threading.Event()
+
+    # --- yaşam döngüsü ---
+    def start(self):
+        if self.loop is not None: return self
+        self._remove_stale_pages()
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self._run_loop, name="engine-loop", daemon=True).start()
+        self._started.wait()
+        return self
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [self.loop.create_task(self._worker()) for _ in range(self.workers)]
+        self._started.set()
+        self.loop.run_forever()
+
+    def _remove_stale_pages(self):
+        """Önceki süreçten kalan sayfa dosyaları yeni oturumların geçmişine karışmasın diye bir kez silinir."""
+        if not self.conversation_dir or not os.path.isdir(self.conversation_dir): return
+        for name in os.listdir(self.conversation_dir):
+            if not name.endswith(".jsonl"): continue
+            try: os.remove(os.path.join(self.conversation_dir, name))
+            except OSError as e: logger.warning("Eski sohbet dosyası silinemedi (%s): %s", name, e)
+
+    def stop(self):
+        if self.loop is None: return
+        for task in self._tasks: self.loop.call_soon_threadsafe(task.cancel)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # --- kullanıcı bağlamı ---
+    def context(self, user_id=DEFAULT_USER, user_name=""):
+        with self._lock:
+            ctx = self._contexts.get(user_id)
+            if ctx is None:
+                path = os.path.join(self.conversation_dir, SAFE_NAME.sub("_", user_id)[:64] + ".jsonl") if self.conversation_dir else None
+                ctx = self._contexts[user_id] = UserContext(user_id, user_name, Conversation(path=path, window=self.conversation_window))
+                while len(self._contexts) > self.max_users:
+                    _, evicted = self._contexts.popitem(last=False)
+                    evicted.conversation.flush()  # yalnızca bellekten atılır; geri dönen kullanıcı geçmişini dosyadan bulur
+            else:
+                self._contexts.move_to_end(user_id)
+                if user_name: ctx.name = user_name
+            ctx.last_seen = time.time()
+            return ctx
+
+    def lookup(self, user_id):
+        """Bağlamı oluşturmadan döner (yoksa None); LRU sırası değişmez."""
+        with self._lock: return self._contexts.get(user_id)
+
+    def forget(self, user_id):
+        with self._lock: ctx = self._contexts.pop(user_id, None)
+        if ctx is not None: ctx.conversation.clear()
+
+    def stats(self):
+        return {"workers": self.workers, "queue_size": self.queue_size, "queued": self._queue.qsize() if self._queue else 0,
+                "in_flight": self.in_flight, "processed": self.processed, "failed": self.failed, "rejected": self.rejected,
+                "parked": self._parked, "users": len(self._contexts)}
+
+    # --- komut işleme ---
+    async def submit(self, text, user_id=DEFAULT_USER, user_name="", on_text=None, block=False):
+        """Komutu kuyruğa ekler ve sonucunu bekler; `block` değilse dolu kuyrukta EngineBusy."""
+        job = Job(text, user_id, user_name, self.loop.create_future(), on_text)
+        if block: await self._queue.put(job)
+        else:
+            try:
+                if self._queue.qsize() + self._parked >= self.queue_size: raise asyncio.QueueFull
+                self._queue.put_nowait(job)
+            except asyncio.QueueFull:
+                self.rejected += 1
+                logger.warning("Komut kuyruğu dolu (%d), komut reddedildi: %s", self.queue_size, text)
+                raise EngineBusy() from None
+        return await job.future
+
+    def run_command(self, text, user_id=DEFAULT_USER, user_name="", on_text=None, block=False, timeout=None):
+        """Thread'den (Streamlit, CLI) çağırmak için köprü; `on_text` çağıranın kendi thread'inde çağrılır."""
+        latest = {}
+        relay = (lambda t: latest.__setitem__("text", t)) if on_text else None
+        future = asyncio.run_coroutine_threadsafe(self.submit(text, user_id, user_name, relay, block), self.loop)
+        deadline, shown = Deadline(timeout), None
+        while True:
+            try:
+                return future.result(timeout=self.poll_interval)
+            except concurrent.futures.TimeoutError:
+                if deadline.expired:
+                    future.cancel()
+                    raise
+                if latest.get("text") not in (None, shown):
+                    shown = latest["text"]
+                    on_text(shown)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                # Aynı kullanıcının komutları sırayla işlenir: kullanıcının bir komutu zaten işleniyorsa yeni komut
+                # park edilir ve onu işleyen işçi devralır; böylece bekleyen komutlar executor thread'i tutmaz.
+                if job.user_id in self._backlog:
+                    self._backlog[job.user_id].append(job)
+                    self._parked += 1
+                    continue
+                backlog = self._backlog[job.user_id] = deque()
+                try:
+                    await self._run(job)
+                    while backlog:
+                        self._parked -= 1
+                        await self._run(backlog.popleft())
+                finally:
+                    self._parked -= len(backlog)
+                    for parked in backlog:
+                        if not parked.future.done(): parked.future.cancel()
+                    del self._backlog[job.user_id]
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job):
+        if job.future.cancelled(): return
+        if self.metrics is not None: self.metrics.observe("stage_seconds", time.perf_counter() - job.queued_at, stage="queue")
+        self.in_flight += 1
+        try:
+            result = await self.loop.run_in_executor(self._executor, self._execute, job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failed += 1
+            if not job.future.done(): job.future.set_exception(e)
+            return
+        finally:
+            self.in_flight -= 1
+        self.processed += 1
+        if not job.future.done(): job.future.set_result(result)
+
+    def _execute(self, job):
+        ctx = self.context(job.user_id, job.user_name)
+        history = ctx.conversation.model_history(self.history_turns)
+        ctx.conversation.add_user(job.text)
+        try:
+            result = self.pipeline_factory().run(job.text, job.user_name or ctx.name, history, on_text=job.on_text)
+        except Exception as e:
+            logger.exception("Komut işlenemedi: %s", job.text)
+            ctx.conversation.add_notice(f"⚠️ Hata: {e}")
+            raise
+        ctx.conversation.add_assistant(result.markdown(), plan=result.data, raw=result.raw)
+        return result
+
+
+class EngineServer:
+    """Motorun olay döngüsünde çalışan küçük HTTP/JSON ucu.
+
+    POST   /v1/commands              {"text", "user_id", "user_name"} -> komut sonucu
+    GET    /v1/users/<id>/history    ?limit=20 -> son sohbet mesajları
+    DELETE /v1/users/<id>            kullanıcı bağlamını siler
+    GET    /v1/rules                 etkin kurallar
+    DELETE /v1/rules/<id>            kuralı siler
+    GET    /v1/health                kuyruk ve işçi durumu
+    """
+
+    def __init__(self, engine, host="127.0.0.1", port=8765, token=None, read_timeout=10.0):
+        self.engine = engine
+        self.host = host
+        self.port = port
+        self.token = token
+        self.read_timeout = read_timeout
+        self._server = None
+
+    def start(self):
+        self.engine.start()
+        self._server = asyncio.run_coroutine_threadsafe(asyncio.start_server(self._handle, self.host, self.port), self.engine.loop).result()
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("Komut motoru HTTP ucu: http://%s:%d", self.host, self.port)
+        return self
+
+    def stop(self):
+        if self._server is not None: self.engine.loop.call_soon_threadsafe(self._server.close)
+
+    async def _handle(self, reader, writer):
+        headers, extra_headers = {}, {}
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), self.read_timeout)
+            if not request_line: return
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+            while True:
+                line = await asyncio.wait_for(reader.readline(), self.read_timeout)
+                if line in (b"\r\n", b"\n", b""): break
+                key, _, value = line.decode("latin-1").partition(":")
+                headers[key.strip().lower()] = value.strip()
+            length = int(headers.get("content-length") or 0)
+            if length > MAX_BODY: status, payload = 413, {"error": "istek gövdesi çok büyük"}
+            else:
+                body = await asyncio.wait_for(reader.readexactly(length), self.read_timeout) if length else b""
+                status, payload, extra_headers = await self._route(method.upper(), target, headers, body)
+        except (ValueError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            status, payload = 400, {"error": "geçersiz istek"}
+        except Exception as e:
+            logger.exception("HTTP isteği işlenemedi")
+            status, payload = 500, {"error": str(e)}
+        try:
+            body = json.dumps(payload, ensure_ascii=False).encode()
+            extra = "".join(f"{k}: {v}\r\n" for k, v in extra_headers.items())
+            writer.write(f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\nContent-Type: application/json; charset=utf-8\r\n"
+                         f"Content-Length: {len(body)}\r\nConnection: close\r\n{extra}\r\n".encode() + body)
+            await writer.drain()
+        except ConnectionError:
+            pass  # istemci yanıtı beklemeden ayrıldı
+        finally:
+            writer.close()
+
+    async def _route(self, method, target, headers, body):
+        """(durum kodu, JSON gövdesi, ek başlıklar) döner."""
+        if self.token and headers.get("authorization") != f"Bearer {self.token}": return 401, {"error": "yetkisiz"}, {}
+        url = urlsplit(target)
+        parts = [unquote(p) for p in url.path.strip("/").split("/")]
+        if parts == ["v1", "health"] and method == "GET": return 200, self.engine.stats(), {}
+        if parts == ["v1", "commands"] and method == "POST":
+            request = json.loads(body or b"{}")
+            if not isinstance(request, dict): return 400, {"error": "gövde bir JSON nesnesi olmalı"}, {}
+            text = str(request.get("text") or "").strip()
+            if not text: return 400, {"error": "text alanı boş"}, {}
+            try:
+                result = await self.engine.submit(text, str(request.get("user_id") or DEFAULT_USER), str(request.get("user_name") or ""))
+            except EngineBusy as e:
+                return 429, {"error": str(e)}, {"Retry-After": f"{e.retry_after:.0f}"}
+            except Exception as e:
+                return 500, {"error": str(e)}, {}
+            return 200, result_payload(result), {}
+        if len(parts) == 4 and parts[:2] == ["v1", "users"] and parts[3] == "history" and method == "GET":
+            limit = parse_qs(url.query).get("limit", ["20"])[0]
+            if not limit.isdigit(): return 400, {"error": "limit negatif olmayan bir tam sayı olmalı"}, {}
+            ctx = self.engine.lookup(parts[2])
+            if ctx is None: return 404, {"error": "kullanıcı bulunamadı"}, {}
+            limit, conversation = int(limit), ctx.conversation
+            return 200, {"user_id": parts[2], "total": len(conversation), "turns": [asdict(t) for t in conversation.recent(limit)]}, {}
+        if len(parts) == 3 and parts[:2] == ["v1", "users"] and method == "DELETE":
+            self.engine.forget(parts[2])
+            return 200, {"user_id": parts[2], "deleted": True}, {}
+        rules = self.engine.services.rules if self.engine.services is not None else None
+        if parts == ["v1", "rules"] and method == "GET" and rules is not None:
+            return 200, {"rules": [{**asdict(r), "description": r.describe(rules.names), "active": rules.is_active(r.id)} for r in rules.rules()]}, {}
+        if len(parts) == 3 and parts[:2] == ["v1", "rules"] and method == "DELETE" and rules is not None:
+            if not rules.remove(parts[2]): return 404, {"error": "kural bulunamadı"}, {}
+            return 200, {"rule_id": parts[2], "deleted": True}, {}
+        return 404, {"error": "bulunamadı"}, {}
+
+
+def build_engine(settings):
+    """Ayarlardan paylaşılan bileşenleri ve motoru kurar; `engine_port` verilirse HTTP ucu da açılır."""
+    services = Services(settings)
+    engine = CommandEngine(services.pipeline, workers=settings.engine_workers, queue_size=settings.engine_queue_size,
+                           max_users=settings.engine_max_users, history_turns=settings.chat_history_turns,
+                           conversation_dir=os.path.join(settings.data_dir, "conversations"), conversation_window=settings.chat_window,
+                           metrics=services.metrics, services=services).start()
+    services.metrics.add_collector(runtime_collector(engine=engine))
+    if settings.engine_port:
+        engine.server = EngineServer(engine, settings.engine_host, settings.engine_port, token=settings.engine_token).start()
+    return engine
+
+
+def send(url, text, user_id, user_name="", token=None, timeout=60.0):
+    """Çalışan bir motora HTTP üzerinden komut gönderir; (durum kodu, JSON) döner."""
+    import requests
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    response = requests.post(f"{url.rstrip('/')}/v1/commands", json={"text": text, "user_id": user_id, "user_name": user_name},
+                             headers=headers, timeout=timeout)
+    return response.status_code, response.json()
+
+
+def print_result(payload):
+    print(payload["reply"] or payload["markdown"])
+    for line in payload["logs"]: print(f"  {line}")
+    print(f"  [{payload['path']}] {payload['total'] * 1000:.0f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Akıllı ev komut motoru")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="motoru HTTP/JSON ucuyla çalıştırır")
+    serve.add_argument("--host")
+    serve.add_argument("--port", type=int)
+    serve.add_argument("--workers", type=int)
+    serve.add_argument("--queue-size", type=int)
+    for name, help_text in [("send", "çalışan motora HTTP ile komut gönderir"), ("run", "motoru bu süreçte kurup tek komut işler")]:
+        cmd = sub.add_parser(name, help=help_text)
+        cmd.add_argument("text")
+        cmd.add_argument("--user", default="cli", help="kullanıcı kimliği (bağlam ve geçmiş bu kimliğe göre tutulur)")
+        cmd.add_argument("--name", default="", help="hitap edilecek ad")
+    sub.choices["send"].add_argument("--url", default=os.getenv("ENGINE_URL", "http://127.0.0.1:8765"))
+    args = parser.parse_args(argv)
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(name)s %(levelname)s %(message)s")
+    settings = Settings.from_env()
+
+    if args.command == "send":
+        status, payload = send(args.url, args.text, args.user, args.name, token=settings.engine_token)
+        if status != 200:
+            print(f"Hata ({status}): {payload.get('error')}", file=sys.stderr)
+            return 1
+        print_result(payload)
+        return 0
+    if not settings.grok_api_key:
+        print("⚠️ GROK_API_KEY eksik! .env dosyasını kontrol et.", file=sys.stderr)
+        return 1
+    if args.command == "run":
+        settings.engine_port = 0
+        engine = build_engine(settings)
+        try:
+            result = engine.run_command(args.text, args.user, args.name, block=True)
+        finally:
+            engine.stop()
+        print_result(result_payload(result))
+        return 0
+    for key in ["host", "port", "workers", "queue_size"]:
+        if getattr(args, key) is not None: setattr(settings, f"engine_{key}", getattr(args, key))
+    settings.engine_port = settings.engine_port or 8765
+    build_engine(settings)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from resilience import CircuitOpen, DeadlineExceeded, retry
+
+logger = logging.getLogger(__name__)
+
+# Aynı isteği tekrar göndermek sonucu değiştirmeyen servisler; yalnızca bunlar yeniden denenir
+IDEMPOTENT_SERVICES = {"turn_on", "turn_off", "open_cover", "close_cover", "set_cover_position", "set_temperature",
+                       "set_hvac_mode", "volume_set"}
+
+
+@dataclass
+class ServiceCall:
+    """Tek bir `/api/services/<domain>/<service>` isteği; birden çok entity taşıyabilir."""
+    domain: str
+    service: str
+    entity_ids: list
+    data: dict = field(default_factory=dict)
+    actions: list = field(default_factory=list)  # bu çağrıya karşılık gelen plan eylemleri
+
+    @property
+    def signature(self):
+        return (self.domain, self.service, json.dumps(self.data, sort_keys=True, ensure_ascii=False))
+
+    def payload(self):
+        return {"entity_id": self.entity_ids[0] if len(self.entity_ids) == 1 else list(self.entity_ids), **self.data}
+
+
+@dataclass
+class DispatchResult:
+    action: dict
+    message: str
+    ok: bool = True
+    latency: float = 0.0  # saniye
+    simulated: bool = False
+    skipped: bool = False  # durum aynasına göre zaten istenen durumdaydı
+    call: ServiceCall = None
+    timed_out: bool = False
+    circuit_open: bool = False  # HA devresi açıktı; istek gönderilmeden simüle edildi
+    in_flight: bool = False  # istek gönderildi ama sonuç süresinde gelmedi
+
+    @property
+    def actions(self):
+        return self.call.actions if self.call is not None and self.call.actions else [self.action]
+
+    @property
+    def outcome(self):
+        if self.timed_out: return "timeout"
+        if self.in_flight: return "sent"
+        if self.circuit_open: return "circuit_open"
+        if self.simulated: return "simulated"
+        if self.skipped: return "skipped"
+        return "ok" if self.ok else "error"
+
+
+def service_call(action):
+    """Plan eylemini HA servis çağrısına çevirir (domain'e özgü servis adlarıyla)."""
+    entity_id = action["entity_id"]
+    domain = entity_id.split(".")[0]
+    state = action.get("state")
+    data = {k: v for k, v in action.items() if k not in ["entity_id", "state"]}
+    on = state in ["on", "open"]
+    if domain == "scene":
+        service = "turn_on"
+    elif domain == "cover":
+        service = "set_cover_position" if "position" in data else "open_cover" if on else "close_cover"
+    elif domain == "climate" and state != "off" and "temperature" in data:
+        service = "set_temperature"
+        if "mode" in data: data["hvac_mode"] = data.pop("mode")
+    elif domain == "climate" and state != "off" and "mode" in data:
+        service, data = "set_hvac_mode", {"hvac_mode": data["mode"]}
+    elif domain == "media_player" and "volume_level" in data and state is None:
+        service = "volume_set"
+    else:
+        service = "turn_on" if on else "turn_off"
+    return ServiceCall(domain, service, [entity_id], data, [action])
+
+
+def simulate(action, device_name):
+    entity_id = action["entity_id"]
+    state_str = "AÇILDI 🟢" if action.get("state") in ["on", "open"] else "KAPATILDI 🔴"
+    if "scene" in entity_id: state_str = "AKTİF EDİLDİ 🎬"
+
+    details = []
+    if "brightness_pct" in action: details.append(f"%{action['brightness_pct']} Parlaklık")
+    if "temperature" in action: details.append(f"{action['temperature']}°C")
+
+    detail_str = f"({', '.join(details)})" if details else ""
+    return f"🛠️ **SİMÜLASYON:** {device_name} → {state_str} {detail_str}"
+
+
+class HADispatcher:
+    """Home Assistant servis çağrılarını kalıcı, havuzlu bir oturum üzerinden gönderir."""
+
+    def __init__(self, base_url, token, names=None, pool_size=8, max_workers=8, timeout=2, state_mirror=None,
+                 breaker=None, retries=2):
+        self.base_url = (base_url or "").rstrip("/")
+        self.names = names or {}
+        self.state_mirror = state_mirror
+        self.timeout = timeout
+        self.breaker = breaker
+        self.retries = retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Authorization": f"Bearer {token}", "Content-Type": "application/json"})
+        self.enabled = bool(base_url and token)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ha-dispatch")
+
+    def send(self, action, deadline=None, before_post=None):
+        if not action.get("entity_id"): return DispatchResult(action, "Hata: Cihaz ID yok", ok=False)
+        return self.send_call(service_call(action), deadline, before_post)
+
+    def _simulate(self, call):
+        return "\n\n".join(simulate(a, self.names.get(a["entity_id"], a["entity_id"])) for a in call.actions)
+
+    def send_call(self, call, deadline=None, before_post=None):
+        """`deadline` (resilience.Deadline) verilirse istek ve yeniden denemeler kalan bütçeyle sınırlanır.
+
+        `before_post` her HTTP denemesinden hemen önce çağrılır; DeadlineExceeded fırlatarak isteği durdurabilir.
+        """
+        first = call.actions[0] if call.actions else {"entity_id": call.entity_ids[0]}
+        if not self.enabled:
+            return DispatchResult(first, self._simulate(call), simulated=True, call=call)
+
+        # Durum aynasına göre zaten istenen durumda olan entity'ler istekten çıkarılır
+        skipped = []
+        if self.state_mirror is not None:
+            live = [a for a in call.actions if not self.state_mirror.is_noop(a)]
+            skipped = [a["entity_id"] for a in call.actions if a not in live]
+            if not live:
+                note = ", ".join(f"{self.names.get(eid, eid)} zaten '{self.state_mirror.state(eid)}'" for eid in skipped)
+                return DispatchResult(first, f"⏭️ **HA:** {note} – istek atlandı", skipped=True, call=call)
+            if skipped:
+                call = ServiceCall(call.domain, call.service, [a["entity_id"] for a in live], call.data, live)
+
+        device_names = ", ".join(self.names.get(eid, eid) for eid in call.entity_ids)
+        url = f"{self.base_url}/api/services/{call.domain}/{call.service}"
+        payload = call.payload()
+
+        def post():
+            timeout = deadline.timeout(self.timeout) if deadline is not None else self.timeout
+            if before_post is not None: before_post()
+            self.session.post(url, json=payload, timeout=timeout).raise_for_status()
+
+        attempt = post if self.breaker is None else lambda: self.breaker.call(post)
+        start = time.perf_counter()
+        try:
+            if call.service in IDEMPOTENT_SERVICES and self.retries: retry(attempt, attempts=1 + self.retries, deadline=deadline)
+            else: attempt()
+            message = f"✅ **HA (Gerçek):** {device_names} İletildi"
+            if len(call.entity_ids) > 1: message += f" _(tek istekte {len(call.entity_ids)} cihaz)_"
+            if skipped: message += f" · ⏭️ zaten istenen durumda: {', '.join(self.names.get(eid, eid) for eid in skipped)}"
+            return DispatchResult(first, message, latency=time.perf_counter() - start, call=call)
+        except CircuitOpen as e:
+            # Devre açık: beklemeden simülasyona düşülür
+            return DispatchResult(first, f"{self._simulate(call)}\n\n🔌 _{e}_", simulated=True, call=call, circuit_open=True)
+        except DeadlineExceeded:
+            return DispatchResult(first, f"⏱️ HA Zaman Aşımı: {device_names} (komutun süre bütçesi doldu)", ok=False,
+                                  latency=time.perf_counter() - start, call=call, timed_out=True)
+        except Exception as e:
+            logger.warning("HA çağrısı başarısız (%s/%s %s): %s", call.domain, call.service, call.entity_ids, e)
+            return DispatchResult(first, f"❌ HA Hatası: {str(e)}", ok=False, latency=time.perf_counter() - start, call=call)
+
+    def batch(self, deadline=None):
+        return DispatchBatch(self, deadline)
+
+    def dispatch(self, actions, deadline=5.0):
+        batch = self.batch()
+        for action in actions: batch.add(action)
+        return batch.results(deadline)
+
+
+class DispatchBatch:
+    """Eylemler/çağrılar geldikçe kuyruğa alınır (akış sırasında erken gönderim için).
+
+    Aynı entity'ye dokunan işler bir öncekinin bitmesini bekler; farklı
+    entity'ler paralel çalışır. results() sonuçları sıra anahtarına göre döner;
+    döndükten sonra henüz HA'ya çıkmamış işler artık gönderilmez.
+    """
+
+    def __init__(self, dispatcher, deadline=None):
+        self.dispatcher = dispatcher
+        self.deadline = deadline
+        self._items = []  # (sıra, eylem ya da çağrı, future)
+        self._last = {}  # entity_id -> son future
+        self._posted = set()  # isteği gönderilmiş işlerin indeksleri
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, item, order=None):
+        entity_ids = item.entity_ids if isinstance(item, ServiceCall) else [item.get("entity_id")]
+        with self._lock:
+            index = len(self._items)
+            prev = [self._last[eid] for eid in entity_ids if eid in self._last]
+            fut = self.dispatcher.executor.submit(self._run, item, prev, index)
+            for eid in entity_ids: self._last[eid] = fut
+            self._items.append((index if order is None else order, item, fut))
+        return fut
+
+    def _run(self, item, prev, index):
+        if prev: wait(prev)
+
+        def before_post():
+            # results() döndükten sonra ne ilk istek ne yeniden deneme gönderilir; kullanıcıya bildirilen sonuç değişmez
+            with self._lock:
+                if self._closed: raise DeadlineExceeded("Sonuçlar zaman aşımıyla bildirildi")
+                self._posted.add(index)
+
+        if isinstance(item, ServiceCall): return self.dispatcher.send_call(item, self.deadline, before_post)
+        return self.dispatcher.send(item, self.deadline, before_post)
+
+    def results(self, deadline=5.0):
+        with self._lock: items = list(self._items)
+        wait([fut for _, _, fut in items], timeout=deadline)
+        with self._lock:
+            self._closed = True
+            posted = set(self._posted)
+            items = list(self._items)
+        results = []
+        for index, (_, item, fut) in sorted(enumerate(items), key=lambda entry: entry[1][0]):
+            if fut.done() and not fut.cancelled():
+                results.append(fut.result())
+                continue
+            fut.cancel()
+            call = item if isinstance(item, ServiceCall) else None
+            action, names = (item.actions[0], ", ".join(item.entity_ids)) if call else (item, item.get("entity_id"))
+            if index in posted:
+                results.append(DispatchResult(action, f"📤 **HA:** {names} iletildi, yanıt {deadline:.1f}sn içinde gelmedi", latency=deadline,
+                                              call=call, in_flight=True))
+            else:
+                results.append(DispatchResult(action, f"⏱️ HA Zaman Aşımı: {names} ({deadline:.1f}sn)", ok=False, latency=deadline,
+                                              call=call, timed_out=True))
+        return results
@@ -0,0 +1,181 @@
+import json
+import logging
+import threading
+import time
+
+import requests
+
+try:
+    from websockets.sync.client import connect as ws_connect
+except ImportError:  # websockets yoksa periyodik REST yoklamasına düşülür
+    ws_connect = None
+
+logger = logging.getLogger(__name__)
+
+# Plan durumunun HA'daki karşılığı (domain'e göre)
+_DESIRED = {
+    "cover": {"open": "open", "on": "open", "off": "closed"},
+}
+_OFF_STATES = {"off", "standby", "closed", "unavailable", "unknown"}
+
+
+def ws_url_for(base_url):
+    return base_url.replace("https://", "wss://").replace("http://", "ws://").rstrip("/") + "/api/websocket"
+
+
+def authenticate(ws, token, timeout):
+    """HA WebSocket el sıkışması: auth_required → auth → auth_ok."""
+    msg = json.loads(ws.recv(timeout=timeout))
+    if msg.get("type") == "auth_required":
+        ws.send(json.dumps({"type": "auth", "access_token": token}))
+        msg = json.loads(ws.recv(timeout=timeout))
+    if msg.get("type") != "auth_ok": raise PermissionError(f"WebSocket kimlik doğrulaması başarısız: {msg}")
+
+
+class StateMirror:
+    """Home Assistant entity durumlarının bellekteki kopyası.
+
+    Tek bir toplu `/api/states` çağrısıyla başlar, ardından WebSocket
+    `state_changed` aboneliğiyle güncel kalır. Bağlantı koparsa yeniden
+    bağlanır ve kaçırılan olaylar için tekrar toplu okuma yapar.
+    """
+
+    def __init__(self, base_url, token, ws_url=None, session=None, timeout=5, reconnect_delay=5, poll_interval=30):
+        self.base_url = base_url.rstrip("/")
+        self.token = token
+        self.ws_url = ws_url or ws_url_for(self.base_url)
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.reconnect_delay = reconnect_delay
+        self.poll_interval = poll_interval
+        self.connected = False
+        self.connected_at = None  # geçerli WebSocket aboneliğinin başladığı an
+        self.last_update = None
+        self._states = {}
+        self._received = {}  # entity_id -> durumun aynaya yazıldığı an
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    # --- okuma API'si ---
+    def get(self, entity_id):
+        return self._states.get(entity_id)
+
+    def state(self, entity_id):
+        entry = self._states.get(entity_id)
+        return entry["state"] if entry else None
+
+    def snapshot(self, entity_ids=None):
+        with self._lock:
+            if entity_ids is None: return dict(self._states)
+            return {eid: self._states.get(eid) for eid in entity_ids}
+
+    def __len__(self):
+        return len(self._states)
+
+    def add_listener(self, callback):
+        """callback(entity_id, eski_durum, yeni_durum) her değişiklikte çağrılır.
+
+        İlk toplu okumada eski_durum None'dır; bu bir değişiklik değil, başlangıç durumudur.
+        """
+        self._listeners.append(callback)
+
+    def is_fresh(self, entity_id):
+        """Durum canlı abonelik sırasında okunduysa True; bağlantı yokken ayna eskimiş olabilir."""
+        received = self._received.get(entity_id)
+        return self.connected and received is not None and self.connected_at is not None and received >= self.connected_at
+
+    def is_noop(self, action):
+        """Eylem entity'nin mevcut durumunu değiştirmeyecekse True (ör. zaten kapalı ışık).
+
+        Yalnızca ayna bağlı ve entity'nin durumu tazeyse atlanır; emin olunamıyorsa eylem gönderilir.
+        """
+        entity_id = action.get("entity_id", "")
+        domain = entity_id.split(".")[0]
+        if domain == "scene" or set(action) - {"entity_id", "state"}: return False
+        if not self.is_fresh(entity_id): return False
+        current = self.state(entity_id)
+        if current is None: return False
+        desired = action.get("state")
+        if desired in _DESIRED.get(domain, {}): return current == _DESIRED[domain][desired]
+        if desired == "off": return current == "off"
+        if desired in ["on", "open"]: return current not in _OFF_STATES
+        return False
+
+    # --- arka plan senkronizasyonu ---
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="ha-state-mirror", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def bootstrap(self):
+        resp = self.session.get(f"{self.base_url}/api/states", headers={"Authorization": f"Bearer {self.token}"}, timeout=self.timeout)
+        resp.raise_for_status()
+        fresh = {s["entity_id"]: s for s in resp.json()}
+        now = time.time()
+        with self._lock:
+            old = self._states
+            self._states = fresh
+            self._received = dict.fromkeys(fresh, now)
+        self.last_update = now
+        # Yeniden bağlanmalarda yalnızca gerçekten değişen (ya da silinen) entity'ler bildirilir
+        for eid, new in fresh.items():
+            if old.get(eid, {}).get("state") != new.get("state"): self._notify(eid, old.get(eid), new)
+        for eid in old.keys() - fresh.keys(): self._notify(eid, old[eid], None)
+        return len(fresh)
+
+    def apply_event(self, event):
+        data = event.get("data", {})
+        entity_id = data.get("entity_id")
+        if not entity_id: return
+        new = data.get("new_state")
+        with self._lock:
+            old = self._states.get(entity_id)
+            if new is None:
+                self._states.pop(entity_id, None)
+                self._received.pop(entity_id, None)
+            else:
+                self._states[entity_id] = new
+                self._received[entity_id] = time.time()
+        self.last_update = time.time()
+        self._notify(entity_id, old, new)
+
+    def _notify(self, entity_id, old, new):
+        for callback in self._listeners:
+            try:
+                callback(entity_id, old, new)
+            except Exception:
+                logger.exception("Durum dinleyicisi hata verdi (%s)", entity_id)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.bootstrap()
+                if ws_connect is None:
+                    self._stop.wait(self.poll_interval)
+                    continue
+                self._subscribe()
+            except Exception as e:
+                logger.warning("HA durum aynası bağlantısı koptu: %s", e)
+            self.connected = False
+            self._stop.wait(self.reconnect_delay)
+
+    def _subscribe(self):
+        with ws_connect(self.ws_url, open_timeout=self.timeout, max_size=None) as ws:
+            authenticate(ws, self.token, self.timeout)
+            ws.send(json.dumps({"id": 1, "type": "subscribe_events", "event_type": "state_changed"}))
+            self.connected_at = time.time()
+            self.connected = True
+            # Abonelik ile toplu okuma arasındaki boşlukta kaçan olaylar için bir kez daha oku
+            self.bootstrap()
+            while not self._stop.is_set():
+                msg = json.loads(ws.recv())
+                if msg.get("type") == "event": self.apply_event(msg.get("event", {}))
+                elif msg.get("type") == "result" and not msg.get("success", True):
+                    raise RuntimeError(f"Abonelik reddedildi: {msg.get('error')}")
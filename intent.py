@@ -0,0 +1,217 @@
+import re
+import time
+from dataclasses import dataclass
+
+from catalog import ENTITY_NAMES
+
+# --- NORMALİZASYON ---
+_FOLD = str.maketrans("çğıöşüâîû", "cgiosuaiu")
+_PARENS = re.compile(r"\([^)]*\)")
+_NON_WORD = re.compile(r"[^a-z0-9%]+")
+
+# Çekim ekleri; kök adayları üretilirken sondan soyulur
+SUFFIXES = [
+    "larini", "lerini", "lari", "leri", "lar", "ler", "sini", "sunu", "ini", "unu", "nin", "nun", "ina", "una",
+    "yla", "yle", "yi", "yu", "ya", "ye", "si", "su", "ni", "nu", "na", "ne", "in", "un", "im", "um", "mi", "mu",
+    "da", "de", "ta", "te", "dan", "den", "tan", "ten", "ki", "i", "u", "a", "e", "m", "n",
+]
+_MUTATIONS = {"g": "k", "b": "p", "d": "t"}
+
+
+def normalize(text):
+    """Türkçe küçük harf, parantez içi açıklamaları at, aksanları katla."""
+    text = text.replace("I", "ı").replace("İ", "i").lower()
+    text = _PARENS.sub(" ", text).translate(_FOLD).replace("'", "").replace("’", "")
+    return " ".join(_NON_WORD.sub(" ", text).split())
+
+
+def candidates(token, min_len=2):
+    """Ekleri soyarak (ve ünsüz yumuşamasını geri alarak) olası kökleri uzundan kısaya üretir."""
+    seen, frontier = {token}, [token]
+    while frontier:
+        word = frontier.pop()
+        for suffix in SUFFIXES:
+            if word.endswith(suffix) and len(word) - len(suffix) >= min_len:
+                root = word[:-len(suffix)]
+                for r in (root, root[:-1] + _MUTATIONS[root[-1]]) if root[-1] in _MUTATIONS else (root,):
+                    if r not in seen:
+                        seen.add(r)
+                        frontier.append(r)
+    return sorted(seen, key=len, reverse=True)
+
+
+# --- SÖZLÜK ---
+EXTRA_ALIASES = {
+    "light.salon_isigi": ["salon lamba"],
+    "climate.klima": ["klima", "isitici"],
+    "fan.fan_salon": ["fan", "vantilator"],
+    "cover.perde_salon": ["perde"],
+    "media_player.tv_salon": ["tv", "televizyon"],
+    "media_player.muzik_sistemi": ["muzik"],
+    "switch.kahve_makinesi": ["kahve"],
+    "switch.cay_makinesi": ["cay"],
+    "switch.robot_supurge": ["supurge", "robot"],
+    "scene.film_gecesi": ["film", "film modu"],
+    "scene.sabah_rutini": ["sabah rutini"],
+    "scene.misafir_modu": ["misafir"],
+    "scene.enerji_tasarrufu": ["enerji tasarrufu", "tasarruf"],
+}
+
+ON_WORDS = {"ac", "acar", "acsana", "acabilir", "yak", "calistir", "baslat", "demle", "hazirla", "aktif", "gec", "etkinlestir"}
+OFF_WORDS = {"kapat", "kapa", "durdur", "sondur", "kapatabilir", "kapatir"}
+SET_WORDS = {"yap", "ayarla", "getir", "al", "cek"}
+ALL_WORDS = {"tum", "butun", "hepsi"}
+FILLER_WORDS = {"lutfen", "bir", "biraz", "hemen", "simdi", "mi", "mis", "misin", "musun", "bana", "ve", "sonra",
+                "mod", "derece", "yuzde", "dakika", "dk", "saniye", "sn", "saat", "yarim", "seviye", "parlaklik",
+                "gece", "ev", "oda", "tamam"}
+UNITS = {"saniye": 1, "sn": 1, "dakika": 60, "dk": 60, "saat": 3600}
+MODES = {"isitma": "heat", "isit": "heat", "sogutma": "cool", "sogut": "cool", "nem": "dry"}
+VERB_WORDS = ON_WORDS | OFF_WORDS | SET_WORDS
+# Olumsuzluk ekleri ("kapatma", "açmayın", "açmasın"); soyulursa olumlu fiile dönüşürler
+NEGATIONS = ["mayalim", "meyelim", "mayiniz", "meyiniz", "masinlar", "mesinler", "mayin", "meyin", "masin", "mesin",
+             "ma", "me"]
+TEMPERATURE_RANGE = (16, 30)
+
+# Koşul, tekrar ve saat içeren cümleler LLM'e bırakılır
+_LLM_ONLY = re.compile(r"\b(eger|yoksa|ise|iken|olursa|gore|her|hatirlat\w*|neden|nasil|kac)\b|\d+(de|da|te|ta)\b|\b\w+(sa|se)\b")
+_DELAY = re.compile(r"\b((?:(?:\d+|yarim)\s*(?:saniye|sn|dakika|dk|saat)\w*\s+)+)sonra\b")
+_DELAY_TERM = re.compile(r"(\d+|yarim)\s*(saniye|sn|dakika|dk|saat)")
+_PERCENT = re.compile(r"(?:%\s*(\d{1,3})|yuzde\s*(\d{1,3}))")
+_DEGREES = re.compile(r"\b(\d{2})\s*derece")
+
+STATE_TEXT = {"on": "açıldı 🟢", "open": "açıldı 🟢", "off": "kapatıldı 🔴"}
+LATER_TEXT = {"on": "açılacak 🟢", "open": "açılacak 🟢", "off": "kapatılacak 🔴"}
+
+
+def negated(token):
+    """Fiilin olumsuz hâli mi ("kapatma", "açmayın")?"""
+    return any(token.endswith(n) and token[:-len(n)] in VERB_WORDS for n in NEGATIONS)
+
+
+@dataclass
+class IntentMatch:
+    plan: dict = None  # None ise LLM'e gidilmeli
+    path: str = "llm"  # "local" ya da "llm"
+    reason: str = ""
+    elapsed: float = 0.0
+
+
+class IntentMatcher:
+    """ENTITY_NAMES ve komut kataloğundan derlenen deterministik Türkçe niyet eşleştirici.
+
+    Yalnızca tüm kelimeleri açıklanabilen, koşulsuz komutları yerelde planlar;
+    diğer her şey (`path == "llm"`) modele bırakılır.
+    """
+
+    def __init__(self, names=ENTITY_NAMES, extra_aliases=EXTRA_ALIASES):
+        self.names = names
+        self._memo = {}
+        # kök adayı -> kanonik kelime; sabit kelime kümeleri önce yazılır ki takma adlar onları ezmesin
+        self.lexicon = {w: w for w in ON_WORDS | OFF_WORDS | SET_WORDS | ALL_WORDS | FILLER_WORDS | set(MODES)}
+        self.aliases = {}  # entity_id -> [frozenset(kanonik kelime)]
+        for eid, label in names.items():
+            phrases = [normalize(p).split() for p in [label] + extra_aliases.get(eid, [])]
+            for word in (w for words in phrases for w in words):
+                for c in candidates(word, min_len=3): self.lexicon.setdefault(c, word)
+            self.aliases[eid] = [frozenset(self.canonical(w) for w in words) for words in phrases if words]
+        # kanonik kelime -> o kelimeyi içeren (entity, alias) çiftleri
+        self.index = {}
+        for eid, alias_list in self.aliases.items():
+            for alias in alias_list:
+                for w in alias: self.index.setdefault(w, []).append((eid, alias))
+        self.light_word = self.canonical("isik")
+
+    def canonical(self, token):
+        if token.isdigit() or token.startswith("%"): return token
+        if token not in self._memo:
+            self._memo[token] = next((self.lexicon[c] for c in candidates(token) if c in self.lexicon), None)
+        return self._memo[token]
+
+    def resolve(self, words):
+        """Kanonik kelime kümesinden entity'leri bulur; daha özel eşleşme genel olanı ezer."""
+        present = set(words)
+        matched = {}
+        for w in present:
+            for eid, alias in self.index.get(w, []):
+                if alias <= present and len(alias) > len(matched.get(eid, ())):
+                    matched[eid] = alias
+        if present & ALL_WORDS and self.light_word in present:
+            for eid in self.names:
+                if eid.startswith("light."): matched.setdefault(eid, frozenset({self.light_word}))
+        return [eid for eid, alias in matched.items()
+                if not any(alias < other and eid.split(".")[0] == o.split(".")[0] for o, other in matched.items() if o != eid)]
+
+    def match(self, text, user_name=""):
+        start = time.perf_counter()
+        result = self._match(text, user_name)
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    def _match(self, text, user_name):
+        norm = normalize(text)
+        if not norm: return IntentMatch(reason="boş komut")
+        if _LLM_ONLY.search(norm): return IntentMatch(reason="koşullu/tekrarlı ifade")
+
+        raw = norm.split()
+        if any(negated(t) for t in raw): return IntentMatch(reason="olumsuz ifade")
+        tokens = [self.canonical(t) for t in raw]
+        unknown = [r for r, t in zip(raw, tokens) if t is None]
+        if unknown: return IntentMatch(reason=f"tanınmayan kelimeler: {', '.join(unknown)}")
+
+        entities = self.resolve(tokens)
+        if not entities: return IntentMatch(reason="cihaz bulunamadı")
+
+        present = set(tokens)
+        wants_on, wants_off = bool(present & ON_WORDS), bool(present & OFF_WORDS)
+        if wants_on and wants_off: return IntentMatch(reason="çelişkili fiiller")
+
+        percent = _PERCENT.search(norm)
+        degrees = _DEGREES.search(norm)
+        mode = next((MODES[t] for t in tokens if t in MODES), None)
+        has_value = bool(percent or degrees or mode)
+        only_scenes = all(e.startswith("scene.") for e in entities)
+        if not (wants_on or wants_off or (present & SET_WORDS and has_value) or only_scenes):
+            return IntentMatch(reason="fiil bulunamadı")
+
+        actions, used_value = [], False
+        for eid in entities:
+            domain = eid.split(".")[0]
+            if domain == "scene":
+                if wants_off: return IntentMatch(reason="sahne kapatılamaz")
+                actions.append({"entity_id": eid, "state": "on"})
+                continue
+            if wants_off:
+                actions.append({"entity_id": eid, "state": "off"})
+                continue
+            action = {"entity_id": eid, "state": "open" if domain == "cover" else "on"}
+            if percent and domain == "light":
+                brightness = min(100, int(percent.group(1) or percent.group(2)))
+                if brightness: action["brightness_pct"] = brightness
+                else: action["state"] = "off"  # "%0 yap" ışığı kapatmak demek
+                used_value = True
+            if domain == "climate" and (degrees or mode):
+                if degrees:
+                    low, high = TEMPERATURE_RANGE
+                    if not low <= int(degrees.group(1)) <= high:
+                        return IntentMatch(reason=f"sıcaklık {low}-{high}°C aralığında değil")
+                    action["temperature"] = int(degrees.group(1))
+                if mode: action["mode"] = mode
+                used_value = True
+            actions.append(action)
+        if has_value and not used_value: return IntentMatch(reason="değer hiçbir cihaza uymuyor")
+
+        plan = {"actions": actions, "timers": []}
+        delay = _DELAY.search(norm)
+        if delay:
+            # "1 saat 30 dakika sonra": bütün terimler toplanır
+            terms = _DELAY_TERM.findall(delay.group(1))
+            seconds = int(sum((0.5 if amount == "yarim" else int(amount)) * UNITS[unit] for amount, unit in terms))
+            plan = {"actions": [], "timers": [{**a, "delay_seconds": seconds} for a in actions]}
+
+        devices = ", ".join(self.names.get(a["entity_id"], a["entity_id"]) for a in actions)
+        if delay: verb = LATER_TEXT.get(actions[0]["state"], "ayarlanacak") if not only_scenes else "aktif edilecek 🎬"
+        else: verb = STATE_TEXT.get(actions[0]["state"], "ayarlandı") if not only_scenes else "aktif edildi 🎬"
+        when = " ".join(f"{amount.replace('yarim', 'yarım')} {unit}" for amount, unit in terms) + " sonra " if delay else ""
+        hello = f"Tamamdır {user_name}! " if user_name else "Tamamdır! "
+        plan["response"] = f"{hello}{devices} {when}{verb}."
+        return IntentMatch(plan=plan, path="local", reason="yerel eşleşme")
@@ -0,0 +1,143 @@
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class StreamingPlanParser:
+    """Model çıktısını parça parça okuyup tamamlanan `actions` nesnelerini hemen verir.
+
+    Kök nesnenin anahtarlarını izleyen küçük bir durum makinesidir; ```json
+    çitleri ve önündeki metin ilk `{` görülene kadar atlanır. `response`
+    metni de akarken okunabilir.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.actions = []  # (dizideki sıra, nesne)
+        self.done = False
+        self._root = [None, None]  # kök nesnenin başlangıç/bitiş indeksleri
+        self._pos = 0
+        self._stack = []
+        self._in_string = self._escape = False
+        self._expect_key = False
+        self._key = None
+        self._string_start = None
+        self._object_start = None
+        self._action_index = 0
+        self._response_raw = None
+
+    def feed(self, chunk):
+        """Parçayı işler; bu parçayla tamamlanan (sıra, eylem) çiftlerini döner."""
+        self.text += chunk
+        completed = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self.done: break
+            if not self._stack:
+                if ch == "{":
+                    self._stack.append(ch)
+                    self._expect_key = True
+                    self._root[0] = i
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    self._end_string(i)
+                    continue
+                if self._capturing_response(): self._response_raw += ch
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+                if self._capturing_response(): self._response_raw = ""
+            elif ch in "{[":
+                self._stack.append(ch)
+                if ch == "{" and self._in_actions(): self._object_start = i
+            elif ch in "}]":
+                if ch == "}" and self._in_actions() and self._object_start is not None:
+                    completed.extend(self._emit(text[self._object_start:i + 1]))
+                    self._object_start = None
+                self._stack.pop()
+                if not self._stack:
+                    self.done = True
+                    self._root[1] = i + 1
+            elif ch == "," and len(self._stack) == 1:
+                self._expect_key = True
+        self._pos = len(text)
+        return completed
+
+    @property
+    def json_text(self):
+        """Kök nesne kapandıysa yalnızca onun metni, yoksa çitlerden arındırılmış tüm metin."""
+        if self.done: return self.text[self._root[0]:self._root[1]]
+        return strip_fences(self.text)
+
+    @property
+    def response_text(self):
+        raw = self._response_raw
+        if not raw: return ""
+        if raw.endswith("\\") and not raw.endswith("\\\\"): raw = raw[:-1]
+        try:
+            return json.loads(f'"{raw}"')
+        except ValueError:
+            return raw.replace("\\n", "\n").replace('\\"', '"')
+
+    # --- iç işleyiş ---
+    def _in_actions(self):
+        return len(self._stack) == 3 and self._stack[1] == "[" and self._key == "actions"
+
+    def _capturing_response(self):
+        return len(self._stack) == 1 and not self._expect_key and self._key == "response"
+
+    def _end_string(self, i):
+        if len(self._stack) == 1 and self._expect_key:
+            self._key = json.loads(self.text[self._string_start:i + 1])
+            self._expect_key = False
+
+    def _emit(self, raw):
+        index = self._action_index
+        self._action_index += 1
+        try:
+            action = json.loads(raw)
+        except ValueError:
+            logger.debug("Akıştaki eylem ayrıştırılamadı, sona bırakıldı: %s", raw)
+            return []
+        self.actions.append((index, action))
+        return [(index, action)]
+
+
+def strip_fences(content):
+    content = content.strip()
+    if "```json" in content: content = content.replace("```json", "").replace("```", "").strip()
+    return content
+
+
+def stream_completion(client, on_action=None, on_text=None, **kwargs):
+    """Sohbet tamamlamasını akış olarak alır; eylemleri ve yanıt metnini geldikçe bildirir.
+
+    (tam metin, usage, ilk eylem gecikmesi, toplam süre, parser) döner.
+    """
+    start = time.perf_counter()
+    parser = StreamingPlanParser()
+    usage, first_action = None, None
+    stream = client.chat.completions.create(stream=True, stream_options={"include_usage": True}, **kwargs)
+    last_text = ""
+    for chunk in stream:
+        if getattr(chunk, "usage", None): usage = chunk.usage
+        if not chunk.choices: continue
+        delta = chunk.choices[0].delta.content or ""
+        if not delta: continue
+        for index, action in parser.feed(delta):
+            if first_action is None: first_action = time.perf_counter() - start
+            if on_action: on_action(index, action)
+        if on_text and parser.response_text != last_text:
+            last_text = parser.response_text
+            on_text(last_text)
+    return parser.json_text, usage, first_action, time.perf_counter() - start, parser
@@ -0,0 +1,271 @@
+"""Sıcak yol ölçümleri: aşama süreleri, sayaçlar, son komut izleri.
+
+Dışa aktarım iki yolla yapılır:
+- `MetricsServer`: Prometheus metin biçiminde `/metrics` (ve `/metrics.json`).
+- `Metrics(jsonl_path=...)`: her komut izini dönen bir JSONL dosyasına ekler.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "akilli_ev_"
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+HELP = {
+    "commands_total": "İşlenen komutlar (yola göre)",
+    "command_errors_total": "Hata ile biten komutlar (hata türüne göre)",
+    "command_parse_failures_total": "JSON olarak çözülemeyen LLM yanıtları",
+    "plan_parse_total": "LLM planlarının ayrıştırma sonucu (ok / extracted / repaired / failed)",
+    "llm_reasks_total": "Çıktı onarılamadığı için yapılan ikinci LLM çağrıları; oranı commands_total{path=\"llm\"} ile bölünerek bulunur",
+    "command_seconds": "Komutun uçtan uca süresi",
+    "stage_seconds": "Aşama başına süre",
+    "llm_tokens_total": "LLM token kullanımı (türe göre)",
+    "ha_calls_total": "HA servis çağrısı sonuçları",
+    "actions_rejected_total": "Kayıt defteri doğrulamasında reddedilen eylemler",
+    "stt_requests_total": "Ses tanıma istekleri (sonuç ve arka uca göre)",
+    "stt_audio_seconds": "Tanınan kayıtların süresi",
+    "engine_queue_depth": "Motor kuyruğunda bekleyen komutlar",
+    "engine_commands_total": "Motorun işlediği komutlar (ok / error / busy: kuyruk dolu)",
+    "rule_evaluations_total": "Durum değişikliklerinde çalışan koşul testleri (paylaşılan koşullar bir kez test edilir)",
+    "rule_eval_seconds_total": "Kural değerlendirmesinde geçen toplam süre; rule_state_changes_total ile bölününce değişiklik başına süre",
+}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    if not labels: return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())) + "}"
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound: self.counts[i] += 1
+
+
+class Metrics:
+    """İş parçacığı güvenli sayaç/histogram kaydı ve son N komut izi."""
+
+    def __init__(self, trace_size=50, jsonl_path=None, jsonl_max_bytes=5_000_000, buckets=DEFAULT_BUCKETS):
+        self.jsonl_path = jsonl_path
+        self.jsonl_max_bytes = jsonl_max_bytes
+        self.buckets = buckets
+        self.traces = deque(maxlen=trace_size)
+        self._counters = {}  # (ad, etiketler) -> değer
+        self._histograms = {}  # (ad, etiketler) -> Histogram
+        self._collectors = []  # () -> [(ad, etiketler, değer, tür)]
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+
+    # --- kayıt ---
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock: self._counters[key] = self._counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None: hist = self._histograms[key] = Histogram(self.buckets)
+            hist.observe(value)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stage_seconds", time.perf_counter() - start, stage=name)
+
+    def add_collector(self, collector):
+        """collector() okuma anında [(ad, etiketler, değer, "gauge"|"counter")] döner."""
+        self._collectors.append(collector)
+
+    def record_command(self, result):
+        """pipeline.CommandResult'ı sayaçlara, histogramlara ve iz listesine işler."""
+        self.inc("commands_total", path=result.path or "none")
+        self.observe("command_seconds", result.total, path=result.path or "none")
+        for stage, seconds in result.timings.items(): self.observe("stage_seconds", seconds, stage=stage)
+        for kind, tokens in result.usage.items():
+            if tokens: self.inc("llm_tokens_total", tokens, kind=kind)
+        for outcome, count in result.ha_outcomes.items(): self.inc("ha_calls_total", count, outcome=outcome)
+        for _, reason in result.rejected: self.inc("actions_rejected_total", reason=reason.split(":")[0])
+        if not result.parsed: self.inc("command_parse_failures_total")
+        if result.parse: self.inc("plan_parse_total", result=result.parse)
+        if result.reasked: self.inc("llm_reasks_total")
+        trace = {
+            "ts": time.time(),
+            "text": result.text,
+            "path": result.path,
+            "total": round(result.total, 6),
+            "timings": {k: round(v, 6) for k, v in result.timings.items()},
+            "ha": result.ha_outcomes,
+            "rejected": [f"{eid} ({reason})" for eid, reason in result.rejected],
+            "tokens": result.usage,
+            "parsed": result.parsed,
+            "parse": result.parse,
+            "reasked": result.reasked,
+        }
+        self.traces.appendleft(trace)
+        if self.jsonl_path: self._append_jsonl(trace)
+
+    # --- okuma ---
+    def _collected(self):
+        rows = []
+        for collector in self._collectors:
+            try:
+                rows.extend(collector())
+            except Exception:
+                logger.exception("Metrik toplayıcısı hata verdi")
+        return rows
+
+    def snapshot(self):
+        with self._lock:
+            counters = {f"{name}{_labels(dict(labels))}": value for (name, labels), value in self._counters.items()}
+            histograms = {f"{name}{_labels(dict(labels))}": {"count": h.count, "sum": h.sum}
+                          for (name, labels), h in self._histograms.items()}
+        gauges = {f"{name}{_labels(labels)}": value for name, labels, value, _ in self._collected()}
+        return {"counters": counters, "histograms": histograms, "gauges": gauges, "traces": list(self.traces)}
+
+    def render_prometheus(self):
+        lines, typed = [], set()
+
+        def header(name, kind):
+            if name in typed: return
+            typed.add(name)
+            if name in HELP: lines.append(f"# HELP {PREFIX}{name} {HELP[name]}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            histograms = [(key, list(h.counts), h.sum, h.count) for key, h in histograms]
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{PREFIX}{name}{_labels(dict(labels))} {value}")
+        for (name, labels), counts, total, count in histograms:
+            header(name, "histogram")
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f"{PREFIX}{name}_bucket{_labels({**dict(labels), 'le': bound})} {bucket_count}")
+            lines.append(f"{PREFIX}{name}_bucket{_labels({**dict(labels), 'le': '+Inf'})} {count}")
+            lines.append(f"{PREFIX}{name}_sum{_labels(dict(labels))} {total}")
+            lines.append(f"{PREFIX}{name}_count{_labels(dict(labels))} {count}")
+        for name, labels, value, kind in self._collected():
+            header(name, kind)
+            lines.append(f"{PREFIX}{name}{_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def _append_jsonl(self, trace):
+        try:
+            os.makedirs(os.path.dirname(self.jsonl_path) or ".", exist_ok=True)
+            with self._file_lock:
+                if os.path.exists(self.jsonl_path) and os.path.getsize(self.jsonl_path) > self.jsonl_max_bytes:
+                    os.replace(self.jsonl_path, f"{self.jsonl_path}.1")
+                with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(trace, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.warning("Metrik dosyasına yazılamadı (%s): %s", self.jsonl_path, e)
+
+
+class MetricsServer:
+    """`/metrics` (Prometheus metni) ve `/metrics.json` sunan küçük HTTP sunucusu."""
+
+    def __init__(self, metrics, port=9464, host="127.0.0.1"):
+        self.metrics = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.startswith("/metrics.json"):
+                    body, content_type = json.dumps(metrics.snapshot(), ensure_ascii=False).encode(), "application/json"
+                elif self.path.startswith("/metrics"):
+                    body, content_type = metrics.render_prometheus().encode(), "text/plain; version=0.0.4; charset=utf-8"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._http = ThreadingHTTPServer((host, port), Handler)
+        self.port = self._http.server_port
+
+    def start(self):
+        threading.Thread(target=self._http.serve_forever, name="metrics-http", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._http.shutdown()
+
+
+def runtime_collector(scheduler=None, plan_cache=None, weather_cache=None, state_mirror=None, registry=None, breakers=None, engine=None,
+                      timeseries=None, rules=None):
+    """Uygulama bileşenlerinin anlık durumunu (kuyruk, önbellek, ayna...) okuyan toplayıcı."""
+    def collect():
+        rows = []
+        if scheduler is not None:
+            rows += [("timer_backlog", {}, len(scheduler), "gauge"),
+                     ("timer_lag_seconds", {}, scheduler.last_lag, "gauge"),
+                     ("timers_fired_total", {}, scheduler.fired, "counter"),
+                     ("timers_failed_total", {}, scheduler.failed, "counter")]
+        if plan_cache is not None:
+            stats = plan_cache.stats()
+            rows += [("plan_cache_entries", {}, stats["size"], "gauge"),
+                     ("plan_cache_lookups_total", {"result": "hit"}, stats["hits"], "counter"),
+                     ("plan_cache_lookups_total", {"result": "miss"}, stats["misses"], "counter")]
+        if weather_cache is not None:
+            rows += [("weather_age_seconds", {}, weather_cache.get().age() or 0, "gauge"),
+                     ("weather_failures_total", {}, weather_cache.failures, "counter")]
+        if state_mirror is not None:
+            rows += [("ha_mirror_connected", {}, int(state_mirror.connected), "gauge"),
+                     ("ha_mirror_entities", {}, len(state_mirror), "gauge")]
+        if registry is not None:
+            rows += [("entity_registry_entities", {"source": registry.source}, len(registry), "gauge"),
+                     ("entity_registry_age_seconds", {}, time.time() - registry.synced_at if registry.synced_at else 0, "gauge")]
+        for breaker in breakers or []:
+            labels = {"endpoint": breaker.name}
+            rows += [("circuit_open", labels, int(breaker.is_open), "gauge"),
+                     ("circuit_trips_total", labels, breaker.trips, "counter"),
+                     ("circuit_rejections_total", labels, breaker.rejected, "counter")]
+        if timeseries is not None:
+            rows += [("timeseries_records", {}, len(timeseries), "gauge"),
+                     ("timeseries_bytes", {}, timeseries.nbytes, "gauge")]
+        if rules is not None:
+            rows += [("rules_active", {}, len(rules), "gauge"),
+                     ("rules_fired_total", {}, rules.fired, "counter"),
+                     ("rules_failed_total", {}, rules.failed, "counter"),
+                     ("rule_state_changes_total", {}, rules.changes, "counter"),
+                     ("rule_evaluations_total", {}, rules.evaluations, "counter"),
+                     ("rule_eval_seconds_total", {}, rules.eval_seconds, "counter")]
+        if engine is not None:
+            stats = engine.stats()
+            rows += [("engine_queue_depth", {}, stats["queued"], "gauge"),
+                     ("engine_in_flight", {}, stats["in_flight"], "gauge"),
+                     ("engine_users", {}, stats["users"], "gauge"),
+                     ("engine_commands_total", {"result": "ok"}, stats["processed"], "counter"),
+                     ("engine_commands_total", {"result": "error"}, stats["failed"], "counter"),
+                     ("engine_commands_total", {"result": "busy"}, stats["rejected"], "counter")]
+        return rows
+    return collect
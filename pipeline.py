@@ -0,0 +1,298 @@
+"""Komut işleme hattı: metin → plan (yerel / önbellek / LLM) → HA gönderimi → zamanlayıcılar ve kurallar.
+
+Streamlit'ten bağımsızdır; arayüz ve ölçüm aracı (benchmark.py) aynı hattı kullanır.
+"""
+import logging
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+from catalog import ENTITY_NAMES
+from llm_stream import stream_completion, strip_fences
+from plan_parser import PlanParseError, clean_action, parse_plan, reask_message
+from planner import action_signature, plan_calls
+from prompt_builder import STATIC_PREFIX, build_messages, log_usage
+from resilience import CircuitOpen, Deadline, DeadlineExceeded, is_transient, retry
+from scheduler import PLAN_KEYS as TIMER_KEYS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "grok-4-1-fast-reasoning"
+
+
+@dataclass
+class CommandResult:
+    text: str
+    reply: str = ""
+    logs: list = field(default_factory=list)
+    path: str = ""  # local | cache | llm | fallback (LLM'e ulaşılamadı)
+    path_note: str = ""
+    data: dict = None  # ayrıştırılmış plan; JSON çözülemediyse None
+    raw: str = ""  # LLM'in ham çıktısı
+    timings: dict = field(default_factory=dict)  # aşama -> saniye
+    total: float = 0.0
+    errors: int = 0  # başarısız HA çağrısı sayısı
+    usage: dict = field(default_factory=dict)  # prompt / completion / cached token sayıları
+    ha_outcomes: dict = field(default_factory=dict)  # ok / error / skipped / simulated / sent / timeout -> adet
+    rejected: list = field(default_factory=list)  # (entity_id, neden): kayıt defteri doğrulamasından geçemeyen eylemler
+    parse: str = ""  # LLM planı için: ok | extracted | repaired | failed (bkz. plan_parser)
+    reasked: bool = False  # çıktı onarılamadığı için ikinci bir LLM çağrısı yapıldı
+
+    @property
+    def parsed(self):
+        return self.data is not None
+
+    def markdown(self):
+        if not self.parsed: return self.raw + ("\n\n---\n" + "\n\n".join(self.logs) if self.logs else "")
+        html = f"**{self.reply}**\n\n"
+        if self.logs: html += "---\n" + "\n\n".join(self.logs)
+        return html + f"\n\n_{self.path_note}_"
+
+
+class CommandPipeline:
+    """Bir komutu baştan sona işler; her aşamanın süresini `CommandResult.timings`e yazar."""
+
+    def __init__(self, client, weather_cache, dispatcher, scheduler=None, intent_matcher=None, plan_cache=None,
+                 debouncer=None, state_mirror=None, names=ENTITY_NAMES, model=DEFAULT_MODEL, streaming=True, deadline=5.0,
+                 metrics=None, registry=None, llm_breaker=None, llm_timeout=20.0, llm_retries=1, budget=30.0, timeseries=None,
+                 rules=None):
+        self.client = client
+        self.weather_cache = weather_cache
+        self.dispatcher = dispatcher
+        self.scheduler = scheduler
+        self.intent_matcher = intent_matcher
+        self.plan_cache = plan_cache
+        self.debouncer = debouncer
+        self.state_mirror = state_mirror
+        self.names = names
+        self.model = model
+        self.streaming = streaming
+        self.deadline = deadline
+        self.metrics = metrics
+        self.registry = registry
+        self.llm_breaker = llm_breaker
+        self.llm_timeout = llm_timeout
+        self.llm_retries = llm_retries
+        self.budget = budget  # komut başına toplam süre (LLM + HA); None: sınırsız
+        self.timeseries = timeseries  # gönderilen eylemler kaydedilir, alışkanlık özeti prompt'a girer
+        self.rules = rules  # koşullu/tekrarlı istekler yerel kural motoruna devredilir
+
+    def run(self, text, user_name="", history=(), on_text=None):
+        """`history` bu komuttan önceki sohbet mesajlarıdır; komut LLM'e son kullanıcı mesajı olarak eklenir."""
+        result = CommandResult(text)
+        start = time.perf_counter()
+
+        @contextmanager
+        def stage(name):
+            t0 = time.perf_counter()
+            try:
+                yield
+            finally:
+                result.timings[name] = result.timings.get(name, 0.0) + time.perf_counter() - t0
+
+        budget = Deadline(self.budget)
+        with stage("weather"): weather = self.weather_cache.get()
+        batch = self.dispatcher.batch(budget)
+        dispatched_early = {}  # plan indeksi -> akış sırasında gönderilen eylem
+        try:
+            data = None
+            intent = None
+            if self.intent_matcher is not None:
+                with stage("intent"): intent = self.intent_matcher.match(text, user_name)
+            cache_key = self.plan_cache.key(text, weather, user_name) if self.plan_cache is not None else None
+            if intent is not None and intent.plan is not None:
+                data, result.path = intent.plan, "local"
+                result.path_note = f"⚡ Yerel eşleştirici ({intent.elapsed * 1000:.1f} ms)"
+            elif cache_key is not None:
+                with stage("cache"): data = self.plan_cache.get(cache_key)
+                if data is not None: result.path, result.path_note = "cache", "♻️ Plan önbelleği"
+            if data is None:
+                result.path = "llm"
+                try:
+                    data = self._ask_llm(result, stage, text, user_name, weather, history, batch, dispatched_early, on_text, budget)
+                except Exception as e:
+                    if not (isinstance(e, (CircuitOpen, DeadlineExceeded)) or is_transient(e)): raise
+                    data = self._fallback(result, e)
+                else:
+                    if self.plan_cache is not None: self.plan_cache.put(cache_key, data)
+                    if intent is not None: result.path_note += f"; yerel eşleşmedi: {intent.reason})"
+                    else: result.path_note += ")"
+            logger.info("Komut yolu: %s | %s", result.path, text)
+            result.data = data
+            result.reply = data.get("response", "İşlem yapıldı.")
+
+            # Sorgular ağa çıkmadan yerel durum aynasından cevaplanır
+            if data.get("queries") and self.state_mirror is not None:
+                for q in data["queries"]:
+                    entry = self.state_mirror.get(q.get("entity_id"))
+                    if entry: result.logs.append(f"🔎 **Sorgu:** {self.names.get(entry['entity_id'], entry['entity_id'])} = {entry['state']} {entry.get('attributes', {}).get('unit_of_measurement', '')}")
+                    else: result.logs.append(f"🔎 **Sorgu:** {q.get('entity_id')} bulunamadı")
+
+            with stage("dispatch"):
+                # Kalan eylemler sadeleştirilip servis bazında tek isteklerde gruplanır
+                pending = [(i, a) for i, a in enumerate(data.get("actions") or []) if i not in dispatched_early]
+                calls, plan_report = plan_calls([a for _, a in pending], debouncer=self.debouncer, registry=self.registry)
+                for order, call in calls: batch.add(call, order=pending[order][0])
+                if self.timeseries is not None:
+                    self.timeseries.record_actions([*dispatched_early.values(), *(a for _, call in calls for a in call.actions)])
+                self._reject(result, plan_report.rejected)
+                if plan_report.merged or plan_report.dropped: result.logs.append(f"🧩 {plan_report.summary()}")
+                self._collect(result, batch)
+
+            if data.get("timers") and self.scheduler is not None:
+                with stage("timers"):
+                    for spec in data["timers"]:
+                        try:
+                            reason = self._validate_timer(spec)
+                            if not reason: timer = self.scheduler.add_from_plan(spec)
+                        except ValueError as e:
+                            reason = str(e)
+                        if reason:
+                            self._reject(result, [(spec.get("entity_id"), reason)], "⏰ ")
+                            continue
+                        msg_tmr = f"⏰ **Zamanlayıcı:** {int(timer.due - time.time())}sn"
+                        if timer.repeat: msg_tmr += f" 🔁 {timer.repeat}"
+                        if timer.reminder: msg_tmr += f" (Not: {timer.reminder})"
+                        result.logs.append(msg_tmr)
+
+            if data.get("rules") and self.rules is not None:
+                with stage("rules"):
+                    for spec in data["rules"]:
+                        try:
+                            rejected = self._validate_rule(spec)
+                            if not rejected: rule, created = self.rules.add_from_plan(spec)
+                        except ValueError as e:
+                            rejected = [("kural", str(e))]
+                        if rejected:
+                            self._reject(result, rejected, "📐 ")
+                            continue
+                        msg_rule = f"📐 **Kural{'' if created else ' (zaten vardı)'}:** {rule.describe(self.names)}"
+                        if self.rules.is_active(rule.id): msg_rule += " – koşul şu an sağlanıyor"
+                        result.logs.append(msg_rule)
+        except PlanParseError:
+            # Akış sırasında gönderilmiş eylemler varsa sonuçlarını da göster
+            logger.warning("LLM çıktısı düzeltme isteğinden sonra da çözülemedi: %.200s", result.raw)
+            result.parse = "failed"
+            if len(batch): self._collect(result, batch)
+        except Exception as e:
+            if self.metrics is not None: self.metrics.inc("command_errors_total", error=type(e).__name__)
+            raise
+        result.total = time.perf_counter() - start
+        if self.metrics is not None: self.metrics.record_command(result)
+        return result
+
+    def _ask_llm(self, result, stage, text, user_name, weather, history, batch, dispatched_early, on_text, budget):
+        with stage("prompt"):
+            # --- SYSTEM PROMPT (sabit önek + küçük dinamik bağlam) ---
+            prefix = self.registry.prompt_prefix() if self.registry is not None else STATIC_PREFIX
+            habits = self.timeseries.habit_summary() if self.timeseries is not None else ""
+            messages_api, prompt_stats = build_messages(user_name, weather, [*history, {"role": "user", "content": text}],
+                                                        prefix=prefix, habits=habits)
+        llm_args = dict(model=self.model, messages=messages_api, temperature=0.3, max_tokens=1000)
+
+        def complete():
+            llm_args["timeout"] = budget.timeout(self.llm_timeout)
+            if self.streaming:
+                # Eylemler JSON'da tamamlandıkça HA'ya gider, yanıt metni akarken yazılır
+                def on_action(index, action):
+                    # Doğrulanamayan eylem burada bırakılır; gönderim aşamasında reddedilip raporlanır
+                    action = clean_action(action)
+                    if action is None or (self.registry is not None and self.registry.validate(action)): return
+                    dispatched_early[index] = action
+                    if self.debouncer is None or self.debouncer.allow(action): batch.add(action, order=index)
+                result.raw, usage, first_action, llm_elapsed, _ = stream_completion(
+                    self.client, on_action=on_action, on_text=on_text, **llm_args
+                )
+                return usage, first_action, llm_elapsed
+            llm_start = time.perf_counter()
+            response = self.client.chat.completions.create(**llm_args)
+            result.raw = strip_fences(response.choices[0].message.content)
+            return response.usage, None, time.perf_counter() - llm_start
+
+        attempt = complete if self.llm_breaker is None else lambda: self.llm_breaker.call(complete)
+        with stage("llm"):
+            # Tamamlama yan etkisizdir; ancak akışta eylem gönderildiyse tekrar istemek çift gönderim olur
+            usage, first_action, llm_elapsed = retry(attempt, attempts=1 + self.llm_retries, deadline=budget,
+                                                     should_retry=lambda e: not dispatched_early and is_transient(e))
+        log_usage(prompt_stats, usage, llm_elapsed)
+        self._add_usage(result, usage)
+        if first_action is not None: result.timings["first_action"] = first_action
+        result.path_note = f"🧠 LLM ({llm_elapsed:.1f} sn"
+        if first_action is not None: result.path_note += f", ilk eylem {first_action:.1f} sn"
+        with stage("parse"):
+            try:
+                parsed, error = parse_plan(result.raw), None
+            except PlanParseError as e:
+                parsed, error = None, e
+        if parsed is None:
+            # Çıkarma ve onarım yetmedi: modele hatası söylenip tek bir düzeltme istenir
+            logger.warning("LLM çıktısı onarılamadı, düzeltme isteniyor (%s): %.200s", error, result.raw)
+            result.reasked = True
+            with stage("reask"): parsed = self._reask(result, llm_args, error, budget)
+            if dispatched_early:
+                # Akışta gönderilmiş eylemler düzeltilmiş planda yeniden gönderilmez
+                sent = {action_signature(a) for a in dispatched_early.values()}
+                dispatched_early.clear()
+                dispatched_early.update({i: a for i, a in enumerate(parsed.data.get("actions") or []) if action_signature(a) in sent})
+            result.path_note += ", düzeltme istendi"
+        result.parse = parsed.status
+        for issue in parsed.issues: logger.info("Plan şemaya uyduruldu: %s", issue)
+        return parsed.data
+
+    def _reask(self, result, llm_args, error, budget):
+        """Onarılamayan çıktı için tek, akışsız düzeltme isteği; bu da çözülemezse PlanParseError."""
+        messages = [*llm_args["messages"], {"role": "assistant", "content": result.raw[:2000]}, reask_message(error)]
+
+        def complete():
+            return self.client.chat.completions.create(**{**llm_args, "messages": messages, "temperature": 0,
+                                                          "timeout": budget.timeout(self.llm_timeout)})
+
+        response = complete() if self.llm_breaker is None else self.llm_breaker.call(complete)
+        self._add_usage(result, response.usage)
+        result.raw = strip_fences(response.choices[0].message.content or "")
+        return parse_plan(result.raw)
+
+    @staticmethod
+    def _add_usage(result, usage):
+        if usage is None: return
+        details = getattr(usage, "prompt_tokens_details", None)
+        counts = {"prompt": usage.prompt_tokens, "completion": usage.completion_tokens,
+                  "cached": (getattr(details, "cached_tokens", None) or 0) if details else 0}
+        for kind, tokens in counts.items(): result.usage[kind] = result.usage.get(kind, 0) + (tokens or 0)
+
+    def _fallback(self, result, error):
+        """LLM'e ulaşılamadığında (devre açık, süre bütçesi, ağ hatası) beklemeden dönülen yanıt."""
+        logger.warning("LLM kullanılamadı, yedek yanıt dönülüyor: %s", error)
+        result.path = "fallback"
+        if isinstance(error, CircuitOpen): result.path_note = f"🔌 {error}"
+        elif isinstance(error, DeadlineExceeded): result.path_note = "⏱️ Komutun süre bütçesi doldu"
+        else: result.path_note = f"❌ LLM'e ulaşılamadı ({type(error).__name__})"
+        return {"response": "Şu an akıllı yanıt servisine ulaşamıyorum; basit komutlar (ör. 'salon ışığını aç') yerelde çalışmaya devam ediyor."}
+
+    def _validate_timer(self, spec):
+        entity_id = spec.get("entity_id")
+        if self.registry is None or not entity_id or entity_id == "none": return None
+        return self.registry.validate({k: v for k, v in spec.items() if k == "entity_id" or k not in TIMER_KEYS})
+
+    def _validate_rule(self, spec):
+        """Kuralın eylemleri gönderilebilir, izlediği entity'ler kayıtlı olmalı; [(entity_id, neden)] döner."""
+        if self.registry is None: return []
+        rejected = [(a["entity_id"], reason) for a in spec.get("actions") or [] for reason in [self.registry.validate(a)] if reason]
+        watched = [spec.get("trigger", {}).get("entity_id"), *(c.get("entity_id") for c in spec.get("conditions") or [])]
+        return rejected + [(eid, "bilinmeyen cihaz") for eid in watched if eid and eid not in self.registry]
+
+    def _reject(self, result, rejected, prefix=""):
+        for entity_id, reason in rejected:
+            logger.warning("Eylem reddedildi: %s (%s)", entity_id, reason)
+            result.rejected.append((entity_id, reason))
+            result.logs.append(f"🚫 {prefix}**Reddedildi:** {self.names.get(entity_id, entity_id)} – {reason}")
+
+    def _collect(self, result, batch):
+        wait = self.deadline if batch.deadline is None else max(0.0, min(self.deadline, batch.deadline.remaining()))
+        for res in batch.results(deadline=wait):
+            if not res.ok:
+                result.errors += 1
+                if self.debouncer is not None:
+                    for action in res.actions: self.debouncer.forget(action)
+            result.ha_outcomes[res.outcome] = result.ha_outcomes.get(res.outcome, 0) + 1
+            result.logs.append(res.message if res.simulated or res.skipped else f"{res.message} _({res.latency * 1000:.0f} ms)_")
@@ -0,0 +1,111 @@
+import copy
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from intent import normalize
+
+logger = logging.getLogger(__name__)
+
+# Önceki tura gönderme yapan kelimeler ("onu kapat", "aynısını yap", "tekrar aç"); planları geçmişe bağlıdır
+CONTEXT_WORDS = {"o", "onu", "ona", "onun", "onlar", "onlari", "onlara", "bu", "bunu", "buna", "bunlari", "sunu", "suna",
+                 "ayni", "aynisi", "aynisini", "tekrar", "yine", "gene", "yeniden", "geri", "oburunu", "digerini",
+                 "digerlerini", "ikisini", "ikisi"}
+
+
+def weather_band(weather):
+    temp = weather.temp
+    band = "soguk" if temp < 5 else "serin" if temp < 15 else "ilik" if temp < 25 else "sicak"
+    if any(w in weather.desc.lower() for w in ["yağmur", "kar", "sağanak"]): band += "+yagis"
+    return band
+
+
+def time_band(now=None):
+    hour = time.localtime(now).tm_hour
+    return "gece" if hour < 6 else "sabah" if hour < 12 else "oglen" if hour < 18 else "aksam"
+
+
+def is_contextual(utterance):
+    return any(word in CONTEXT_WORDS for word in normalize(utterance).split())
+
+
+def is_cacheable(plan):
+    """Sensör sorgusuna bağlı planlar yalnızca model `cache_safe` işaretlediyse saklanır."""
+    if not (plan.get("actions") or plan.get("timers") or plan.get("rules")): return False
+    return not plan.get("queries") or plan.get("cache_safe") is True
+
+
+class PlanCache:
+    """Ayrıştırılmış LLM planları için LRU + TTL önbelleği.
+
+    Anahtar: normalize edilmiş komut + hava bandı + gün dilimi + kullanıcı. Sohbet
+    geçmişi anahtarda olmadığından önceki tura gönderme yapan komutlar önbelleğe girmez.
+    """
+
+    def __init__(self, max_size=256, ttl=3600, path=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.hits = self.misses = self.evictions = 0
+        self._entries = OrderedDict()  # anahtar -> (kayıt zamanı, plan)
+        self._lock = threading.Lock()
+        if path: self._load()
+
+    def key(self, utterance, weather, user, now=None):
+        """Önbellek anahtarı; komut önceki tura bağlıysa None (önbellek atlanır)."""
+        if is_contextual(utterance): return None
+        return "|".join([normalize(utterance), weather_band(weather), time_band(now), user.lower()])
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[0] > self.ttl:
+                if entry is not None: del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry[1])
+
+    def put(self, key, plan):
+        if key is None or not is_cacheable(plan): return False
+        with self._lock:
+            self._entries[key] = (time.time(), copy.deepcopy(plan))  # çağıran planı sonradan değiştirebilir
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._save()
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._save()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "hit_rate": self.hits / total if total else 0.0}
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                now = time.time()
+                for key, stored_at, plan in json.load(f):
+                    if now - stored_at <= self.ttl: self._entries[key] = (stored_at, plan)
+        except FileNotFoundError:
+            pass
+        except (ValueError, TypeError) as e:
+            logger.warning("Plan önbelleği okunamadı (%s): %s", self.path, e)
+
+    def _save(self):
+        if not self.path: return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump([[k, t, p] for k, (t, p) in self._entries.items()], f, ensure_ascii=False)
+        os.replace(tmp, self.path)
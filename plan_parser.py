@@ -0,0 +1,349 @@
+"""LLM çıktısını plana çeviren hoşgörülü ayrıştırıcı.
+
+1. Gürültülü metinden (önünde/arkasında açıklama, her türlü ``` çiti) ilk JSON
+   nesnesi çıkarılır.
+2. json.loads başarısızsa sık görülen sözdizimi hataları onarılır: sondaki
+   virgüller, eksik virgüller, tek tırnaklı dizgiler, Python sabitleri
+   (True/False/None), yorumlar ve yarıda kesilmiş çıktıda kapanmamış parantezler.
+3. Sonuç `actions`, `timers`, `rules`, `queries` ve `response` şemasına göre doğrulanır;
+   "5 dakika" gibi süreler ve "%80" gibi parlaklıklar sayıya çevrilir, geçersiz
+   girdiler plandan atılıp `issues` listesine yazılır.
+
+Onarım da başarısızsa `PlanParseError` yükselir; hat (pipeline) bu durumda
+modele tek bir hedefli düzeltme isteği gönderir.
+"""
+import json
+import re
+from dataclasses import dataclass, field
+
+_FENCE = re.compile(r"```[A-Za-z]*")
+_DURATION = re.compile(r"(\d+(?:[.,]\d+)?)\s*([a-zçğıöşü]*)")
+_CLOCK = re.compile(r"^\s*(?:(\d+):)?(\d+):(\d{1,2})\s*$")
+_NUMBER = re.compile(r"-?\d+(?:[.,]\d+)?")
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_SECONDS = {"": 1, "s": 1, "sn": 1, "sec": 1, "saniye": 1, "m": 60, "dk": 60, "min": 60, "dakika": 60,
+            "h": 3600, "sa": 3600, "saat": 3600, "g": 86400, "gün": 86400}
+_STATES = {True: "on", False: "off", "açık": "on", "aç": "on", "kapalı": "off", "kapat": "off", "true": "on", "false": "off"}
+_TRUE = [True, "true", "evet", "yes", 1, "1"]
+_COMPARISONS = ["above", "below"]
+_WEATHER_FIELDS = ["temp", "hum", "wind", "desc"]
+
+# öznitelik -> (tür, alt sınır, üst sınır)
+ACTION_NUMBERS = {
+    "brightness_pct": (int, 0, 100), "brightness": (int, 0, 255), "percentage": (int, 0, 100), "position": (int, 0, 100),
+    "tilt_position": (int, 0, 100), "volume_level": (float, 0.0, 1.0), "temperature": (float, None, None),
+    "target_temp_low": (float, None, None), "target_temp_high": (float, None, None), "transition": (float, 0.0, None),
+    "color_temp": (int, None, None), "kelvin": (int, None, None),
+}
+TIMER_DURATIONS = ["delay_seconds", "interval_seconds", "duration"]
+REASK_PROMPT = ("Önceki yanıtın geçerli JSON olarak okunamadı ({error}). Aynı planı YALNIZCA tek bir geçerli JSON "
+                "nesnesi olarak yeniden ver: açıklama, kod çiti, yorum ya da sondaki virgül olmadan.")
+
+
+class PlanParseError(ValueError):
+    """Çıktıdan onarımla da geçerli bir JSON nesnesi çıkarılamadı."""
+
+
+@dataclass
+class ParsedPlan:
+    data: dict
+    status: str = "ok"  # ok | extracted (metinden ayıklandı) | repaired (sözdizimi onarıldı)
+    issues: list = field(default_factory=list)  # şemaya uymadığı için atılan/düzeltilen girdiler
+
+
+def extract_json(text):
+    """Metindeki ilk JSON nesnesinin (ya da dizisinin) kaynağı; kapanmamışsa sona kadar, yoksa None."""
+    text = _FENCE.sub("", text or "")
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts: return None
+    start = min(starts)
+    depth, in_string, escape = 0, False, False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escape: escape = False
+            elif ch == "\\": escape = True
+            elif ch == '"': in_string = False
+        elif ch == '"': in_string = True
+        elif ch in "{[": depth += 1
+        elif ch in "}]":
+            depth -= 1
+            if not depth: return text[start:i + 1]
+    return text[start:].rstrip()
+
+
+def repair_json(text):
+    """Sık görülen sözdizimi hatalarını dizgilerin içine dokunmadan onarır."""
+    out, stack = [], []  # stack: beklenen kapanış parantezleri
+    prev = ""  # dizgi dışındaki son belirteç: value | : | , | { | [
+    key_start = None  # sondaki yarım anahtarın `out` içindeki başlangıcı (kesilmiş çıktı için)
+    quote = None  # açık dizginin tırnağı
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if quote:
+            if ch == "\\" and i + 1 < len(text):
+                out.append("'" if text[i + 1] == "'" else text[i:i + 2])  # \' JSON'da geçersiz kaçış
+                i += 2
+                continue
+            if ch == quote:
+                out.append('"')
+                quote, prev = None, "value"
+            else: out.append('\\"' if ch == '"' else ch)
+            i += 1
+            continue
+        if text.startswith("//", i) or text.startswith("#", i):
+            while i < len(text) and text[i] != "\n": i += 1
+            continue
+        if text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = len(text) if end < 0 else end + 2
+            continue
+        starts_value = ch in "\"'{[-." or ch.isalnum()
+        if starts_value and prev == "value" and stack: out.append(",")  # unutulmuş virgül
+        if ch in "\"'":
+            key_start = len(out) if stack and stack[-1] == "}" and prev in "{," else None
+            quote = ch
+            out.append('"')
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            out.append(ch)
+            prev = ch
+        elif ch in "}]":
+            while out and out[-1].isspace(): out.pop()
+            if out and out[-1] == ",": out.pop()  # sondaki virgül
+            if stack: stack.pop()
+            out.append(ch)
+            prev = "value"
+        elif starts_value:
+            j = i + 1
+            while j < len(text) and (text[j].isalnum() or text[j] in "_.+-"): j += 1
+            word = text[i:j]
+            out.append(_LITERALS.get(word, word))
+            prev = "value"
+            i = j
+            continue
+        else:
+            out.append(ch)
+            if ch in ":,": prev = ch
+            if ch == ":": key_start = None
+        i += 1
+
+    # Yarıda kesilmiş çıktı: açık dizgiyi, yarım anahtarı ve parantezleri kapat
+    if quote: out.append('"')
+    if key_start is not None: del out[key_start:]  # değeri hiç gelmemiş anahtar
+    while out and (out[-1].isspace() or out[-1] == ","): out.pop()
+    if out and out[-1] == ":": out.append("null")
+    out.extend(reversed(stack))
+    return "".join(out)
+
+
+def parse_plan(text):
+    """Model çıktısını doğrulanmış plana çevirir; onarılamazsa PlanParseError."""
+    candidate = extract_json(text)
+    if candidate is None: raise PlanParseError("JSON nesnesi bulunamadı")
+    status = "ok" if candidate == (text or "").strip() else "extracted"
+    try:
+        data = json.loads(candidate)
+    except ValueError as e:
+        try:
+            data = json.loads(repair_json(candidate))
+        except ValueError:
+            raise PlanParseError(f"JSON onarılamadı: {e}") from e
+        status = "repaired"
+    plan, issues = validate_plan(data)
+    return ParsedPlan(plan, status, issues)
+
+
+# --- şema ---
+def _number(value, kind, low=None, high=None, percent_scale=False):
+    if isinstance(value, bool): raise ValueError(value)
+    if isinstance(value, str):
+        match = _NUMBER.search(value)
+        if not match: raise ValueError(value)
+        number = float(match.group().replace(",", "."))
+        if percent_scale and "%" in value: number /= 100  # "%50" ses düzeyi -> 0.5
+    else: number = float(value)
+    if percent_scale and number > 1: number /= 100  # 50 -> 0.5
+    if low is not None: number = max(low, number)
+    if high is not None: number = min(high, number)
+    return int(round(number)) if kind is int else (int(number) if number.is_integer() else number)
+
+
+def duration_seconds(value):
+    """60, "60", "5 dakika", "1.5 saat", "1 saat 30 dakika", "00:05:00" -> saniye; anlaşılamazsa ValueError."""
+    if isinstance(value, bool): raise ValueError(value)
+    if isinstance(value, (int, float)): return max(0, int(value) if float(value).is_integer() else value)
+    text = str(value).strip().lower()
+    clock = _CLOCK.match(text)
+    if clock: return int(clock.group(1) or 0) * 3600 + int(clock.group(2)) * 60 + int(clock.group(3))
+    parts = _DURATION.findall(text)
+    rest = f" {_DURATION.sub(' ', text).replace(',', ' ')} ".replace(" ve ", " ")
+    # Birimsiz sayı yalnızca tek başına (saniye) kabul edilir: "1 saat 30" belirsizdir
+    if not parts or rest.strip() or any(unit not in _SECONDS or (not unit and len(parts) > 1) for _, unit in parts):
+        raise ValueError(value)
+    seconds = sum(float(number.replace(",", ".")) * _SECONDS[unit] for number, unit in parts)
+    return int(seconds) if seconds.is_integer() else seconds
+
+
+def clean_action(action, issues=None):
+    """Eylemi şemaya uydurur; entity_id'siz ya da nesne olmayan eylemlerde None."""
+    issues = [] if issues is None else issues
+    if not isinstance(action, dict) or not isinstance(action.get("entity_id"), str) or not action["entity_id"].strip():
+        issues.append(f"geçersiz eylem: {action}")
+        return None
+    cleaned = {}
+    for key, value in action.items():
+        if key == "entity_id": value = value.strip()
+        elif key == "state":
+            if isinstance(value, (list, dict)):
+                issues.append(f"{action['entity_id']}: geçersiz state ({value})")
+                return None  # durumu anlaşılamayan eylem tahminle gönderilmez
+            state = value.strip().lower() if isinstance(value, str) else value
+            value = _STATES.get(state, state)
+        elif key in ACTION_NUMBERS:
+            kind, low, high = ACTION_NUMBERS[key]
+            try:
+                value = _number(value, kind, low, high, percent_scale=key == "volume_level")
+            except (TypeError, ValueError):
+                issues.append(f"{action['entity_id']}: geçersiz {key} ({value})")
+                continue
+        cleaned[key] = value
+    return cleaned
+
+
+def clean_timer(timer, issues=None):
+    issues = [] if issues is None else issues
+    if not isinstance(timer, dict):
+        issues.append(f"geçersiz zamanlayıcı: {timer}")
+        return None
+    entity_id = timer.get("entity_id") or "none"
+    if entity_id == "none" and not timer.get("reminder"):
+        issues.append(f"hedefsiz zamanlayıcı: {timer}")
+        return None
+    cleaned = clean_action({**timer, "entity_id": str(entity_id)}, issues)
+    if cleaned is None: return None
+    for key in TIMER_DURATIONS:
+        if key not in cleaned: continue
+        try:
+            cleaned[key] = duration_seconds(cleaned[key])
+        except ValueError:
+            # Süresi anlaşılamayan zamanlayıcı varsayılan gecikmeyle çalışmasın diye tümden atılır
+            issues.append(f"{entity_id}: geçersiz {key} ({cleaned[key]}), zamanlayıcı atlandı")
+            return None
+    if "count" in cleaned:
+        try: cleaned["count"] = int(_number(cleaned["count"], int, 1))
+        except (TypeError, ValueError): issues.append(f"{entity_id}: geçersiz count ({cleaned.pop('count')})")
+    if "weekdays_only" in cleaned: cleaned["weekdays_only"] = cleaned["weekdays_only"] in _TRUE
+    return cleaned
+
+
+def clean_query(query, issues=None):
+    issues = [] if issues is None else issues
+    if isinstance(query, str): query = {"entity_id": query}
+    if not isinstance(query, dict) or not isinstance(query.get("entity_id"), str):
+        issues.append(f"geçersiz sorgu: {query}")
+        return None
+    return query
+
+
+def _clock(value):
+    """"8", "8:30", "08.30", 8 -> "HH:MM"; anlaşılamazsa ValueError."""
+    hour, _, minute = str(value).strip().replace(".", ":").partition(":")
+    hour, minute = int(hour), int(minute or 0)
+    if not (0 <= hour < 24 and 0 <= minute < 60): raise ValueError(value)
+    return f"{hour:02d}:{minute:02d}"
+
+
+def clean_condition(cond, issues):
+    if not isinstance(cond, dict):
+        issues.append(f"geçersiz koşul: {cond}")
+        return None
+    cleaned = dict(cond)
+    try:
+        if "entity_id" in cond:
+            if not isinstance(cond["entity_id"], str) or not cond["entity_id"].strip(): raise ValueError(cond["entity_id"])
+            cleaned["entity_id"] = cond["entity_id"].strip()
+        elif "weather" in cond:
+            if cond["weather"] not in _WEATHER_FIELDS: raise ValueError(cond["weather"])
+        elif "after" in cond or "before" in cond:
+            for key in ["after", "before"]:
+                if key in cond: cleaned[key] = _clock(cond[key])
+            return cleaned
+        else: raise ValueError("konu yok")
+        for key in _COMPARISONS:
+            if key in cond: cleaned[key] = _number(cond[key], float)
+        for key in ["state", "not_state"]:
+            if isinstance(cleaned.get(key), str):
+                state = cleaned[key].strip().lower()
+                cleaned[key] = _STATES.get(state, state)
+    except (TypeError, ValueError) as e:
+        issues.append(f"geçersiz koşul ({e}): {cond}")
+        return None
+    if not any(key in cleaned for key in ["state", "not_state", "contains", *_COMPARISONS]):
+        issues.append(f"karşılaştırmasız koşul: {cond}")
+        return None
+    return cleaned
+
+
+def clean_rule(rule, issues=None):
+    """Kuralı şemaya uydurur: tetikleyici, koşullar, süreler ve eylemler; eylemsiz ya da koşulsuz kuralda None."""
+    issues = [] if issues is None else issues
+    if not isinstance(rule, dict):
+        issues.append(f"geçersiz kural: {rule}")
+        return None
+    cleaned = dict(rule)
+    trigger = rule.get("trigger") or {}
+    if isinstance(trigger, str): trigger = {"entity_id": trigger}
+    if not isinstance(trigger, dict): trigger = {}
+    try:
+        if trigger.get("at") is not None: trigger = {"at": _clock(trigger["at"])}
+        elif trigger.get("entity_id"):
+            trigger = {k: v for k, v in trigger.items() if k in ["entity_id", "to", "from"]}
+            for key in ["to", "from"]:
+                if isinstance(trigger.get(key), str): trigger[key] = _STATES.get(trigger[key].strip().lower(), trigger[key].strip().lower())
+        else: trigger = {}
+    except ValueError:
+        issues.append(f"geçersiz tetikleyici: {rule.get('trigger')}")
+        trigger = {}
+    cleaned["trigger"] = trigger
+    conditions = rule.get("conditions") or []
+    if isinstance(conditions, dict): conditions = [conditions]
+    cleaned["conditions"] = [c for c in (clean_condition(c, issues) for c in conditions) if c is not None]
+    actions = rule.get("actions") or []
+    if isinstance(actions, dict): actions = [actions]
+    cleaned["actions"] = [a for a in (clean_action(a, issues) for a in actions) if a is not None]
+    for key in ["for_seconds", "cooldown_seconds"]:
+        if key not in cleaned: continue
+        try:
+            cleaned[key] = duration_seconds(cleaned[key])
+        except ValueError:
+            issues.append(f"kural: geçersiz {key} ({cleaned.pop(key)})")
+    for key in ["once", "weekdays_only"]:
+        if key in cleaned: cleaned[key] = cleaned[key] in _TRUE
+    if not (cleaned["actions"] or cleaned.get("reminder")) or not (trigger or cleaned["conditions"]):
+        issues.append(f"eksik kural: {rule}")
+        return None
+    return cleaned
+
+
+def validate_plan(data):
+    """(plan, sorunlar) döner; kökte dizi gelirse eylem listesi sayılır."""
+    issues = []
+    if isinstance(data, list): data = {"actions": data}
+    if not isinstance(data, dict): raise PlanParseError(f"kök JSON nesne değil: {type(data).__name__}")
+    plan = dict(data)
+    for key, clean in [("actions", clean_action), ("timers", clean_timer), ("rules", clean_rule), ("queries", clean_query)]:
+        if key not in plan: continue
+        items = plan[key]
+        if items is None: items = []
+        elif not isinstance(items, list): items = [items]  # tek nesne listeye sarılır
+        plan[key] = [item for item in (clean(item, issues) for item in items) if item is not None]
+    if plan.get("response") is None: plan.pop("response", None)  # hat varsayılan yanıtı kullanır
+    elif not isinstance(plan["response"], str): plan["response"] = str(plan["response"])
+    if "cache_safe" in plan: plan["cache_safe"] = plan["cache_safe"] in _TRUE
+    return plan, issues
+
+
+def reask_message(error):
+    return {"role": "user", "content": REASK_PROMPT.format(error=error)}
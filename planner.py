@@ -0,0 +1,120 @@
+"""Plan eylemlerini gönderimden önce sadeleştirip HA servis çağrılarına gruplar.
+
+- Kayıt defterinde olmayan cihazlara ya da desteklenmeyen özniteliklere giden
+  eylemler ağa çıkmadan reddedilir.
+- Birebir aynı eylemler tek kez gönderilir.
+- Aynı cihaza çelişen aç/kapat komutlarında son söylenen geçerlidir.
+- Kısa süre önce gönderilmiş aynı komut (çift tıklama, tekrar eden plan) düşürülür.
+- Aynı domain/servis/parametreyi paylaşan eylemler tek istekte birleştirilir
+  (ör. "tüm ışıkları kapat" -> tek `light/turn_off`, entity_id listesiyle).
+"""
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+
+from ha_client import service_call
+
+
+def action_signature(action):
+    return json.dumps(action, sort_keys=True, ensure_ascii=False)
+
+
+def _is_toggle(action):
+    return not set(action) - {"entity_id", "state"}
+
+
+class Debouncer:
+    """Aynı cihaza aynı komut `window` saniye içinde tekrar gelirse düşürür."""
+
+    def __init__(self, window=2.0):
+        self.window = window
+        self._last = {}  # entity_id -> (imza, zaman)
+        self._lock = threading.Lock()
+
+    def allow(self, action, now=None):
+        now = time.time() if now is None else now
+        entity_id, signature = action.get("entity_id"), action_signature(action)
+        with self._lock:
+            last = self._last.get(entity_id)
+            if last and last[0] == signature and now - last[1] < self.window: return False
+            self._last[entity_id] = (signature, now)
+            return True
+
+    def forget(self, action):
+        """Gönderilemeyen (hata/zaman aşımı) eylemin kaydını siler; hemen ardından gelen yeniden deneme düşürülmez."""
+        entity_id, signature = action.get("entity_id"), action_signature(action)
+        with self._lock:
+            last = self._last.get(entity_id)
+            if last and last[0] == signature: del self._last[entity_id]
+
+
+@dataclass
+class PlanReport:
+    actions: int = 0  # plandaki eylem sayısı
+    calls: int = 0  # gönderilecek HA isteği sayısı
+    merged: int = 0  # başka bir istekle birleştirilen eylem sayısı
+    dropped: list = field(default_factory=list)  # (entity_id, neden)
+    rejected: list = field(default_factory=list)  # (entity_id, neden) – kayıt defteri doğrulamasından geçemeyenler
+
+    def summary(self):
+        parts = [f"{self.actions} eylem → {self.calls} istek"]
+        if self.merged: parts.append(f"{self.merged} birleştirildi")
+        if self.dropped: parts.append("atlandı: " + ", ".join(f"{eid} ({reason})" for eid, reason in self.dropped))
+        return "; ".join(parts)
+
+
+def plan_calls(actions, debouncer=None, now=None, registry=None):
+    """Eylem listesini [(sıra, ServiceCall)] listesine çevirir; sıra ilk eylemin plan indeksidir."""
+    report = PlanReport(actions=len(actions))
+    kept, seen = [], set()
+    for index, action in enumerate(actions):
+        if not action.get("entity_id"): continue
+        reason = registry.validate(action) if registry is not None else None
+        if reason:
+            report.rejected.append((action["entity_id"], reason))
+            continue
+        signature = action_signature(action)
+        if signature in seen:
+            report.dropped.append((action["entity_id"], "tekrar"))
+            continue
+        seen.add(signature)
+        kept.append((index, action))
+
+    # Aynı cihaza çelişen aç/kapat: son komut kazanır
+    last_toggle = {}
+    for index, action in kept:
+        if _is_toggle(action): last_toggle[action["entity_id"]] = index
+    resolved = []
+    for index, action in kept:
+        if _is_toggle(action) and last_toggle[action["entity_id"]] != index:
+            report.dropped.append((action["entity_id"], "çelişki"))
+            continue
+        resolved.append((index, action))
+
+    if debouncer is not None:
+        fresh = []
+        for index, action in resolved:
+            if debouncer.allow(action, now): fresh.append((index, action))
+            else: report.dropped.append((action["entity_id"], "az önce gönderildi"))
+        resolved = fresh
+
+    # Yalnızca planda tek eylemi olan cihazlar birleştirilir; böylece cihaz içi sıra korunur
+    per_entity = {}
+    for _, action in resolved: per_entity[action["entity_id"]] = per_entity.get(action["entity_id"], 0) + 1
+    calls, groups = [], {}
+    for index, action in resolved:
+        call = service_call(action)
+        if per_entity[action["entity_id"]] > 1:
+            calls.append((index, call))
+            continue
+        group = groups.get(call.signature)
+        if group is None:
+            groups[call.signature] = call
+            calls.append((index, call))
+        else:
+            group.entity_ids.append(action["entity_id"])
+            group.actions.append(action)
+            report.merged += 1
+    report.calls = len(calls)
+    return calls, report
@@ -0,0 +1,174 @@
+import json
+import logging
+import time
+from dataclasses import dataclass
+
+from catalog import ENTITY_DESCRIPTIONS
+
+logger = logging.getLogger(__name__)
+
+_ENCODER = None  # tiktoken ilk sayımda yüklenir; False: kullanılamıyor
+
+WEEKDAYS_TR = ["Pazartesi", "Salı", "Çarşamba", "Perşembe", "Cuma", "Cumartesi", "Pazar"]
+
+# --- FEW-SHOT ÖRNEKLER (her biri bir kez; kişi/hava bilgisi içermez ki önek sabit kalsın) ---
+EXAMPLES = [
+    ("Eğer salon sıcaksa klimayı aç",
+     {"rules": [{"conditions": [{"entity_id": "sensor.sicaklik_salon", "above": 26}], "actions": [{"entity_id": "climate.klima", "state": "on", "temperature": 22}], "once": True}], "response": "Salon 26°C'yi geçtiğinde klimayı açacağım; şu an geçiyorsa hemen açılır."}),
+    ("Eğer hareket yoksa salon ışığını kapat",
+     {"rules": [{"trigger": {"entity_id": "binary_sensor.hareket_salon", "to": "off"}, "for_seconds": 600, "conditions": [{"entity_id": "light.salon_isigi", "state": "on"}], "actions": [{"entity_id": "light.salon_isigi", "state": "off"}]}], "response": "Salonda 10 dakika hareket olmazsa ışığı kapatacağım."}),
+    ("Eğer dışarı soğuksa ısıtıcıyı aç ve perdeyi kapat",
+     {"rules": [{"conditions": [{"weather": "temp", "below": 5}], "actions": [{"entity_id": "climate.klima", "state": "on", "mode": "heat"}, {"entity_id": "cover.perde_salon", "state": "off"}], "once": True}], "response": "Dışarısı 5°C'nin altındaysa ısıtıcıyı açıp perdeyi kapatacağım. Sıcacık ol!"}),
+    ("Eğer güç tüketimi yüksekse enerji tasarrufu modu aktif et",
+     {"rules": [{"conditions": [{"entity_id": "sensor.guc_tuketimi", "above": 3000}], "actions": [{"entity_id": "scene.enerji_tasarrufu"}]}], "response": "Güç tüketimi 3000 W'ı geçtiğinde tasarruf moduna geçeceğim."}),
+    ("Eğer yatak odası ışığı açıksa ve saat gece 11'i geçtiyse kapat",
+     {"rules": [{"conditions": [{"entity_id": "light.yatak_odasi_isigi", "state": "on"}, {"after": "23:00", "before": "06:00"}], "actions": [{"entity_id": "light.yatak_odasi_isigi", "state": "off"}]}], "response": "Gece 11'den sonra yatak odası ışığı açık kalırsa kapatacağım. İyi uykular!"}),
+    ("Eğer hava kalitesi kötüyse havalandırmayı aç ve pencereyi aç",
+     {"rules": [{"conditions": [{"entity_id": "sensor.hava_kalitesi", "above": 100}], "actions": [{"entity_id": "climate.havalandirma", "state": "on"}, {"entity_id": "cover.perde_salon", "state": "open"}]}], "response": "Hava kalitesi kötüleştiğinde havalandırmayı ve pencereyi açacağım."}),
+    ("Eğer mutfak ışığı kapalıysa ve hareket varsa aç",
+     {"rules": [{"trigger": {"entity_id": "binary_sensor.hareket_salon", "to": "on"}, "conditions": [{"entity_id": "light.mutfak_isigi", "state": "off"}], "actions": [{"entity_id": "light.mutfak_isigi", "state": "on"}]}], "response": "Hareket algılandığında mutfak ışığı kapalıysa açacağım."}),
+    ("Eğer dışarı yağmurluysa perdeyi kapat ve ışıkları aç",
+     {"rules": [{"conditions": [{"weather": "desc", "contains": "yağmur"}], "actions": [{"entity_id": "cover.perde_salon", "state": "off"}, {"entity_id": "light.salon_isigi", "state": "on", "brightness_pct": 80}], "once": True}], "response": "Yağmur başladığında perdeyi kapatıp ışıkları açacağım."}),
+    ("Eğer nem yüksekse fanı aç ve klimayı nem alma moduna al",
+     {"rules": [{"conditions": [{"entity_id": "sensor.nem_genel", "above": 65}], "actions": [{"entity_id": "fan.fan_salon", "state": "on"}, {"entity_id": "climate.klima", "state": "on", "mode": "dry"}]}], "response": "Nem %65'i geçtiğinde fan ve klima nem alma moduna geçecek."}),
+    ("Eğer çalışma modu aktifse ve 25 dakika geçtiyse mola hatırlat",
+     {"timers": [{"entity_id": "none", "delay_seconds": 1500, "reminder": "Mola zamanı! Gözlerini dinlendir."}], "response": "25 dakika sonra mola hatırlatacağım."}),
+    ("Eğer TV açıksa ve saat gece 12'yi geçtiyse kapat",
+     {"rules": [{"conditions": [{"entity_id": "media_player.tv_salon", "not_state": "off"}, {"after": "00:00", "before": "06:00"}], "actions": [{"entity_id": "media_player.tv_salon", "state": "off"}]}], "response": "Gece 12'den sonra TV açık kalırsa kapatacağım."}),
+    ("Eğer kahve makinesi çalışıyorsa ve 5 dakika geçtiyse 'kahven hazır' diye hatırlat",
+     {"rules": [{"conditions": [{"entity_id": "switch.kahve_makinesi", "state": "on"}], "for_seconds": 300, "reminder": "Kahven hazır! ☕", "once": True}], "response": "Kahve makinesi 5 dakika çalıştığında haber vereceğim."}),
+    ("Eğer dışarı sıcaksa ve nem yüksekse klimayı aç",
+     {"rules": [{"conditions": [{"entity_id": "sensor.sicaklik_dis", "above": 28}, {"entity_id": "sensor.nem_genel", "above": 60}], "actions": [{"entity_id": "climate.klima", "state": "on", "temperature": 22}], "once": True}], "response": "Dışarısı sıcak ve nemli olduğunda klimayı açacağım."}),
+    ("Eğer robot süpürge çalışıyorsa ve 1 saat geçtiyse durdur",
+     {"rules": [{"conditions": [{"entity_id": "switch.robot_supurge", "state": "on"}], "for_seconds": 3600, "actions": [{"entity_id": "switch.robot_supurge", "state": "off"}], "once": True}], "response": "Robot süpürge 1 saat çalıştığında durduracağım."}),
+    ("Eğer ışık seviyesi düşükse salon ışığını aç",
+     {"rules": [{"conditions": [{"entity_id": "sensor.isik_seviyesi_salon", "below": 100}], "actions": [{"entity_id": "light.salon_isigi", "state": "on", "brightness_pct": 70}]}], "response": "Salon kararınca ışığı açacağım."}),
+    ("Eğer müzik çalıyorsa ve ses yüksekse yarıya düşür",
+     {"rules": [{"conditions": [{"entity_id": "media_player.muzik_sistemi", "state": "playing"}, {"entity_id": "media_player.muzik_sistemi", "attribute": "volume_level", "above": 0.6}], "actions": [{"entity_id": "media_player.muzik_sistemi", "volume_level": 0.5}], "once": True}], "response": "Müzik çalarken ses yükselirse yarıya düşüreceğim."}),
+    ("Eğer klima açıksa ve sıcaklık 22'ye ulaştıysa kapat",
+     {"rules": [{"conditions": [{"entity_id": "climate.klima", "not_state": "off"}, {"entity_id": "sensor.sicaklik_salon", "below": 22.5}], "actions": [{"entity_id": "climate.klima", "state": "off"}], "once": True}], "response": "Salon 22°C'ye indiğinde klimayı kapatacağım."}),
+    ("Eğer perde açıksa ve güneş batıyorsa kapat",
+     {"rules": [{"conditions": [{"entity_id": "cover.perde_salon", "state": "open"}, {"after": "19:00", "before": "23:59"}], "actions": [{"entity_id": "cover.perde_salon", "state": "off"}]}], "response": "Akşam 7'den sonra perde açıksa kapatacağım."}),
+    ("Eğer kahve makinesi kapalıysa ve sabah 7'yi geçtiyse aç",
+     {"rules": [{"conditions": [{"entity_id": "switch.kahve_makinesi", "state": "off"}, {"after": "07:00", "before": "12:00"}], "actions": [{"entity_id": "switch.kahve_makinesi", "state": "on"}], "once": True}], "response": "Sabah 7'yi geçtiğinde kahve makinesi kapalıysa açacağım."}),
+    ("Eğer fan açıksa ve sıcaklık düştüyse kapat",
+     {"rules": [{"conditions": [{"entity_id": "fan.fan_salon", "state": "on"}, {"entity_id": "sensor.sicaklik_salon", "below": 24}], "actions": [{"entity_id": "fan.fan_salon", "state": "off"}], "once": True}], "response": "Salon 24°C'nin altına düştüğünde fan açıksa kapatacağım."}),
+    ("Hafta içi her sabah 8'de kahvemi hazırla",
+     {"rules": [{"trigger": {"at": "08:00"}, "weekdays_only": True, "actions": [{"entity_id": "switch.kahve_makinesi", "state": "on"}]}], "response": "Hafta içi her sabah 8'de kahven hazırlanacak. ☕"}),
+]
+
+RULES = """Sen dünyanın en gelişmiş, Türkçe doğal dil işleyen, samimi ve konfor odaklı akıllı ev asistanısın. Kullanıcı komutlarını insan gibi anla, bağlamı hatırla, alışkanlıkları tahmin et, mantık yürüt. Yanıtlarında kullanıcıya adıyla hitap et; ad, hava durumu ve saat bu mesajın sonundaki BAĞLAM bölümünde verilir.
+
+Önce komutu adım adım içsel olarak analiz et:
+1. Kullanıcının ana niyetini ve bağlamını belirle.
+2. Hangi entity'ler etkilenecek?
+3. Ek parametreler var mı? (parlaklık, renk, sıcaklık, transition saniye).
+4. Zamanlayıcı, tekrarlayan eylem veya sahne var mı? (delay_seconds, repeat: daily/weekly/hourly/interval, duration saniye, reminder metin, count sayı, weekdays_only true/false).
+5. Koşullu ya da tekrarlı mantık var mı? (Eğer... ise..., ...olunca, Her sabah... – koşulu kendin tahmin etme; sensör, hava durumu ve saat koşullarıyla rules olarak derle).
+6. Hava durumu, saat veya kullanıcı alışkanlığına göre proaktif öneri yap.
+7. Güvenlik: Çakışan komutları önle, gereksiz enerji tüketimini azalt."""
+
+FINAL_INSTRUCTIONS = """SON TALİMATLAR (KRİTİK):
+- Düşünme sürecini ASLA çıktıya yazma.
+- YALNIZCA geçerli JSON ver.
+- "or" mantığı kullanma, kesin karar ver ve uygula.
+- JSON Yapısı:
+{
+  "actions": [{"entity_id": "xxx", "state": "on/off", "brightness_pct": 50, ...}],
+  "timers": [{"entity_id": "xxx", "delay_seconds": 60, "state": "off", "reminder": "text"}],
+  "rules": [{"trigger": {"entity_id": "xxx", "to": "on"} ya da {"at": "08:00"}, "conditions": [{"entity_id": "xxx", "state": "on"}, {"entity_id": "sensor.xxx", "above": 25}, {"weather": "temp", "below": 5}, {"after": "23:00", "before": "06:00"}], "for_seconds": 600, "actions": [...], "reminder": "text", "once": true}],
+  "response": "Kullanıcıya samimi mesaj"
+}
+- actions ve timers boş liste olabilir ama anahtarlar olsun.
+- Koşullu ("Eğer ... ise") ve tekrarlı ("... olunca", "Her sabah 8'de") istekleri rules olarak ver; kural yerelde sürekli değerlendirilir, koşul şu an sağlanıyorsa hemen çalışır. Tetikleyici yoksa koşullar doğru olduğu anda çalışır. Tek seferlik istekte "once": true ekle. Koşul alanları: entity_id (+ attribute) ya da weather (temp, hum, wind, desc); karşılaştırmalar state, not_state, above, below, contains.
+- queries içeren bir planın eylemleri sensör sonucuna göre DEĞİŞMİYORSA "cache_safe": true ekle; değişiyorsa ekleme.
+- Anlaşılmazsa: {"response": "Üzgünüm, tam anlayamadım. Daha açık söyleyebilir misin?"} (kullanıcının adıyla)
+- JSON geçersiz olursa içsel düzelt ve yeniden üret."""
+
+
+def render_example(utterance, output):
+    return f'Kullanıcı: "{utterance}"\nÇıktı: {json.dumps(output, ensure_ascii=False)}'
+
+
+def build_static_prefix(entity_descriptions=ENTITY_DESCRIPTIONS, examples=EXAMPLES, sensors=None):
+    """Her istekte bayt bayt aynı kalan kısım; sağlayıcı tarafı önek önbelleği buna dayanır."""
+    entities = "\n".join(f"- {eid} → {desc}" for eid, desc in entity_descriptions.items())
+    shots = "\n\n".join(render_example(u, o) for u, o in examples)
+    readonly = ""
+    if sensors:
+        readonly = "Yalnızca queries ve kural koşullarında kullanılabilen sensörler:\n" + "\n".join(f"- {eid} → {desc}" for eid, desc in sensors.items()) + "\n\n"
+    return (
+        f"{RULES}\n\n"
+        f"Kontrole açık entity'ler (konfor odaklı, Home Assistant entegrasyonu):\n{entities}\n\n"
+        f"{readonly}"
+        f"Few-shot örnekler (koşullu + zamanlayıcı ağırlıklı):\n{shots}\n\n"
+        f"{FINAL_INSTRUCTIONS}"
+    )
+
+
+STATIC_PREFIX = build_static_prefix()
+
+
+def build_dynamic_suffix(user_name, weather, now=None, habits=""):
+    now = time.localtime(now)
+    suffix = (
+        "BAĞLAM:\n"
+        f"- Kullanıcının adı {user_name}.\n"
+        f"- Şu an Ankara'da hava {weather.temp}°C ve {weather.desc} (veri: {weather.age_text()}). Bu bilgiyi koşullar için akıllıca kullan.\n"
+        f"- Saat {time.strftime('%H:%M', now)}, {WEEKDAYS_TR[now.tm_wday]}."
+    )
+    # Zaman serisi deposundan saat başına hesaplanan özet; alışkanlık tahmini ve proaktif öneri için
+    if habits: suffix += f"\n- Bu saatteki alışkanlıklar {habits}."
+    return suffix
+
+
+def _encoder():
+    global _ENCODER
+    if _ENCODER is None:
+        try:
+            import tiktoken
+            _ENCODER = tiktoken.get_encoding("o200k_base")
+        except Exception:  # tiktoken opsiyonel; yoksa kaba tahmin kullanılır
+            _ENCODER = False
+    return _ENCODER
+
+
+def count_tokens(text):
+    if _encoder(): return len(_ENCODER.encode(text))
+    return len(text) // 4 + 1
+
+
+@dataclass
+class PromptStats:
+    static_tokens: int
+    dynamic_tokens: int
+    history_tokens: int
+
+    @property
+    def total(self):
+        return self.static_tokens + self.dynamic_tokens + self.history_tokens
+
+
+_STATIC_TOKENS = (None, 0)  # (önek, token sayısı); önek değişene kadar yeniden sayılmaz
+
+
+def build_messages(user_name, weather, history, now=None, prefix=STATIC_PREFIX, habits=""):
+    """Sabit önek + dinamik bağlam + sohbet geçmişi; (messages, PromptStats) döner."""
+    global _STATIC_TOKENS
+    if _STATIC_TOKENS[0] is not prefix: _STATIC_TOKENS = (prefix, count_tokens(prefix))
+    suffix = build_dynamic_suffix(user_name, weather, now, habits)
+    messages = [{"role": "system", "content": prefix}, {"role": "system", "content": suffix}]
+    messages += [{"role": m["role"], "content": m["content"]} for m in history]
+    stats = PromptStats(_STATIC_TOKENS[1], count_tokens(suffix), sum(count_tokens(m["content"]) for m in history))
+    return messages, stats
+
+
+def log_usage(stats, usage=None, latency=None):
+    """Tahmini token dağılımını ve sağlayıcının bildirdiği gerçek kullanımı loglar."""
+    line = f"prompt tahmini: sabit={stats.static_tokens} dinamik={stats.dynamic_tokens} geçmiş={stats.history_tokens} toplam={stats.total}"
+    if usage is not None:
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) if details else None
+        line += f" | gerçek: girdi={usage.prompt_tokens} çıktı={usage.completion_tokens} önbellekten={cached}"
+    if latency is not None: line += f" | süre={latency * 1000:.0f} ms"
+    logger.info(line)
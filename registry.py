@@ -0,0 +1,351 @@
+"""Home Assistant'tan beslenen entity kayıt defteri.
+
+- Açılışta yerel önbellekten (`data/entity_registry.json`), o da yoksa
+  catalog.py tohum listesinden yüklenir; HA yapılandırılmışsa `/api/states` ve
+  WebSocket alan (area) kayıtlarıyla tam senkronize olur, ardından durum
+  aynasının olaylarıyla artımlı güncellenir.
+- İçeriğin özeti (`version`) değişmedikçe prompt kataloğu, görünen adlar ve
+  arama dizini yeniden üretilmez.
+- `validate(action)` bilinmeyen entity'leri ve cihazın desteklemediği
+  öznitelikleri ağa çıkmadan reddeder.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+
+import requests
+
+from catalog import ENTITY_NAMES, SENSOR_NAMES
+from ha_state import authenticate, ws_connect, ws_url_for
+from prompt_builder import EXAMPLES, build_static_prefix
+
+logger = logging.getLogger(__name__)
+
+CONTROL_DOMAINS = ["light", "switch", "fan", "cover", "climate", "media_player", "scene"]
+QUERY_DOMAINS = ["sensor", "binary_sensor"]
+DOMAINS = CONTROL_DOMAINS + QUERY_DOMAINS
+CAPABILITY_KEYS = ["supported_color_modes", "hvac_modes", "min_temp", "max_temp", "fan_modes", "preset_modes",
+                   "source_list", "unit_of_measurement", "device_class"]
+DOMAIN_ICONS = {"light": "💡", "switch": "🔌", "fan": "🌀", "cover": "🪟", "climate": "🌡️", "media_player": "📺",
+                "scene": "🎬", "sensor": "📟", "binary_sensor": "📟"}
+
+# domain -> plan özniteliği -> gereken supported_features biti (0: bitten bağımsız)
+ATTRIBUTES = {
+    "light": {"brightness_pct": 0, "brightness": 0, "rgb_color": 0, "color_name": 0, "color_temp": 0, "kelvin": 0,
+              "transition": 0, "effect": 4, "flash": 8},
+    "climate": {"temperature": 1, "target_temp_low": 2, "target_temp_high": 2, "mode": 0, "hvac_mode": 0,
+                "fan_mode": 8, "preset_mode": 16, "swing_mode": 32},
+    "fan": {"percentage": 1, "oscillating": 2, "direction": 4, "preset_mode": 8},
+    "cover": {"position": 4, "tilt_position": 128},
+    "media_player": {"volume_level": 4, "is_volume_muted": 8, "media_content_id": 512, "media_content_type": 512,
+                     "source": 2048},
+    "switch": {},
+    "scene": {},
+}
+# Prompt kataloğunda gösterilen öznitelikler
+ATTRIBUTE_LABELS = {"brightness_pct": "parlaklık %", "rgb_color": "RGB renk", "color_temp": "renk sıcaklığı",
+                    "transition": "transition saniye", "effect": "efekt", "temperature": "sıcaklık",
+                    "percentage": "hız %", "oscillating": "salınım", "position": "konum %",
+                    "volume_level": "ses 0-1", "source": "kaynak"}
+_COLOR_MODES = {"hs", "rgb", "rgbw", "rgbww", "xy"}
+
+
+@dataclass
+class Entity:
+    entity_id: str
+    name: str  # HA friendly_name
+    area: str = None
+    features: int = None  # supported_features; None: bilinmiyor (tohum), alan öznitelikleri serbest
+    capabilities: dict = field(default_factory=dict)
+    icon: str = None
+
+    @property
+    def domain(self):
+        return self.entity_id.split(".")[0]
+
+    @property
+    def display(self):
+        return f"{self.icon or DOMAIN_ICONS.get(self.domain, '🔹')} {self.name}"
+
+    def supports(self, key):
+        allowed = ATTRIBUTES.get(self.domain, {})
+        if key not in allowed: return False
+        if self.features is not None and allowed[key] and not self.features & allowed[key]: return False
+        modes = set(self.capabilities.get("supported_color_modes") or [])
+        if modes:
+            if key in ["brightness_pct", "brightness"] and modes <= {"onoff"}: return False
+            if key in ["rgb_color", "color_name"] and not modes & _COLOR_MODES: return False
+            if key in ["color_temp", "kelvin"] and "color_temp" not in modes: return False
+        return True
+
+    def check(self, key, value):
+        """Öznitelik bu cihaza gönderilemiyorsa ret nedenini döner."""
+        if not self.supports(key): return f"desteklenmeyen öznitelik: {key}"
+        caps = self.capabilities
+        if key in ["mode", "hvac_mode"] and caps.get("hvac_modes") and value not in caps["hvac_modes"]:
+            return f"desteklenmeyen mod: {value}"
+        if key == "temperature" and caps.get("min_temp") is not None and caps.get("max_temp") is not None:
+            try: temp = float(value)
+            except (TypeError, ValueError): return f"geçersiz sıcaklık: {value}"
+            if not caps["min_temp"] <= temp <= caps["max_temp"]:
+                return f"sıcaklık {caps['min_temp']:g}-{caps['max_temp']:g}°C aralığında olmalı"
+        return None
+
+    def describe(self):
+        labels = [label for key, label in ATTRIBUTE_LABELS.items() if self.supports(key)]
+        caps = self.capabilities
+        if "sıcaklık" in labels and caps.get("min_temp") is not None and caps.get("max_temp") is not None:
+            labels[labels.index("sıcaklık")] = f"sıcaklık {caps['min_temp']:g}-{caps['max_temp']:g}°C"
+        if caps.get("hvac_modes"): labels.append("mod: " + "/".join(caps["hvac_modes"]))
+        if caps.get("unit_of_measurement"): labels.append(caps["unit_of_measurement"])
+        text = self.name + (f" [{self.area}]" if self.area else "")
+        return f"{text} ({', '.join(labels)})" if labels else text
+
+
+def _split_label(label):
+    icon, _, name = label.partition(" ")
+    return (icon, name) if name else (None, label)
+
+
+def seed_entities():
+    """HA'ya ulaşılamadığında kullanılan catalog.py listesi (özellikler bilinmiyor)."""
+    entities = []
+    for eid, label in {**ENTITY_NAMES, **SENSOR_NAMES}.items():
+        icon, name = _split_label(label)
+        entities.append(Entity(eid, name, icon=icon))
+    return entities
+
+
+def entity_from_state(state, area=None, icon=None):
+    attrs = state.get("attributes") or {}
+    eid = state["entity_id"]
+    features = attrs.get("supported_features")
+    return Entity(eid, attrs.get("friendly_name") or eid, area, int(features) if features is not None else 0,
+                  {k: attrs[k] for k in CAPABILITY_KEYS if attrs.get(k) is not None}, icon)
+
+
+def _sort_key(entity):
+    return DOMAINS.index(entity.domain), entity.entity_id
+
+
+def _digest(entities):
+    blob = json.dumps([asdict(e) for e in entities], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(blob.encode()).hexdigest()[:12]
+
+
+def _referenced(plan):
+    items = [item for key in ["actions", "queries", "timers"] for item in plan.get(key) or []]
+    for rule in plan.get("rules") or []: items += [rule.get("trigger") or {}, *rule.get("conditions", []), *rule.get("actions", [])]
+    return {item.get("entity_id") for item in items} - {None, "none"}
+
+
+class EntityRegistry:
+    """Cihaz envanterinin tek kaynağı: prompt kataloğu, görünen adlar, arama dizini ve doğrulama."""
+
+    def __init__(self, base_url=None, token=None, ws_url=None, path=None, session=None, timeout=5,
+                 refresh_interval=3600, retry_delay=30):
+        self.base_url = (base_url or "").rstrip("/")
+        self.token = token
+        self.ws_url = ws_url or (ws_url_for(self.base_url) if self.base_url else None)
+        self.path = path
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.refresh_interval = refresh_interval
+        self.retry_delay = retry_delay
+        self.entities = {}  # entity_id -> Entity (arama dizini)
+        self.names = {}  # entity_id -> görünen ad; yerinde güncellenir, dağıtıcı ve hat aynı sözlüğü okur
+        self.version = None
+        self.source = None  # catalog | cache | ha
+        self.synced_at = None  # son başarılı HA senkronizasyonu
+        self._icons = {eid: _split_label(label)[0] for eid, label in {**ENTITY_NAMES, **SENSOR_NAMES}.items()}
+        self._derived = {}  # (ad, sürüm) -> üretilmiş içerik
+        self._lock = threading.RLock()
+        self._thread = None
+        self._stop = threading.Event()
+        if not self._load(): self._replace(seed_entities(), "catalog")
+
+    def __len__(self):
+        return len(self.entities)
+
+    def __contains__(self, entity_id):
+        return entity_id in self.entities
+
+    def get(self, entity_id):
+        return self.entities.get(entity_id)
+
+    # --- doğrulama ---
+    def validate(self, action):
+        """Eylem gönderilebilirse None, değilse ret nedenini döner."""
+        entity = self.entities.get(action.get("entity_id"))
+        if entity is None: return "bilinmeyen cihaz"
+        if entity.domain not in CONTROL_DOMAINS: return "salt okunur"
+        for key, value in action.items():
+            if key in ["entity_id", "state"]: continue
+            reason = entity.check(key, value)
+            if reason: return reason
+        return None
+
+    # --- üretilen içerik (sürüm başına bir kez) ---
+    def _derive(self, name, build):
+        with self._lock:
+            key = (name, self.version)
+            if key not in self._derived:
+                self._derived = {k: v for k, v in self._derived.items() if k[1] == self.version}
+                self._derived[key] = build()
+            return self._derived[key]
+
+    def control_names(self):
+        """Kontrol edilebilir cihazların görünen adları (yerel eşleştiricinin dizini bundan kurulur)."""
+        return self._derive("control_names", lambda: {eid: e.display for eid, e in self.entities.items() if e.domain in CONTROL_DOMAINS})
+
+    def descriptions(self):
+        return {eid: e.describe() for eid, e in self.entities.items() if e.domain in CONTROL_DOMAINS}
+
+    def sensors(self):
+        return {eid: e.describe() for eid, e in self.entities.items() if e.domain in QUERY_DOMAINS}
+
+    def examples(self):
+        """Yalnızca kayıtlı entity'leri kullanan few-shot örnekler; olmayan cihazlar modele örnek olmasın."""
+        return [(u, o) for u, o in EXAMPLES if _referenced(o) <= self.entities.keys()]
+
+    def prompt_prefix(self):
+        return self._derive("prefix", lambda: build_static_prefix(self.descriptions(), self.examples(), self.sensors()))
+
+    def aliases(self):
+        """Yerel eşleştirici için alanla nitelenmiş adlar (ör. "Mutfak Tavan Lambası")."""
+        return self._derive("aliases", lambda: {
+            eid: [f"{e.area} {e.name}"] for eid, e in self.entities.items()
+            if e.area and e.area.lower() not in e.name.lower()})
+
+    def areas(self):
+        """Alan -> [Entity] (arayüz listesi); alanı olmayanlar None altında."""
+        def build():
+            grouped = {}
+            for e in self.entities.values(): grouped.setdefault(e.area, []).append(e)
+            return grouped
+        return self._derive("areas", build)
+
+    # --- güncelleme ---
+    def _replace(self, entities, source):
+        ordered = sorted(entities, key=_sort_key)
+        version = _digest(ordered)
+        with self._lock:
+            changed = version != self.version
+            self.entities = {e.entity_id: e for e in ordered}
+            names = {e.entity_id: e.display for e in ordered}
+            self.names.update(names)
+            for eid in set(self.names) - names.keys(): del self.names[eid]
+            self.version, self.source = version, source
+        return changed
+
+    def _icon(self, entity_id):
+        return self._icons.get(entity_id)
+
+    def sync(self):
+        """HA'dan tam okuma (`/api/states` + alan kayıtları); içerik değiştiyse True."""
+        resp = self.session.get(f"{self.base_url}/api/states", headers={"Authorization": f"Bearer {self.token}"}, timeout=self.timeout)
+        resp.raise_for_status()
+        try:
+            areas = self.fetch_areas()
+        except Exception as e:
+            logger.warning("HA alan kayıtları okunamadı, önceki alanlar korunuyor: %s", e)
+            areas = {eid: e.area for eid, e in self.entities.items() if e.area}
+        entities = [entity_from_state(s, areas.get(s["entity_id"]), self._icon(s["entity_id"]))
+                    for s in resp.json() if s["entity_id"].split(".")[0] in DOMAINS]
+        changed = self._replace(entities, "ha")
+        self.synced_at = time.time()
+        if changed:
+            logger.info("Entity kayıt defteri güncellendi: %d entity, sürüm %s", len(entities), self.version)
+            self._save()
+        return changed
+
+    def fetch_areas(self):
+        """entity_id -> alan adı; entity'nin alanı yoksa cihazınınki kullanılır."""
+        if ws_connect is None or not self.ws_url: return {}
+        results = {}
+        with ws_connect(self.ws_url, open_timeout=self.timeout, max_size=None) as ws:
+            authenticate(ws, self.token, self.timeout)
+            for i, kind in enumerate(["area", "device", "entity"], start=1):
+                ws.send(json.dumps({"id": i, "type": f"config/{kind}_registry/list"}))
+                msg = json.loads(ws.recv(timeout=self.timeout))
+                if not msg.get("success"): raise RuntimeError(f"{kind} kayıtları alınamadı: {msg.get('error')}")
+                results[kind] = msg.get("result") or []
+        area_names = {a["area_id"]: a["name"] for a in results["area"]}
+        device_areas = {d["id"]: d.get("area_id") for d in results["device"]}
+        areas = {}
+        for e in results["entity"]:
+            name = area_names.get(e.get("area_id") or device_areas.get(e.get("device_id")))
+            if name: areas[e["entity_id"]] = name
+        return areas
+
+    def on_state(self, entity_id, old, new):
+        """StateMirror dinleyicisi: yeni, silinen ya da adı/özellikleri değişen entity'yi artımlı işler."""
+        if self.synced_at is None or entity_id.split(".")[0] not in DOMAINS: return
+        with self._lock:
+            current = self.entities.get(entity_id)
+            if new is None:
+                if current is None: return
+                changed = []
+            else:
+                entity = entity_from_state(new, current.area if current else None, self._icon(entity_id))
+                if entity == current: return  # sık gelen durum olaylarının çoğu burada biter
+                changed = [entity]
+            others = [e for eid, e in self.entities.items() if eid != entity_id]
+            self._replace(others + changed, self.source)
+        logger.info("Entity kayıt defteri artımlı güncellendi (%s), sürüm %s", entity_id, self.version)
+        self._save()
+
+    def attach(self, state_mirror):
+        if state_mirror is not None: state_mirror.add_listener(self.on_state)
+        return self
+
+    # --- arka plan senkronizasyonu ---
+    def start(self):
+        if not (self.base_url and self.token): return self
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="entity-registry", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sync()
+                delay = self.refresh_interval
+            except Exception as e:
+                logger.warning("Entity kayıt defteri HA ile senkronize edilemedi: %s", e)
+                delay = self.retry_delay
+            self._stop.wait(delay)
+
+    # --- yerel önbellek ---
+    def _load(self):
+        if not self.path or not os.path.exists(self.path): return False
+        try:
+            with open(self.path, encoding="utf-8") as f: data = json.load(f)
+            entities = [Entity(**e) for e in data["entities"]]
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning("Entity önbelleği okunamadı (%s): %s", self.path, e)
+            return False
+        self._replace(entities, "cache")
+        if self.version != data.get("version"): logger.warning("Entity önbelleğinin sürüm özeti tutmuyor; yeniden hesaplandı")
+        return True
+
+    def _save(self):
+        if not self.path: return
+        with self._lock:
+            data = {"version": self.version, "synced_at": self.synced_at, "entities": [asdict(e) for e in self.entities.values()]}
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f: json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning("Entity önbelleği yazılamadı (%s): %s", self.path, e)
@@ -0,0 +1,161 @@
+"""Dış servis çağrıları (HA, LLM, hava durumu, ses tanıma) için dayanıklılık katmanı.
+
+- CircuitBreaker: art arda `failure_threshold` geçici hatada devre açılır; açıkken
+  çağrılar ağa hiç çıkmadan `CircuitOpen` ile reddedilir. `reset_timeout` sonra
+  tek bir deneme (yarı açık) geçirilir; başarılıysa devre kapanır.
+- Deadline: komut başına toplam süre bütçesi; her çağrının zaman aşımı kalan
+  bütçeyle sınırlanır.
+- retry(): yalnızca idempotent çağrılar için sınırlı, tam jitter'lı yeniden deneme.
+"""
+import logging
+import math
+import random
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpen(Exception):
+    def __init__(self, breaker):
+        super().__init__(f"{breaker.name} devresi açık, {breaker.retry_in():.0f} sn sonra yeniden denenecek")
+        self.breaker = breaker
+
+
+class DeadlineExceeded(TimeoutError):
+    """Komutun süre bütçesi doldu; çağrı hiç başlatılmadı."""
+
+
+def is_transient(exc):
+    """Yeniden denemeye ve devre sayımına değer hata mı (ağ, zaman aşımı, 5xx, 429)?"""
+    if isinstance(exc, (CircuitOpen, DeadlineExceeded)): return False
+    if exc.__cause__ is not None and is_transient(exc.__cause__): return True  # sarmalanmış hatalar
+    response = getattr(exc, "response", None)
+    status = getattr(exc, "status_code", None) or getattr(response, "status_code", None)
+    if status is not None: return status >= 500 or status == 429
+    if isinstance(exc, (TimeoutError, OSError)): return True  # requests hataları da OSError'dır
+    return any(word in type(exc).__name__ for word in ["Timeout", "Connection", "RequestError"])
+
+
+class CircuitBreaker:
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name, failure_threshold=3, reset_timeout=30.0, clock=time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0  # art arda geçici hata sayısı
+        self.opened_at = None
+        self.trips = 0  # devrenin kaç kez açıldığı
+        self.rejected = 0  # açık devre yüzünden ağa çıkmadan reddedilen çağrılar
+        self.last_error = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.state != self.CLOSED
+
+    def retry_in(self):
+        if self.state == self.CLOSED or self.opened_at is None: return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - self.clock())
+
+    def allow(self):
+        """Çağrı yapılabilir mi? Yarı açık durumda aynı anda tek deneme geçer."""
+        with self._lock:
+            if self.state == self.CLOSED: return True
+            if self.state == self.OPEN:
+                if self.clock() - self.opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self.state, self._probing = self.HALF_OPEN, False
+            if self._probing:
+                self.rejected += 1
+                return False
+            self._probing = True
+            return True
+
+    def success(self):
+        with self._lock:
+            if self.state != self.CLOSED: logger.info("%s devresi kapandı", self.name)
+            self.state, self.failures, self._probing = self.CLOSED, 0, False
+
+    def failure(self, exc=None):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(exc) if exc is not None else None
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.trips += 1
+                    logger.warning("%s devresi açıldı (%d hata): %s", self.name, self.failures, exc)
+                self.state, self.opened_at, self._probing = self.OPEN, self.clock(), False
+
+    def call(self, fn, *args, **kwargs):
+        if not self.allow(): raise CircuitOpen(self)
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            # Geçici olmayan hata (ör. 400) servisin ayakta olduğunu gösterir
+            if is_transient(e): self.failure(e)
+            else: self.success()
+            raise
+        self.success()
+        return result
+
+
+class CircuitBreakers:
+    """Uç nokta adına göre süreç genelinde paylaşılan devre kesiciler."""
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            if name not in self._breakers:
+                self._breakers[name] = CircuitBreaker(name, self.failure_threshold, self.reset_timeout)
+            return self._breakers[name]
+
+    def __iter__(self):
+        return iter(list(self._breakers.values()))
+
+    def open_circuits(self):
+        return [b for b in self if b.is_open]
+
+
+class Deadline:
+    """Komut başına süre bütçesi; `seconds` None ise sınırsız."""
+
+    def __init__(self, seconds=None, clock=time.monotonic):
+        self.clock = clock
+        self.expires = clock() + seconds if seconds else None
+
+    def remaining(self):
+        return math.inf if self.expires is None else self.expires - self.clock()
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    def timeout(self, default):
+        """`default` ile kalan bütçenin küçüğü; bütçe bittiyse DeadlineExceeded."""
+        remaining = self.remaining()
+        if remaining <= 0: raise DeadlineExceeded("Komutun süre bütçesi doldu")
+        return min(default, remaining) if default else remaining
+
+
+def retry(fn, attempts=3, base_delay=0.2, max_delay=2.0, deadline=None, should_retry=is_transient):
+    """fn'i en çok `attempts` kez dener; beklemeler tam jitter'lı üstel (0..min(max, base·2^n))."""
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == attempts - 1 or not should_retry(e): raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            if deadline is not None and deadline.remaining() <= delay: raise
+            logger.info("Geçici hata, %.2f sn sonra yeniden denenecek (%d/%d): %s", delay, attempt + 1, attempts - 1, e)
+            time.sleep(delay)
@@ -0,0 +1,470 @@
+"""Yerel kural motoru: koşullu ve tekrarlı istekler LLM'e bir daha sorulmadan sürekli değerlendirilir.
+
+Model "Eğer dışarı soğuksa..." ya da "Her sabah 8'de..." gibi istekleri plandaki
+`rules` listesine bildirimsel bir kural olarak derler:
+
+    {"trigger": {"entity_id": "binary_sensor.hareket_salon", "to": "off"}  ya da  {"at": "08:00"},
+     "conditions": [{"entity_id": "light.salon_isigi", "state": "on"}, {"entity_id": "sensor.nem_genel", "above": 60},
+                    {"weather": "temp", "below": 5}, {"after": "23:00", "before": "06:00"}],
+     "for_seconds": 600, "actions": [...], "reminder": "metin", "once": false}
+
+Tetikleyicisi olmayan kural, koşulları yanlıştan doğruya döndüğünde çalışır;
+eklendiği anda koşul sağlanıyorsa hemen çalışır. Kurallar izledikleri entity'ye
+göre dizinlenir: bir durum değişikliğinde yalnızca o entity'ye bağlı kurallar
+değerlendirilir. `at` tetikleyicileri, saat koşullarının sınırları ve
+`for_seconds` beklemeleri tek bir min-heap'ten uyandırılır. Eylemler ayrı bir
+işçi thread'inde gönderilir; durum aynasının thread'i beklemez.
+"""
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import asdict, dataclass, field
+
+logger = logging.getLogger(__name__)
+
+WEATHER_FIELDS = {"temp": "dış sıcaklık", "hum": "dış nem", "wind": "rüzgar", "desc": "hava"}
+STATE_WORDS = {"on": "açık", "off": "kapalı", "open": "açık", "closed": "kapalı", "playing": "çalıyor", "idle": "boşta"}
+ACTION_WORDS = {"on": "aç", "off": "kapat", "open": "aç", "closed": "kapat"}
+WEATHER = "weather"  # hava durumu koşullarının dizin anahtarı
+
+
+def minute_of_day(text):
+    """"08:00", "8", "8.30" -> gün içindeki dakika; anlaşılamazsa ValueError."""
+    hour, _, minute = str(text).strip().replace(".", ":").partition(":")
+    hour, minute = int(hour), int(minute or 0)
+    if not (0 <= hour < 24 and 0 <= minute < 60): raise ValueError(text)
+    return hour * 60 + minute
+
+
+def next_occurrence(minute, now=None):
+    """`minute` (gün içi dakika) saatinin `now`dan sonraki ilk zamanı."""
+    now = time.time() if now is None else now
+    t = time.localtime(now)
+    for day in range(2):
+        due = time.mktime((t.tm_year, t.tm_mon, t.tm_mday + day, minute // 60, minute % 60, 0, 0, 0, -1))
+        if due > now: return due
+    return due
+
+
+def _number(value):
+    try: return float(value)
+    except (TypeError, ValueError): return None
+
+
+def predicate(cond):
+    """Koşulun karşılaştırmalarını (state / not_state / above / below / contains) bir kez derler.
+
+    Dönen fonksiyon değeri alıp bool döner; durum değişikliği başına yalnızca bu
+    fonksiyonlar çalışır, koşul sözlüğü yeniden yorumlanmaz.
+    """
+    tests = []
+    if "state" in cond:
+        states = frozenset(str(s).lower() for s in (cond["state"] if isinstance(cond["state"], list) else [cond["state"]]))
+        tests.append(lambda v: str(v).lower() in states)
+    if "not_state" in cond:
+        excluded = str(cond["not_state"]).lower()
+        tests.append(lambda v: str(v).lower() != excluded)
+    if "contains" in cond:
+        needle = str(cond["contains"]).lower()
+        tests.append(lambda v: needle in str(v).lower())
+    if "above" in cond or "below" in cond:
+        low, high = cond.get("above", float("-inf")), cond.get("below", float("inf"))
+        def in_range(v):
+            number = _number(v)
+            return number is not None and low < number < high
+        tests.append(in_range)
+    if len(tests) == 1:
+        test = tests[0]
+        return lambda v: v is not None and test(v)
+    return lambda v: v is not None and all(t(v) for t in tests)
+
+
+def window(cond):
+    """{"after": "23:00", "before": "06:00"} -> dakika testi; gece yarısını aşan aralıklar desteklenir."""
+    after = minute_of_day(cond["after"]) if "after" in cond else 0
+    before = minute_of_day(cond["before"]) if "before" in cond else 24 * 60
+    if after > before: return lambda minute: minute >= after or minute < before
+    return lambda minute: after <= minute < before
+
+
+@dataclass
+class Rule:
+    actions: list = field(default_factory=list)
+    conditions: list = field(default_factory=list)
+    trigger: dict = field(default_factory=dict)  # {} | {"entity_id", "to", "from"} | {"at": "HH:MM"}
+    for_seconds: float = 0  # koşul bu kadar süre kesintisiz sağlanınca çalışır
+    cooldown: float = 60  # iki çalışma arasındaki en kısa süre (salınımı önler)
+    reminder: str = None
+    once: bool = False  # bir kez çalışınca silinir
+    weekdays_only: bool = False
+    created: float = field(default_factory=time.time)
+    fired: int = 0
+    last_fired: float = None
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:8])
+
+    def signature(self):
+        return json.dumps([self.trigger, self.conditions, self.actions, self.reminder, self.for_seconds, self.once, self.weekdays_only],
+                          sort_keys=True, ensure_ascii=False)
+
+    def boundaries(self):
+        """Tetikleyicisiz kuralda koşulun değişebileceği saatler (gün içi dakika)."""
+        if self.trigger: return []
+        windows = [c for c in self.conditions if "after" in c or "before" in c]
+        minutes = [minute_of_day(c[key]) for c in windows for key in ["after", "before"] if key in c]
+        # Tek taraflı aralık ve hafta içi kısıtı gece yarısında da değişir
+        if self.weekdays_only or any(not ("after" in c and "before" in c) for c in windows): minutes.append(0)
+        return minutes
+
+    def describe(self, names=None):
+        names = names or {}
+        name = lambda eid: names.get(eid, eid)
+        parts = []
+        if self.trigger.get("at"): parts.append(f"her gün {self.trigger['at']}")
+        elif self.trigger.get("entity_id"):
+            to = self.trigger.get("to")
+            parts.append(f"{name(self.trigger['entity_id'])} {STATE_WORDS.get(to, to) + ' olunca' if to else 'değişince'}")
+        if self.conditions: parts.append("eğer " + " ve ".join(self._describe_condition(c, name) for c in self.conditions))
+        if self.for_seconds: parts.append(f"{self.for_seconds / 60:g} dk boyunca" if self.for_seconds >= 60 else f"{self.for_seconds:g} sn boyunca")
+        effects = [f"{name(a['entity_id'])} {ACTION_WORDS.get(a.get('state'), a.get('state') or 'çalıştır')}" for a in self.actions]
+        if self.reminder: effects.append(f"🔔 {self.reminder}")
+        extra = " (hafta içi)" if self.weekdays_only else ""
+        if self.once: extra += " (tek sefer)"
+        return f"{', '.join(parts)} → {', '.join(effects)}{extra}"
+
+    @staticmethod
+    def _describe_condition(cond, name):
+        if "entity_id" in cond: subject = name(cond["entity_id"]) + (f" {cond['attribute']}" if cond.get("attribute") else "")
+        elif "weather" in cond: subject = WEATHER_FIELDS.get(cond["weather"], cond["weather"])
+        else: return f"saat {cond.get('after', '00:00')}-{cond.get('before', '24:00')}"
+        tests = []
+        if "state" in cond:
+            states = cond["state"] if isinstance(cond["state"], list) else [cond["state"]]
+            tests.append("/".join(STATE_WORDS.get(s, str(s)) for s in states))
+        if "not_state" in cond: tests.append(f"{STATE_WORDS.get(cond['not_state'], cond['not_state'])} değil")
+        if "contains" in cond: tests.append(f"'{cond['contains']}' içeriyor")
+        if "above" in cond: tests.append(f"> {cond['above']:g}")
+        if "below" in cond: tests.append(f"< {cond['below']:g}")
+        return f"{subject} {' '.join(tests)}".strip()
+
+
+def rule_from_plan(spec):
+    """LLM planındaki (plan_parser.clean_rule'dan geçmiş) bir `rules` girdisini Rule nesnesine çevirir."""
+    rule = Rule(
+        actions=list(spec.get("actions") or []),
+        conditions=list(spec.get("conditions") or []),
+        trigger=dict(spec.get("trigger") or {}),
+        for_seconds=spec.get("for_seconds") or 0,
+        reminder=spec.get("reminder"),
+        once=spec.get("once") is True,
+        weekdays_only=spec.get("weekdays_only") is True,
+    )
+    if "cooldown_seconds" in spec: rule.cooldown = spec["cooldown_seconds"]
+    if not (rule.actions or rule.reminder): raise ValueError("kuralın eylemi yok")
+    if not (rule.trigger or rule.conditions): raise ValueError("kuralın tetikleyicisi ya da koşulu yok")
+    return rule
+
+
+@dataclass(eq=False)
+class Condition:
+    """Birden çok kuralın paylaştığı tek bir koşul; doğruluk değeri yalnızca izlediği değer değişince yeniden hesaplanır."""
+    spec: str  # koşulun JSON'u (paylaşım anahtarı)
+    source: str  # "entity" | WEATHER
+    key: str  # entity_id ya da hava durumu alanı
+    attribute: str
+    test: object
+    truth: bool = False
+    rules: set = field(default_factory=set)
+
+
+class RuleEngine:
+    """Kuralları paylaşılan koşul dizini ve tek bir worker thread ile sürekli değerlendirir.
+
+    Aynı koşul (ör. "hareket = on") tüm kurallar için tek bir `Condition`dır ve
+    entity'ye göre dizinlenir. Durum değişikliğinde yalnızca o entity'nin
+    koşulları test edilir; doğruluğu değişen koşul, kurallarının yanlış koşul
+    sayacını günceller. Kural sayacı sıfırsa koşulları sağlanıyordur, yani
+    değerlendirme maliyeti kural sayısına değil değişen koşul sayısına bağlıdır.
+    Saat aralıkları sayılmaz, kural değerlendirilirken doğrudan test edilir.
+    """
+
+    def __init__(self, callback, state_mirror=None, path=None, names=None, max_rules=10000, history_size=20):
+        self.callback = callback  # callback(rule) -> sonuç metni
+        self.state_mirror = state_mirror
+        self.path = path
+        self.max_rules = max_rules
+        self.history = deque(maxlen=history_size)  # (zaman, açıklama, sonuç)
+        self.fired = self.failed = 0
+        self.changes = 0  # en az bir koşulu ya da tetikleyiciyi ilgilendiren durum değişikliği
+        self.evaluations = 0  # çalıştırılan koşul testi
+        self.eval_seconds = 0.0  # dinleyicilerde geçen toplam süre
+        self.names = names or {}  # geçmiş satırlarındaki görünen adlar
+        self._rules = {}
+        self._signatures = {}  # imza -> kural id; aynı kural (ör. önbellekten tekrar gelen plan) iki kez eklenmez
+        self._conditions = {}  # koşulun JSON'u -> Condition
+        self._watching = {}  # entity_id | WEATHER -> {Condition}
+        self._triggers = {}  # entity_id -> {kural id}
+        self._compiled = {}  # kural id -> ([Condition], [saat aralığı testi], to testi, from testi)
+        self._false = {}  # kural id -> yanlış olan koşul sayısı
+        self._active = {}  # kural id -> koşulun son değeri; None: henüz bilinmiyor (diskten yüklenen kural)
+        self._due = {}  # (kural id, tür) -> zaman; heap girdisi bununla eşleşmiyorsa bayattır
+        self._heap = []  # (zaman, kural id, tür): at | edge (saat sınırı) | for (bekleme süresi doldu)
+        self._queue = deque()  # çalıştırılacak kurallar
+        self._weather = None
+        self._cond = threading.Condition()
+        self._thread = None
+        if path:
+            with self._cond: self._load()
+
+    # --- API ---
+    def start(self):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="rule-engine", daemon=True)
+                self._thread.start()
+        return self
+
+    def add(self, rule):
+        """(kural, yeni_mi) döner; aynı kural zaten varsa mevcut olan döner. Koşul şu an sağlanıyorsa kural hemen çalışır."""
+        with self._cond:
+            existing = self._signatures.get(rule.signature())
+            if existing is not None: return self._rules[existing], False
+            if len(self._rules) >= self.max_rules: raise ValueError(f"kural sınırına ulaşıldı ({self.max_rules})")
+            self._register(rule, known=True)
+            self._save()
+            self._cond.notify()
+        return rule, True
+
+    def add_from_plan(self, spec):
+        return self.add(rule_from_plan(spec))
+
+    def remove(self, rule_id):
+        with self._cond:
+            if not self._unregister(rule_id): return False
+            self._save()
+            return True
+
+    def rules(self):
+        with self._cond:
+            return sorted(self._rules.values(), key=lambda r: r.created)
+
+    def is_active(self, rule_id):
+        return self._active.get(rule_id) is True
+
+    def __len__(self):
+        return len(self._rules)
+
+    # --- dinleyiciler ---
+    def on_state(self, entity_id, old, new):
+        """StateMirror dinleyicisi: yalnızca bu entity'nin koşulları ve tetikleyicileri işlenir."""
+        if entity_id not in self._watching and entity_id not in self._triggers: return
+        t0 = time.perf_counter()
+        with self._cond:
+            now = time.time()
+            for rule_id in self._update(self._watching.get(entity_id, ())):
+                rule = self._rules[rule_id]
+                if not rule.trigger: self._evaluate(rule, now)
+            for rule_id in list(self._triggers.get(entity_id, ())): self._on_trigger(self._rules[rule_id], old, new, now)
+            self.changes += 1
+            if self._queue: self._cond.notify()
+        self.eval_seconds += time.perf_counter() - t0
+
+    def on_weather(self, reading):
+        """WeatherCache dinleyicisi: hava durumu koşulları yeniden test edilir."""
+        with self._cond:
+            self._weather = reading
+            now = time.time()
+            for rule_id in self._update(self._watching.get(WEATHER, ())):
+                rule = self._rules[rule_id]
+                if not rule.trigger: self._evaluate(rule, now)
+            if self._queue: self._cond.notify()
+
+    # --- değerlendirme (kilit tutulurken çağrılır) ---
+    def _value(self, source, key, attribute=None):
+        if source == WEATHER: return getattr(self._weather, key, None)
+        entry = self.state_mirror.get(key) if self.state_mirror is not None else None
+        if entry is None: return None
+        return entry.get("attributes", {}).get(attribute) if attribute else entry.get("state")
+
+    def _update(self, conditions):
+        """Koşulları yeniden test eder; doğruluğu değişenlerin kurallarını döner (sayaçlar önce tümüyle güncellenir)."""
+        affected = set()
+        for c in conditions:
+            truth = c.test(self._value(c.source, c.key, c.attribute))
+            if truth == c.truth: continue
+            c.truth = truth
+            delta = -1 if truth else 1
+            for rule_id in c.rules: self._false[rule_id] += delta
+            affected |= c.rules
+        self.evaluations += len(conditions)
+        return affected
+
+    def _holds(self, rule, now):
+        if self._false[rule.id]: return False
+        _, windows, to, _ = self._compiled[rule.id]
+        if rule.weekdays_only or windows:
+            local = time.localtime(now)
+            if rule.weekdays_only and local.tm_wday >= 5: return False
+            if not all(test(local.tm_hour * 60 + local.tm_min) for test in windows): return False
+        if rule.for_seconds and to is not None: return to(self._value("entity", rule.trigger["entity_id"]))
+        return True
+
+    def _evaluate(self, rule, now, fire_on_true=False):
+        """Tetikleyicisiz kural: koşul yanlıştan doğruya dönünce (ya da for_seconds sonra) çalışır."""
+        holds = self._holds(rule, now)
+        previous = self._active.get(rule.id)
+        self._active[rule.id] = holds
+        if not holds:
+            self._due.pop((rule.id, "for"), None)
+            return
+        if previous is None and not fire_on_true: return  # yeniden başlatmada zaten doğru olan koşul tetiklemez
+        if previous is not True: self._arm(rule, now)
+
+    def _on_trigger(self, rule, old, new, now):
+        _, _, to, source = self._compiled[rule.id]
+        old_state, new_state = (old or {}).get("state"), (new or {}).get("state")
+        if old is None or new is None or old_state == new_state: return  # ilk okuma ya da yalnızca özellik değişikliği
+        if to is not None and not to(new_state):
+            self._due.pop((rule.id, "for"), None)
+            return
+        if source is not None and not source(old_state): return
+        if rule.for_seconds: self._arm(rule, now)
+        elif self._holds(rule, now): self._fire(rule, now)
+
+    def _arm(self, rule, now):
+        if not rule.for_seconds: return self._fire(rule, now)
+        if (rule.id, "for") not in self._due: self._schedule(rule.id, "for", now + rule.for_seconds)
+
+    def _fire(self, rule, now):
+        if rule.last_fired is not None and now - rule.last_fired < rule.cooldown: return
+        rule.last_fired = now
+        self._queue.append(rule)
+
+    def _schedule(self, rule_id, kind, due):
+        self._due[(rule_id, kind)] = due
+        heapq.heappush(self._heap, (due, rule_id, kind))
+        self._cond.notify()  # worker daha geç bir uyanma için bekliyor olabilir
+
+    def _schedule_next(self, rule, now):
+        if rule.trigger.get("at"): self._schedule(rule.id, "at", next_occurrence(minute_of_day(rule.trigger["at"]), now))
+        boundaries = rule.boundaries()
+        if boundaries: self._schedule(rule.id, "edge", min(next_occurrence(m, now) for m in boundaries))
+
+    @staticmethod
+    def _watch_key(c):
+        return c.key if c.source == "entity" else WEATHER
+
+    def _condition(self, cond):
+        """Koşulun paylaşılan örneği; ilk kez görülüyorsa dizine eklenir ve mevcut değerle test edilir."""
+        key = json.dumps(cond, sort_keys=True, ensure_ascii=False)
+        c = self._conditions.get(key)
+        if c is None:
+            source, subject = ("entity", cond["entity_id"]) if "entity_id" in cond else (WEATHER, cond["weather"])
+            c = self._conditions[key] = Condition(key, source, subject, cond.get("attribute"), predicate(cond))
+            c.truth = c.test(self._value(c.source, c.key, c.attribute))
+            self._watching.setdefault(self._watch_key(c), set()).add(c)
+        return c
+
+    def _register(self, rule, known):
+        self._rules[rule.id] = rule
+        self._signatures[rule.signature()] = rule.id
+        conditions = list({id(c): c for c in (self._condition(cond) for cond in rule.conditions
+                                                if "entity_id" in cond or "weather" in cond)}.values())
+        for c in conditions: c.rules.add(rule.id)
+        self._false[rule.id] = sum(not c.truth for c in conditions)
+        windows = [window(cond) for cond in rule.conditions if not ("entity_id" in cond or "weather" in cond)]
+        trigger = rule.trigger
+        to = predicate({"state": trigger["to"]}) if "to" in trigger else None
+        source = predicate({"state": trigger["from"]}) if "from" in trigger else None
+        self._compiled[rule.id] = (conditions, windows, to, source)
+        if trigger.get("entity_id"): self._triggers.setdefault(trigger["entity_id"], set()).add(rule.id)
+        now = time.time()
+        self._schedule_next(rule, now)
+        self._active[rule.id] = None
+        if not trigger: self._evaluate(rule, now, fire_on_true=known)
+
+    def _unregister(self, rule_id):
+        rule = self._rules.pop(rule_id, None)
+        if rule is None: return False
+        self._signatures.pop(rule.signature(), None)
+        conditions, *_ = self._compiled.pop(rule_id)
+        for c in conditions:
+            c.rules.discard(rule_id)
+            if c.rules: continue
+            del self._conditions[c.spec]
+            watching = self._watching[self._watch_key(c)]
+            watching.discard(c)
+            if not watching: del self._watching[self._watch_key(c)]
+        entity_id = rule.trigger.get("entity_id")
+        if entity_id in self._triggers:
+            self._triggers[entity_id].discard(rule_id)
+            if not self._triggers[entity_id]: del self._triggers[entity_id]
+        for table in [self._false, self._active]: table.pop(rule_id, None)
+        for kind in ["at", "edge", "for"]: self._due.pop((rule_id, kind), None)
+        if len(self._heap) > 2 * len(self._due) + 64:
+            self._heap = [(due, rid, kind) for (rid, kind), due in self._due.items()]
+            heapq.heapify(self._heap)
+        return True
+
+    def _wake(self, now):
+        # Vakti gelen heap girdilerini işler; bir sonraki bekleme süresini döner
+        while self._heap:
+            due, rule_id, kind = self._heap[0]
+            if self._due.get((rule_id, kind)) != due:
+                heapq.heappop(self._heap)
+                continue
+            if due > now: return due - now
+            heapq.heappop(self._heap)
+            del self._due[(rule_id, kind)]
+            rule = self._rules[rule_id]
+            if kind == "at":
+                if self._holds(rule, now): self._fire(rule, now)
+            elif kind == "for":
+                if self._holds(rule, now): self._fire(rule, now)
+            else: self._evaluate(rule, now)
+            if kind != "for": self._schedule_next(rule, now)
+        return None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                wait = self._wake(time.time())
+                if not self._queue:
+                    self._cond.wait(wait)
+                    continue
+                rule = self._queue.popleft()
+                if rule.id not in self._rules: continue
+            try:
+                result = self.callback(rule)
+                self.fired += 1
+            except Exception as e:
+                logger.exception("Kural %s çalıştırılamadı", rule.id)
+                result = f"❌ Hata: {e}"
+                self.failed += 1
+            logger.info("Kural çalıştı: %s", result)
+            self.history.appendleft((time.time(), rule.describe(self.names), result))
+            with self._cond:
+                rule.fired += 1
+                if rule.once: self._unregister(rule.id)
+                self._save()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for raw in json.load(f): self._register(Rule(**raw), known=False)
+        except FileNotFoundError:
+            pass
+        except (ValueError, TypeError, KeyError) as e:
+            logger.warning("Kural dosyası okunamadı (%s): %s", self.path, e)
+
+    def _save(self):
+        if not self.path: return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump([asdict(r) for r in self._rules.values()], f, ensure_ascii=False)
+        os.replace(tmp, self.path)
@@ -0,0 +1,212 @@
+import heapq
+import json
+import logging
+import math
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import asdict, dataclass, field
+
+logger = logging.getLogger(__name__)
+
+REPEAT_PERIODS = {"hourly": 3600, "daily": 86400, "weekly": 7 * 86400}
+PLAN_KEYS = ["delay_seconds", "entity_id", "reminder", "repeat", "count", "weekdays_only", "interval_seconds", "duration"]
+
+
+@dataclass
+class Timer:
+    due: float  # time.time() cinsinden
+    entity_id: str = None
+    action: dict = field(default_factory=dict)
+    reminder: str = None
+    repeat: str = None  # hourly / daily / weekly / interval
+    interval: float = None
+    count: int = None  # kalan tetikleme sayısı, None = sınırsız
+    weekdays_only: bool = False
+    id: str = field(default_factory=lambda: uuid.uuid4().hex[:8])
+
+    def period(self):
+        if self.repeat == "interval": return self.interval
+        return REPEAT_PERIODS.get(self.repeat)
+
+    def describe(self):
+        target = self.reminder or f"{self.entity_id} → {self.action.get('state', 'off')}"
+        extra = f" 🔁 {self.repeat}" if self.repeat else ""
+        if self.count is not None and self.repeat: extra += f" ×{self.count}"
+        if self.weekdays_only: extra += " (hafta içi)"
+        return f"{time.strftime('%d.%m %H:%M:%S', time.localtime(self.due))} – {target}{extra}"
+
+
+def _coerce_delay(value):
+    try: return max(0.0, float(value))
+    except (TypeError, ValueError): raise ValueError(f"geçersiz süre: {value}") from None
+
+
+def _skip_weekend(due):
+    while time.localtime(due).tm_wday >= 5: due += 86400
+    return due
+
+
+def timer_from_plan(spec, now=None):
+    """LLM planındaki bir `timers` girdisini Timer nesnesine çevirir; süre anlaşılamazsa ValueError."""
+    now = now or time.time()
+    delay = _coerce_delay(spec.get("delay_seconds", 5))  # yalnızca süre hiç verilmemişse varsayılan
+    repeat = spec.get("repeat") if spec.get("repeat") in [*REPEAT_PERIODS, "interval"] else None
+    interval = _coerce_delay(spec.get("interval_seconds", spec.get("duration", delay))) if repeat == "interval" else None
+    if repeat == "interval" and not interval: repeat = None
+    try: count = int(spec["count"])
+    except (KeyError, TypeError, ValueError): count = None
+    weekdays_only = spec.get("weekdays_only") in [True, "true"]
+    due = now + delay
+    if weekdays_only: due = _skip_weekend(due)
+    return Timer(
+        due=due,
+        entity_id=spec.get("entity_id"),
+        action={k: v for k, v in spec.items() if k not in PLAN_KEYS},
+        reminder=spec.get("reminder"),
+        repeat=repeat,
+        interval=interval,
+        count=count,
+        weekdays_only=weekdays_only,
+    )
+
+
+class TimerScheduler:
+    """Tüm zamanlayıcıları tek bir worker thread ve min-heap ile yürütür.
+
+    Ekleme O(log n); iptal sözlükten silip heap girdisini mezar taşı olarak
+    bırakır, mezar taşları yarıyı geçince heap yeniden kurulur. Çalışmakta olan
+    zamanlayıcı sözlükte (ve dosyada) kalır; bu sırada iptal edilirse yeniden kurulmaz.
+    """
+
+    def __init__(self, callback, path=None, history_size=20):
+        self.callback = callback  # callback(timer) -> sonuç metni
+        self.path = path
+        self.history = deque(maxlen=history_size)  # (zaman, açıklama, sonuç)
+        self.fired = self.failed = 0
+        self.last_lag = 0.0  # son tetiklemenin planlanan zamandan gecikmesi (sn)
+        self._timers = {}
+        self._firing = set()  # callback'i çalışmakta olan zamanlayıcılar (heap'te girdileri yok)
+        self._heap = []
+        self._tombstones = 0
+        self._cond = threading.Condition()
+        self._thread = None
+        if path: self._load()
+
+    # --- API ---
+    def start(self):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="timer-scheduler", daemon=True)
+                self._thread.start()
+        return self
+
+    def schedule(self, timer):
+        with self._cond:
+            self._push(timer)
+            self._save()
+            self._cond.notify()
+        return timer
+
+    def add_from_plan(self, spec):
+        return self.schedule(timer_from_plan(spec))
+
+    def cancel(self, timer_id):
+        with self._cond:
+            if self._timers.pop(timer_id, None) is None: return False
+            if timer_id not in self._firing: self._tombstones += 1
+            if self._tombstones > len(self._heap) // 2: self._compact()
+            self._save()
+            self._cond.notify()
+            return True
+
+    def pending(self):
+        with self._cond:
+            return sorted(self._timers.values(), key=lambda t: t.due)
+
+    def __len__(self):
+        return len(self._timers)
+
+    # --- iç işleyiş ---
+    def _push(self, timer):
+        self._timers[timer.id] = timer
+        heapq.heappush(self._heap, (timer.due, timer.id))
+
+    def _compact(self):
+        self._heap = [(t.due, t.id) for t in self._timers.values() if t.id not in self._firing]
+        heapq.heapify(self._heap)
+        self._tombstones = 0
+
+    def _pop_due(self):
+        # Kilit tutulurken çağrılır; vakti gelen zamanlayıcıyı ya da bekleme süresini döner
+        while self._heap:
+            due, timer_id = self._heap[0]
+            timer = self._timers.get(timer_id)
+            if timer is None or timer.due != due:
+                heapq.heappop(self._heap)
+                self._tombstones = max(0, self._tombstones - 1)
+                continue
+            wait = due - time.time()
+            if wait > 0: return None, wait
+            heapq.heappop(self._heap)
+            self._firing.add(timer_id)
+            return timer, 0
+        return None, None
+
+    def _reschedule(self, timer):
+        self._firing.discard(timer.id)
+        if self._timers.get(timer.id) is not timer: return  # çalışırken iptal edildi
+        if timer.count is not None: timer.count -= 1
+        period = timer.period()
+        if not period or (timer.count is not None and timer.count <= 0):
+            del self._timers[timer.id]
+            return
+        # Tam periyotlarla ilerlenir: kapalı kalınan sürede kaçanlar atlanır, saat (ör. her gün 08:00) kaymaz
+        due = timer.due + period * (math.floor(max(0.0, time.time() - timer.due) / period) + 1)
+        timer.due = _skip_weekend(due) if timer.weekdays_only else due
+        self._push(timer)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                timer, wait = self._pop_due()
+                if timer is None:
+                    self._cond.wait(wait)
+                    continue
+            self.last_lag = max(0.0, time.time() - timer.due)
+            try:
+                result = self.callback(timer)
+                self.fired += 1
+            except Exception as e:
+                logger.exception("Zamanlayıcı %s çalıştırılamadı", timer.id)
+                result = f"❌ Hata: {e}"
+                self.failed += 1
+            logger.info("Zamanlayıcı Bitti: %s", result)
+            self.history.appendleft((time.time(), timer.describe(), result))
+            with self._cond:
+                self._reschedule(timer)
+                self._save()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for raw in json.load(f):
+                    self._push(Timer(**raw))
+        except FileNotFoundError:
+            pass
+        except (ValueError, TypeError) as e:
+            logger.warning("Zamanlayıcı dosyası okunamadı (%s): %s", self.path, e)
+
+    def _save(self):
+        if not self.path: return
+        # Yazılamayan dosya (disk dolu, izin) worker thread'ini öldürmemeli; bellekteki zamanlayıcılar çalışmaya devam eder
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump([asdict(t) for t in self._timers.values()], f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning("Zamanlayıcı dosyası yazılamadı (%s): %s", self.path, e)
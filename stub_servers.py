@@ -0,0 +1,319 @@
+"""Yerel geliştirme ve ölçüm için sahte Home Assistant, LLM ve hava durumu sunucuları.
+
+- FakeHomeAssistant: REST (`/api/states`, `/api/services/<domain>/<service>`) ve
+  WebSocket (`state_changed` aboneliği, alan/cihaz/entity kayıt listeleri) uçları.
+- FakeLLM: OpenAI uyumlu `/v1/chat/completions` (akışlı ve akışsız).
+- FakeWeather: OpenWeatherMap `/data/2.5/weather`.
+
+Hepsinde gecikme ve hata oranı ayarlanabilir. Tek başına çalıştırmak için:
+`python stub_servers.py`
+"""
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from websockets.sync.server import serve as ws_serve
+
+from catalog import ENTITY_NAMES
+
+DEFAULT_SENSORS = {
+    "sensor.sicaklik_salon": ("24.5", {"unit_of_measurement": "°C", "friendly_name": "Salon Sıcaklığı"}),
+    "sensor.sicaklik_dis": ("12.0", {"unit_of_measurement": "°C", "friendly_name": "Dış Sıcaklık"}),
+    "sensor.nem_genel": ("48", {"unit_of_measurement": "%", "friendly_name": "Nem"}),
+    "sensor.guc_tuketimi": ("850", {"unit_of_measurement": "W", "friendly_name": "Güç Tüketimi"}),
+    "sensor.isik_seviyesi_salon": ("120", {"unit_of_measurement": "lx", "friendly_name": "Salon Işık Seviyesi"}),
+    "binary_sensor.hareket_salon": ("off", {"friendly_name": "Salon Hareket"}),
+}
+# Kayıt defteri senkronizasyonu için örnek özellikler (HA supported_features bitleri)
+DEFAULT_CAPABILITIES = {
+    "light.salon_isigi": {"supported_features": 44, "supported_color_modes": ["rgb", "color_temp"]},
+    "light.yatak_odasi_isigi": {"supported_features": 32, "supported_color_modes": ["brightness"]},
+    "light.mutfak_isigi": {"supported_features": 32, "supported_color_modes": ["brightness"]},
+    "climate.klima": {"supported_features": 9, "hvac_modes": ["off", "cool", "heat", "dry", "fan_only", "auto"],
+                      "min_temp": 16, "max_temp": 30},
+    "fan.fan_salon": {"supported_features": 3},
+    "cover.perde_salon": {"supported_features": 15},
+    "media_player.tv_salon": {"supported_features": 2452},
+    "media_player.muzik_sistemi": {"supported_features": 2452},
+}
+DEFAULT_AREAS = {"Salon": ["light.salon_isigi", "fan.fan_salon", "cover.perde_salon", "media_player.tv_salon",
+                           "sensor.sicaklik_salon", "sensor.isik_seviyesi_salon", "binary_sensor.hareket_salon"],
+                 "Yatak Odası": ["light.yatak_odasi_isigi"],
+                 "Mutfak": ["light.mutfak_isigi", "switch.kahve_makinesi", "switch.cay_makinesi"]}
+
+
+def _new_state(entity_id, state, attributes):
+    now = time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())
+    return {"entity_id": entity_id, "state": state, "attributes": attributes, "last_changed": now, "last_updated": now}
+
+
+def default_states():
+    states = {}
+    for eid, name in ENTITY_NAMES.items():
+        initial = "closed" if eid.startswith("cover.") else "scening" if eid.startswith("scene.") else "off"
+        states[eid] = _new_state(eid, initial, {"friendly_name": name.partition(" ")[2], **DEFAULT_CAPABILITIES.get(eid, {})})
+    for eid, (state, attrs) in DEFAULT_SENSORS.items():
+        states[eid] = _new_state(eid, state, dict(attrs))
+    return states
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    stub = None  # alt sınıfta sahte sunucu nesnesi
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, code, body):
+        data = json.dumps(body, ensure_ascii=False).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _inject(self):
+        """Ayarlı gecikmeyi uygular; hata enjekte edildiyse 500 döner ve False verir."""
+        if self.stub.latency: time.sleep(self.stub.latency)
+        if self.stub.failure_rate and random.random() < self.stub.failure_rate:
+            self._reply(500, {"message": "Enjekte edilmiş hata"})
+            return False
+        return True
+
+
+class _StubServer:
+    def __init__(self, handler, host, port, latency, failure_rate):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self._http = ThreadingHTTPServer((host, port), type("Handler", (handler,), {"stub": self}))
+        self.base_url = f"http://{host}:{self._http.server_port}"
+
+    def start(self):
+        threading.Thread(target=self._http.serve_forever, name=f"{type(self).__name__}-http", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._http.shutdown()
+
+
+class FakeHomeAssistant:
+    """Bellekte durum tutan, servis çağrılarını uygulayıp WebSocket'e yayınlayan sahte HA."""
+
+    def __init__(self, token="test-token", states=None, areas=None, latency=0.0, failure_rate=0.0, host="127.0.0.1", port=0, ws_port=0):
+        self.token = token
+        self.states = states or default_states()
+        self.areas = DEFAULT_AREAS if areas is None else areas  # alan adı -> [entity_id]
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.calls = []  # (domain, service, payload)
+        self._clients = set()
+        self._lock = threading.Lock()
+        self._http = ThreadingHTTPServer((host, port), self._handler())
+        self._ws = ws_serve(self._ws_handler, host, ws_port)
+        self.base_url = f"http://{host}:{self._http.server_port}"
+        self.ws_url = f"ws://{host}:{self._ws.socket.getsockname()[1]}/api/websocket"
+
+    def start(self):
+        threading.Thread(target=self._http.serve_forever, name="fake-ha-http", daemon=True).start()
+        threading.Thread(target=self._ws.serve_forever, name="fake-ha-ws", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._http.shutdown()
+        self._ws.shutdown()
+
+    def set_state(self, entity_id, state, **attributes):
+        """Dışarıdan (ör. fiziksel anahtar) gelen bir değişikliği taklit eder."""
+        with self._lock:
+            old = self.states.get(entity_id)
+            attrs = {**(old or {}).get("attributes", {}), **attributes}
+            new = _new_state(entity_id, state, attrs)
+            self.states[entity_id] = new
+        self._broadcast({"event_type": "state_changed", "data": {"entity_id": entity_id, "old_state": old, "new_state": new}})
+        return new
+
+    def call_service(self, domain, service, payload):
+        self.calls.append((domain, service, payload))
+        ids = payload.get("entity_id", [])
+        ids = [ids] if isinstance(ids, str) else ids
+        attrs = {k: v for k, v in payload.items() if k != "entity_id"}
+        changed = []
+        for eid in ids:
+            if service in ["turn_on", "open_cover"]: state = "open" if domain == "cover" else "on"
+            elif service in ["turn_off", "close_cover"]: state = "closed" if domain == "cover" else "off"
+            else: state = self.states.get(eid, {}).get("state", "unknown")
+            changed.append(self.set_state(eid, state, **attrs))
+        return changed
+
+    # --- REST ---
+    def _handler(self):
+        ha = self
+
+        class Handler(_StubHandler):
+            stub = ha
+
+            def _guard(self):
+                if self.headers.get("Authorization") != f"Bearer {ha.token}":
+                    self._reply(401, {"message": "Yetkisiz"})
+                    return False
+                return self._inject()
+
+            def do_GET(self):
+                if not self._guard(): return
+                if self.path == "/api/states": return self._reply(200, list(ha.states.values()))
+                if self.path.startswith("/api/states/"):
+                    state = ha.states.get(self.path.rsplit("/", 1)[1])
+                    return self._reply(200, state) if state else self._reply(404, {"message": "Entity bulunamadı"})
+                self._reply(404, {"message": "Bulunamadı"})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if not self._guard(): return
+                parts = self.path.strip("/").split("/")
+                if len(parts) == 4 and parts[:2] == ["api", "services"]:
+                    return self._reply(200, ha.call_service(parts[2], parts[3], body))
+                self._reply(404, {"message": "Bulunamadı"})
+
+        return Handler
+
+    # --- WebSocket ---
+    def _ws_handler(self, ws):
+        ws.send(json.dumps({"type": "auth_required", "ha_version": "stub"}))
+        auth = json.loads(ws.recv())
+        if auth.get("access_token") != self.token:
+            ws.send(json.dumps({"type": "auth_invalid", "message": "Geçersiz token"}))
+            return
+        ws.send(json.dumps({"type": "auth_ok", "ha_version": "stub"}))
+        for raw in ws:
+            msg = json.loads(raw)
+            if msg.get("type") == "subscribe_events":
+                with self._lock: self._clients.add((ws, msg["id"]))
+            ws.send(json.dumps({"id": msg.get("id"), "type": "result", "success": True, "result": self._registry(msg.get("type"))},
+                               ensure_ascii=False))
+
+    def _registry(self, kind):
+        """`config/*_registry/list` yanıtları; alanlar doğrudan entity'lere atanır (cihaz kaydı boş)."""
+        if kind == "config/area_registry/list":
+            return [{"area_id": f"area_{i}", "name": name} for i, name in enumerate(self.areas)]
+        if kind == "config/device_registry/list": return []
+        if kind == "config/entity_registry/list":
+            area_ids = {eid: f"area_{i}" for i, ids in enumerate(self.areas.values()) for eid in ids}
+            return [{"entity_id": eid, "area_id": area_ids.get(eid), "device_id": None} for eid in self.states]
+        return None
+
+    def _broadcast(self, event):
+        with self._lock: clients = list(self._clients)
+        for ws, sub_id in clients:
+            try:
+                ws.send(json.dumps({"id": sub_id, "type": "event", "event": event}))
+            except Exception:
+                with self._lock: self._clients.discard((ws, sub_id))
+
+
+_matcher = None
+
+
+def default_responder(messages):
+    """Son kullanıcı mesajını yerel eşleştiriciyle planlar; eşleşmezse boş plan döner."""
+    global _matcher
+    if _matcher is None:
+        from intent import IntentMatcher
+        _matcher = IntentMatcher()
+    text = next((m["content"] for m in reversed(messages) if m.get("role") == "user"), "")
+    plan = _matcher.match(text).plan
+    return plan or {"actions": [], "response": "Anlaşıldı, bunu şu an yapamıyorum."}
+
+
+def noisy(content):
+    """Modellerin sık yaptığı biçim hataları: önde açıklama, çit ve sondaki virgül."""
+    if content.endswith("}"): content = content[:-1].rstrip() + ",}"
+    return f"Tabii, işte plan:\n```\n{content}\n```\nBaşka bir isteğin olursa söyle."
+
+
+class _LLMHandler(_StubHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        self.stub.requests += 1
+        if not self.path.endswith("/chat/completions"): return self._reply(404, {"error": {"message": "Bulunamadı"}})
+        if not self._inject(): return
+        llm = self.stub
+        content = llm.responder(body.get("messages", []))
+        if not isinstance(content, str): content = json.dumps(content, ensure_ascii=False)
+        if llm.noise_rate and random.random() < llm.noise_rate: content = noisy(content)
+        prompt_tokens = sum(len(m.get("content") or "") for m in body.get("messages", [])) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(content) // 4,
+                 "total_tokens": prompt_tokens + len(content) // 4, "prompt_tokens_details": {"cached_tokens": 0}}
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": body.get("model", "stub")}
+        if not body.get("stream"):
+            message = {"role": "assistant", "content": content}
+            return self._reply(200, {**base, "object": "chat.completion", "usage": usage,
+                                     "choices": [{"index": 0, "message": message, "finish_reason": "stop"}]})
+
+        # SSE: içerik `chunk_size` karakterlik parçalarla, parçalar arası `token_delay` beklemeyle akar
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        def emit(payload):
+            self.wfile.write(f"data: {payload}\n\n".encode())
+            self.wfile.flush()
+
+        chunk = {**base, "object": "chat.completion.chunk"}
+        for i in range(0, len(content), llm.chunk_size):
+            if i and llm.token_delay: time.sleep(llm.token_delay)
+            delta = {"content": content[i:i + llm.chunk_size]}
+            emit(json.dumps({**chunk, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}, ensure_ascii=False))
+        emit(json.dumps({**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}))
+        if (body.get("stream_options") or {}).get("include_usage"): emit(json.dumps({**chunk, "choices": [], "usage": usage}))
+        emit("[DONE]")
+
+
+class FakeLLM(_StubServer):
+    """OpenAI uyumlu sohbet tamamlama ucu; planı `responder(messages)` üretir (dict ya da ham metin).
+
+    `latency` ilk bayta kadarki süre, `token_delay` akıştaki parçalar arası süredir.
+    `noise_rate` oranındaki yanıtlar açıklama metni, çit ve sondaki virgülle bozulur.
+    """
+
+    def __init__(self, responder=None, latency=0.0, token_delay=0.0, chunk_size=16, failure_rate=0.0, noise_rate=0.0,
+                 host="127.0.0.1", port=0):
+        super().__init__(_LLMHandler, host, port, latency, failure_rate)
+        self.responder = responder or default_responder
+        self.noise_rate = noise_rate
+        self.token_delay = token_delay
+        self.chunk_size = chunk_size
+        self.base_url += "/v1"
+
+
+class _WeatherHandler(_StubHandler):
+    def do_GET(self):
+        self.stub.requests += 1
+        if not self.path.startswith("/data/2.5/weather"): return self._reply(404, {"cod": 404, "message": "Bulunamadı"})
+        if not self._inject(): return
+        w = self.stub
+        self._reply(200, {"main": {"temp": w.temp, "humidity": w.humidity}, "weather": [{"description": w.description}],
+                          "wind": {"speed": w.wind}, "name": "Ankara", "cod": 200})
+
+
+class FakeWeather(_StubServer):
+    """OpenWeatherMap `/data/2.5/weather` ucunu sabit değerlerle taklit eder."""
+
+    def __init__(self, temp=18.0, description="parçalı bulutlu", humidity=55, wind=8.0, latency=0.0, failure_rate=0.0, host="127.0.0.1", port=0):
+        super().__init__(_WeatherHandler, host, port, latency, failure_rate)
+        self.temp, self.description, self.humidity, self.wind = temp, description, humidity, wind
+        self.url = f"{self.base_url}/data/2.5/weather"
+
+
+if __name__ == "__main__":
+    ha = FakeHomeAssistant(port=8123, ws_port=8124).start()
+    llm = FakeLLM(port=8125).start()
+    weather = FakeWeather(port=8126).start()
+    print(f"HA_URL={ha.base_url}\nHA_TOKEN={ha.token}\nHA_WS_URL={ha.ws_url}")
+    print(f"GROK_BASE_URL={llm.base_url}\nOPENWEATHER_URL={weather.url}")
+    threading.Event().wait()
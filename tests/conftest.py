@@ -0,0 +1,29 @@
+import time
+
+import pytest
+
+from ha_state import StateMirror
+from stub_servers import FakeHomeAssistant
+
+
+def wait_for(predicate, timeout=3.0, interval=0.01):
+    """predicate doğru olana kadar bekler; süre dolarsa son değeri döner."""
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline: time.sleep(interval)
+    return predicate()
+
+
+@pytest.fixture
+def ha():
+    server = FakeHomeAssistant().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def mirror(ha):
+    """WebSocket aboneliği kurulmuş ve ilk toplu okuması bitmiş durum aynası."""
+    mirror = StateMirror(ha.base_url, ha.token, ws_url=ha.ws_url, reconnect_delay=0.1).start()
+    assert wait_for(lambda: mirror.is_fresh("binary_sensor.hareket_salon"))
+    yield mirror
+    mirror.stop()
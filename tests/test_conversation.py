@@ -0,0 +1,39 @@
+from conversation import Conversation
+
+
+def chat(conversation, count):
+    for i in range(count):
+        conversation.add_user(f"istek {i}")
+        conversation.add_assistant(f"yanıt {i}", plan={"actions": [{"entity_id": "light.salon_isigi", "state": "on" if i % 2 else "off"}]})
+
+
+def test_window_pages_to_disk(tmp_path):
+    path = str(tmp_path / "ayse.jsonl")
+    conversation = Conversation(path=path, window=4)
+    chat(conversation, 5)
+    assert len(conversation) == 10 and len(conversation.turns) == 4 and conversation.paged == 6
+    assert [t.content for t in conversation.recent(6)] == ["istek 2", "yanıt 2", "istek 3", "yanıt 3", "istek 4", "yanıt 4"]
+
+
+def test_model_history_folds_older_turns():
+    conversation = Conversation(window=40)
+    chat(conversation, 3)
+    conversation.add_notice("Hoş geldiniz")  # modele gitmez
+    history = conversation.model_history(max_turns=2)
+    assert history[0]["role"] == "system"
+    assert "light.salon_isigi=on" in history[0]["content"] and "'istek 1'" in history[0]["content"]
+    assert history[1:] == [{"role": "user", "content": "istek 2"},
+                           {"role": "assistant", "content": '{"actions":[{"entity_id":"light.salon_isigi","state":"off"}]}'}]
+
+
+def test_flush_and_restore(tmp_path):
+    path = str(tmp_path / "ayse.jsonl")
+    conversation = Conversation(path=path, window=40)
+    chat(conversation, 2)
+    conversation.flush()
+    restored = Conversation(path=path, window=40)
+    assert len(restored) == 4 and not restored.turns
+    assert [t.content for t in restored.recent(2)] == ["istek 1", "yanıt 1"]
+    assert "light.salon_isigi=on" in restored.model_history()[0]["content"]
+    restored.clear()
+    assert len(Conversation(path=path)) == 0
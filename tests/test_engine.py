@@ -0,0 +1,78 @@
+import os
+import threading
+
+import pytest
+
+from engine import CommandEngine
+
+
+class Result:
+    def __init__(self, text):
+        self.data = {"actions": [], "response": f"yanıt: {text}"}
+        self.raw = None
+
+    def markdown(self):
+        return self.data["response"]
+
+
+class Pipeline:
+    """Gelen geçmişi kaydeden, ağa çıkmayan hat."""
+
+    def __init__(self, seen, gate=None):
+        self.seen, self.gate = seen, gate
+
+    def run(self, text, user_name, history, on_text=None):
+        if self.gate is not None: self.gate.wait(2)
+        self.seen.append((text, history))
+        return Result(text)
+
+
+@pytest.fixture
+def seen():
+    return []
+
+
+def make_engine(seen, **options):
+    return CommandEngine(lambda: Pipeline(seen), workers=2, **options).start()
+
+
+def test_history_is_passed_in_order(seen):
+    engine = make_engine(seen)
+    engine.run_command("salon ışığını aç", user_id="ayse", timeout=2)
+    engine.run_command("kapat", user_id="ayse", timeout=2)
+    assert seen[1][1] == [{"role": "user", "content": "salon ışığını aç"},
+                          {"role": "assistant", "content": '{"response":"yanıt: salon ışığını aç"}'}]
+    assert len(engine.lookup("ayse").conversation) == 4
+    assert engine.stats()["processed"] == 2
+
+
+def test_eviction_keeps_history(tmp_path, seen):
+    engine = make_engine(seen, max_users=1, conversation_dir=str(tmp_path))
+    engine.run_command("salon ışığını aç", user_id="ayse", timeout=2)
+    engine.run_command("klimayı aç", user_id="mehmet", timeout=2)  # ayse bellekten atılır
+    assert engine.lookup("ayse") is None
+    engine.run_command("kapat", user_id="ayse", timeout=2)
+    history = seen[-1][1]
+    assert history[0]["role"] == "system" and "salon ışığını aç" in history[0]["content"]
+    conversation = engine.lookup("ayse").conversation
+    assert len(conversation) == 4
+    assert [t.content for t in conversation.recent(4)][:2] == ["salon ışığını aç", "yanıt: salon ışığını aç"]
+
+
+def test_stale_pages_removed_at_start(tmp_path, seen):
+    (tmp_path / "ayse.jsonl").write_text('{"role": "user", "content": "eski süreç"}\n', encoding="utf-8")
+    engine = make_engine(seen, conversation_dir=str(tmp_path))
+    assert not os.path.exists(tmp_path / "ayse.jsonl")
+    engine.run_command("merhaba", user_id="ayse", timeout=2)
+    assert seen[0][1] == []
+
+
+def test_same_user_commands_run_in_order(seen):
+    gate = threading.Event()
+    engine = CommandEngine(lambda: Pipeline(seen, gate), workers=4).start()
+    threads = [threading.Thread(target=engine.run_command, args=(f"komut {i}",), kwargs={"user_id": "ayse", "timeout": 3})
+               for i in range(3)]
+    for t in threads: t.start()
+    gate.set()
+    for t in threads: t.join()
+    assert [len(history) for _, history in seen] == [0, 2, 4]
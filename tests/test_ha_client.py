@@ -0,0 +1,69 @@
+import time
+
+import pytest
+
+from ha_client import HADispatcher, service_call
+
+
+@pytest.mark.parametrize("action, expected", [
+    ({"entity_id": "light.salon_isigi", "state": "on", "brightness_pct": 40}, ("light", "turn_on", {"brightness_pct": 40})),
+    ({"entity_id": "cover.perde_salon", "state": "open"}, ("cover", "open_cover", {})),
+    ({"entity_id": "cover.perde_salon", "position": 30}, ("cover", "set_cover_position", {"position": 30})),
+    ({"entity_id": "climate.klima", "state": "on", "temperature": 22, "mode": "cool"},
+     ("climate", "set_temperature", {"temperature": 22, "hvac_mode": "cool"})),
+    ({"entity_id": "media_player.tv_salon", "volume_level": 0.3}, ("media_player", "volume_set", {"volume_level": 0.3})),
+    ({"entity_id": "scene.film_gecesi", "state": "on"}, ("scene", "turn_on", {})),
+])
+def test_service_call(action, expected):
+    call = service_call(action)
+    assert (call.domain, call.service, call.data) == expected
+    assert call.entity_ids == [action["entity_id"]] and call.actions == [action]
+
+
+def test_simulates_without_token():
+    results = HADispatcher(None, None).dispatch([{"entity_id": "light.salon_isigi", "state": "on"}])
+    assert results[0].simulated and results[0].outcome == "simulated"
+
+
+def test_dispatch(ha):
+    dispatcher = HADispatcher(ha.base_url, ha.token)
+    results = dispatcher.dispatch([{"entity_id": "light.salon_isigi", "state": "on"}, {"entity_id": "switch.kahve_makinesi", "state": "off"}])
+    assert [r.outcome for r in results] == ["ok", "ok"]
+    assert sorted(ha.calls) == [("light", "turn_on", {"entity_id": "light.salon_isigi"}),
+                                ("switch", "turn_off", {"entity_id": "switch.kahve_makinesi"})]
+
+
+def test_batch_keeps_order_for_same_entity(ha):
+    batch = HADispatcher(ha.base_url, ha.token).batch()
+    batch.add({"entity_id": "light.salon_isigi", "state": "on"})
+    batch.add({"entity_id": "light.salon_isigi", "state": "off"})
+    assert [r.ok for r in batch.results(2.0)] == [True, True]
+    assert [service for _, service, _ in ha.calls] == ["turn_on", "turn_off"]
+
+
+def test_nothing_is_posted_after_results(ha):
+    ha.latency = 0.3
+    batch = HADispatcher(ha.base_url, ha.token, retries=0).batch()
+    batch.add({"entity_id": "light.salon_isigi", "state": "on"})
+    batch.add({"entity_id": "light.salon_isigi", "state": "off"})  # öncekini bekler
+    first, second = batch.results(0.1)
+    assert first.outcome == "sent" and "iletildi" in first.message
+    assert second.outcome == "timeout" and not second.ok
+    time.sleep(0.8)
+    assert [service for _, service, _ in ha.calls] == ["turn_on"]  # zaman aşımı bildirilen istek sonradan gitmedi
+
+
+def test_no_retry_after_results(ha):
+    ha.latency, ha.failure_rate = 0.2, 1.0
+    batch = HADispatcher(ha.base_url, ha.token, retries=3).batch()
+    batch.add({"entity_id": "light.salon_isigi", "state": "on"})
+    assert batch.results(0.1)[0].outcome == "sent"
+    time.sleep(0.2)  # ilk deneme sunucuda hata aldı
+    ha.failure_rate = 0.0  # yeniden deneme gönderilseydi başarılı olurdu
+    time.sleep(1.0)
+    assert ha.calls == []
+
+
+def test_skips_noop_on_fresh_mirror(ha, mirror):
+    results = HADispatcher(ha.base_url, ha.token, state_mirror=mirror).dispatch([{"entity_id": "light.salon_isigi", "state": "off"}])
+    assert results[0].outcome == "skipped" and ha.calls == []
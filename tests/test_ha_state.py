@@ -0,0 +1,31 @@
+from conftest import wait_for
+from ha_state import StateMirror
+
+
+def test_follows_events(ha, mirror):
+    ha.set_state("light.salon_isigi", "on", brightness=120)
+    assert wait_for(lambda: mirror.state("light.salon_isigi") == "on")
+    assert mirror.is_noop({"entity_id": "light.salon_isigi", "state": "on"})
+    assert not mirror.is_noop({"entity_id": "light.salon_isigi", "state": "off"})
+    assert not mirror.is_noop({"entity_id": "light.salon_isigi", "state": "on", "brightness_pct": 50})
+
+
+def test_not_noop_without_live_subscription(ha):
+    mirror = StateMirror(ha.base_url, ha.token, ws_url=ha.ws_url)
+    mirror.bootstrap()
+    assert mirror.state("light.salon_isigi") == "off"
+    assert not mirror.is_fresh("light.salon_isigi")
+    assert not mirror.is_noop({"entity_id": "light.salon_isigi", "state": "off"})  # ayna eskimiş olabilir
+
+
+def test_bootstrap_reports_only_differences(ha):
+    mirror = StateMirror(ha.base_url, ha.token, ws_url=ha.ws_url)
+    events = []
+    mirror.add_listener(lambda eid, old, new: events.append((eid, old and old["state"], new and new["state"])))
+    mirror.bootstrap()
+    assert events and all(old is None for _, old, _ in events)  # ilk okuma
+    events.clear()
+    ha.set_state("light.salon_isigi", "on")
+    del ha.states["switch.kahve_makinesi"]
+    mirror.bootstrap()
+    assert events == [("light.salon_isigi", "off", "on"), ("switch.kahve_makinesi", "off", None)]
@@ -0,0 +1,60 @@
+import pytest
+
+from intent import IntentMatcher
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    return IntentMatcher()
+
+
+@pytest.mark.parametrize("text", [
+    "Salon ışığını kapatma", "Klimayı açma", "Klimayı açmayın", "Perdeyi açmasın",
+    "Işıkları kapatmayalım", "Kahve makinesini çalıştırma",
+])
+def test_negation_goes_to_llm(matcher, text):
+    result = matcher.match(text)
+    assert result.plan is None and result.path == "llm"
+    assert result.reason == "olumsuz ifade"
+
+
+def test_simple_command(matcher):
+    result = matcher.match("Salon ışığını kapat", "Ali")
+    assert result.path == "local"
+    assert result.plan["actions"] == [{"entity_id": "light.salon_isigi", "state": "off"}]
+    assert result.plan["response"].startswith("Tamamdır Ali!")
+
+
+def test_mode_word_is_not_negation(matcher):
+    result = matcher.match("Klimayı ısıtma moduna al")
+    assert result.plan["actions"] == [{"entity_id": "climate.klima", "state": "on", "mode": "heat"}]
+
+
+def test_temperature(matcher):
+    assert matcher.match("Klimayı 22 derece yap").plan["actions"][0]["temperature"] == 22
+    result = matcher.match("Klimayı 45 derece yap")
+    assert result.plan is None and "aralığında" in result.reason
+
+
+def test_delay_is_future_tense(matcher):
+    plan = matcher.match("30 dakika sonra salon ışığını kapat").plan
+    assert plan["actions"] == []
+    assert plan["timers"] == [{"entity_id": "light.salon_isigi", "state": "off", "delay_seconds": 1800}]
+    assert "30 dakika sonra kapatılacak" in plan["response"]
+
+
+def test_compound_delay_sums_terms(matcher):
+    plan = matcher.match("salon ışığını 1 saat 30 dakika sonra kapat").plan
+    assert plan["timers"] == [{"entity_id": "light.salon_isigi", "state": "off", "delay_seconds": 5400}]
+    assert "1 saat 30 dakika sonra kapatılacak" in plan["response"]
+
+
+def test_zero_percent_turns_light_off(matcher):
+    plan = matcher.match("Salon ışığını %0 yap").plan
+    assert plan["actions"] == [{"entity_id": "light.salon_isigi", "state": "off"}]
+    assert "kapatıldı" in plan["response"]
+
+
+@pytest.mark.parametrize("text", ["Eğer hava soğuksa klimayı aç", "Her sabah 8'de kahveyi hazırla"])
+def test_conditional_goes_to_llm(matcher, text):
+    assert matcher.match(text).path == "llm"
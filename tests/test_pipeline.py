@@ -0,0 +1,32 @@
+import pytest
+
+from ha_client import HADispatcher
+from intent import IntentMatcher
+from pipeline import CommandPipeline
+from planner import Debouncer
+from weather import WeatherCache
+
+
+@pytest.fixture
+def pipeline(ha):
+    return CommandPipeline(None, WeatherCache(None), HADispatcher(ha.base_url, ha.token), intent_matcher=IntentMatcher(),
+                           debouncer=Debouncer(window=60))
+
+
+def test_local_command(ha, pipeline):
+    result = pipeline.run("Salon ışığını aç", "Ayşe")
+    assert result.path == "local" and result.errors == 0
+    assert result.data["actions"] == [{"entity_id": "light.salon_isigi", "state": "on"}]
+    assert ha.calls == [("light", "turn_on", {"entity_id": "light.salon_isigi"})]
+    assert "dispatch" in result.timings and "Ayşe" in result.reply
+
+
+def test_repeat_is_debounced_but_retry_after_error_is_not(ha, pipeline):
+    pipeline.run("Salon ışığını aç")
+    assert "az önce gönderildi" in pipeline.run("Salon ışığını aç").markdown()
+    assert len(ha.calls) == 1
+    ha.failure_rate = 1.0
+    assert pipeline.run("Kahve makinesini kapat").errors == 1
+    ha.failure_rate = 0.0
+    assert pipeline.run("Kahve makinesini kapat").errors == 0  # hatadan sonra yeniden deneme düşürülmez
+    assert ha.calls[-1] == ("switch", "turn_off", {"entity_id": "switch.kahve_makinesi"})
@@ -0,0 +1,45 @@
+import json
+
+from plan_cache import PlanCache
+from weather import WeatherReading
+
+WEATHER = WeatherReading(12.0, "açık", 40, 5.0)
+PLAN = {"actions": [{"entity_id": "light.salon_isigi", "state": "on"}], "response": "Tamam"}
+
+
+def test_hit_returns_copy():
+    cache = PlanCache()
+    key = cache.key("Salon ışığını aç", WEATHER, "Ayşe", now=0)
+    assert cache.get(key) is None
+    plan = json.loads(json.dumps(PLAN))
+    assert cache.put(key, plan)
+    plan["actions"].clear()  # çağıranın sonradan yaptığı değişiklik önbelleğe sızmaz
+    hit = cache.get(key)
+    assert hit == PLAN
+    hit["response"] = "değişti"
+    assert cache.get(key) == PLAN
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1
+
+
+def test_key_depends_on_context():
+    cache = PlanCache()
+    assert cache.key("Salon ışığını aç", WEATHER, "Ayşe", now=0) != cache.key("Salon ışığını aç", WEATHER, "Mehmet", now=0)
+    assert cache.key("Salon ışığını aç", WEATHER, "Ayşe", now=0) != cache.key("Salon ışığını aç", WeatherReading(30.0, "güneşli", 20, 1.0), "Ayşe", now=0)
+    assert cache.key("Onu kapat", WEATHER, "Ayşe") is None  # önceki tura bağlı
+    assert not cache.put(None, PLAN)
+
+
+def test_only_executable_plans_are_stored():
+    cache = PlanCache()
+    assert not cache.put("k", {"actions": [], "response": "Merhaba"})
+    assert not cache.put("k", {"actions": PLAN["actions"], "queries": [{"entity_id": "sensor.nem_genel"}]})
+    assert cache.put("k", {"actions": PLAN["actions"], "queries": [{"entity_id": "sensor.nem_genel"}], "cache_safe": True})
+
+
+def test_lru_ttl_and_persistence(tmp_path):
+    path = str(tmp_path / "plan_cache.json")
+    cache = PlanCache(max_size=2, path=path)
+    for key in ["a", "b", "c"]: cache.put(key, PLAN)
+    assert cache.get("a") is None and cache.stats()["evictions"] == 1
+    assert PlanCache(max_size=2, path=path).get("c") == PLAN
+    assert PlanCache(ttl=-1, path=path).get("c") is None
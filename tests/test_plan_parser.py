@@ -0,0 +1,93 @@
+import json
+
+import pytest
+
+from plan_parser import PlanParseError, parse_plan, repair_json, validate_plan
+
+
+@pytest.mark.parametrize("broken, expected", [
+    ('{"actions": [{"entity_id": "light.a", "state": "on"},], }', {"actions": [{"entity_id": "light.a", "state": "on"}]}),
+    ("{'entity_id': 'light.a', 'state': 'on'}", {"entity_id": "light.a", "state": "on"}),
+    ('{"a": True, "b": False, "c": None}', {"a": True, "b": False, "c": None}),
+    ('{"a": 1 "b": 2}', {"a": 1, "b": 2}),
+    ('{"a": 1, // yorum\n "b": /* blok */ 2}', {"a": 1, "b": 2}),
+    ('{"actions": [{"entity_id": "light.a", "state": "o', {"actions": [{"entity_id": "light.a", "state": "o"}]}),
+    ('{"actions": [], "respo', {"actions": []}),
+])
+def test_repair_json(broken, expected):
+    assert json.loads(repair_json(broken)) == expected
+
+
+def test_repair_json_leaves_strings_alone():
+    text = '{"response": "Tamam, // yorum değil, True da değil",}'
+    assert json.loads(repair_json(text)) == {"response": "Tamam, // yorum değil, True da değil"}
+
+
+def test_parse_plan_status():
+    assert parse_plan('{"actions": []}').status == "ok"
+    assert parse_plan('Plan:\n```json\n{"actions": []}\n```').status == "extracted"
+    assert parse_plan('{"actions": [],}').status == "repaired"
+    with pytest.raises(PlanParseError): parse_plan("JSON yok")
+
+
+def test_validate_plan_cleans_values():
+    plan, issues = validate_plan({"actions": [
+        {"entity_id": " light.salon_isigi ", "state": "Açık", "brightness_pct": "%80"},
+        {"entity_id": "media_player.tv_salon", "volume_level": "50"},
+        {"entity_id": "climate.klima", "state": True, "temperature": "22,5"},
+        {"state": "on"},
+    ], "timers": {"entity_id": "light.salon_isigi", "state": "off", "delay_seconds": "5 dakika"}, "response": None})
+    assert plan["actions"] == [
+        {"entity_id": "light.salon_isigi", "state": "on", "brightness_pct": 80},
+        {"entity_id": "media_player.tv_salon", "volume_level": 0.5},
+        {"entity_id": "climate.klima", "state": "on", "temperature": 22.5},
+    ]
+    assert plan["timers"] == [{"entity_id": "light.salon_isigi", "state": "off", "delay_seconds": 300}]
+    assert "response" not in plan
+    assert len(issues) == 1
+
+
+def test_validate_plan_root():
+    plan, _ = validate_plan([{"entity_id": "light.a", "state": "on"}])
+    assert plan == {"actions": [{"entity_id": "light.a", "state": "on"}]}
+    with pytest.raises(PlanParseError): validate_plan("metin")
+
+
+def test_validate_plan_rules():
+    plan, issues = validate_plan({"rules": [
+        {"trigger": {"at": "8"}, "weekdays_only": "evet", "actions": {"entity_id": "switch.kahve_makinesi", "state": "on"}},
+        {"trigger": "binary_sensor.hareket_salon", "for_seconds": "10 dakika",
+         "conditions": [{"entity_id": "sensor.nem_genel", "above": "60"}, {"weather": "temp"}],
+         "actions": [{"entity_id": "light.salon_isigi", "state": "kapalı"}]},
+        {"conditions": [{"after": "23"}], "actions": []},
+    ]})
+    first, second = plan["rules"]
+    assert first["trigger"] == {"at": "08:00"} and first["weekdays_only"] is True
+    assert first["actions"] == [{"entity_id": "switch.kahve_makinesi", "state": "on"}]
+    assert second["trigger"] == {"entity_id": "binary_sensor.hareket_salon"}
+    assert second["for_seconds"] == 600
+    assert second["conditions"] == [{"entity_id": "sensor.nem_genel", "above": 60}]
+    assert second["actions"] == [{"entity_id": "light.salon_isigi", "state": "off"}]
+    assert len(issues) == 2  # karşılaştırmasız koşul + eylemsiz kural
+
+
+def test_invalid_state_drops_action():
+    plan, issues = validate_plan({"actions": [
+        {"entity_id": "light.salon_isigi", "state": ["on"]},
+        {"entity_id": "switch.kahve_makinesi", "state": {"value": "on"}},
+        {"entity_id": "light.mutfak_isigi", "state": "on"},
+    ]})
+    assert plan["actions"] == [{"entity_id": "light.mutfak_isigi", "state": "on"}]
+    assert len(issues) == 2
+
+
+@pytest.mark.parametrize("delay, seconds", [("1 saat 30 dakika", 5400), ("2 saat, 15 dakika", 8100), ("1 saat ve 5 sn", 3605), (90, 90)])
+def test_timer_durations(delay, seconds):
+    plan, issues = validate_plan({"timers": [{"entity_id": "light.salon_isigi", "state": "off", "delay_seconds": delay}]})
+    assert plan["timers"][0]["delay_seconds"] == seconds and not issues
+
+
+@pytest.mark.parametrize("delay", ["1 saat 30", "biraz sonra", "yarın"])
+def test_invalid_timer_duration_drops_timer(delay):
+    plan, issues = validate_plan({"timers": [{"entity_id": "light.salon_isigi", "state": "off", "delay_seconds": delay}]})
+    assert plan["timers"] == [] and "zamanlayıcı atlandı" in issues[0]
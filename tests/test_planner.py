@@ -0,0 +1,56 @@
+from planner import Debouncer, plan_calls
+
+
+def test_merges_same_service():
+    calls, report = plan_calls([
+        {"entity_id": "light.salon_isigi", "state": "off"},
+        {"entity_id": "light.mutfak_isigi", "state": "off"},
+        {"entity_id": "switch.kahve_makinesi", "state": "on"},
+    ])
+    assert [(order, c.domain, c.service, c.entity_ids) for order, c in calls] == [
+        (0, "light", "turn_off", ["light.salon_isigi", "light.mutfak_isigi"]),
+        (2, "switch", "turn_on", ["switch.kahve_makinesi"]),
+    ]
+    assert report.merged == 1 and report.calls == 2
+
+
+def test_duplicates_and_conflicts():
+    calls, report = plan_calls([
+        {"entity_id": "light.salon_isigi", "state": "on"},
+        {"entity_id": "light.salon_isigi", "state": "on"},
+        {"entity_id": "light.salon_isigi", "state": "off"},
+    ])
+    assert [(c.service, c.entity_ids) for _, c in calls] == [("turn_off", ["light.salon_isigi"])]
+    assert report.dropped == [("light.salon_isigi", "tekrar"), ("light.salon_isigi", "çelişki")]
+
+
+def test_keeps_order_for_same_entity():
+    calls, _ = plan_calls([
+        {"entity_id": "light.salon_isigi", "state": "on", "brightness_pct": 20},
+        {"entity_id": "light.mutfak_isigi", "state": "on", "brightness_pct": 20},
+        {"entity_id": "light.salon_isigi", "state": "on", "brightness_pct": 80},
+    ])
+    assert [(order, c.entity_ids, c.data) for order, c in calls] == [
+        (0, ["light.salon_isigi"], {"brightness_pct": 20}),
+        (1, ["light.mutfak_isigi"], {"brightness_pct": 20}),
+        (2, ["light.salon_isigi"], {"brightness_pct": 80}),
+    ]
+
+
+def test_debouncer_drops_recent_repeat():
+    debouncer = Debouncer(window=2.0)
+    action = {"entity_id": "switch.cay_makinesi", "state": "on"}
+    assert len(plan_calls([action], debouncer=debouncer, now=100.0)[0]) == 1
+    calls, report = plan_calls([action], debouncer=debouncer, now=101.0)
+    assert calls == [] and report.dropped == [("switch.cay_makinesi", "az önce gönderildi")]
+    assert len(plan_calls([action], debouncer=debouncer, now=103.0)[0]) == 1
+
+
+def test_debouncer_forgets_failed_action():
+    debouncer = Debouncer(window=2.0)
+    action = {"entity_id": "switch.cay_makinesi", "state": "on"}
+    assert debouncer.allow(action, now=100.0)
+    debouncer.forget({"entity_id": "switch.cay_makinesi", "state": "off"})  # farklı komut: kayıt kalır
+    assert not debouncer.allow(action, now=100.5)
+    debouncer.forget(action)  # gönderim başarısız oldu
+    assert debouncer.allow(action, now=101.0)
@@ -0,0 +1,40 @@
+import pytest
+
+from planner import plan_calls
+from registry import EntityRegistry
+
+
+@pytest.fixture
+def registry(ha):
+    registry = EntityRegistry(ha.base_url, ha.token, ws_url=ha.ws_url)
+    registry.sync()
+    return registry
+
+
+def test_registry_rejections(registry):
+    calls, report = plan_calls([
+        {"entity_id": "climate.klima", "state": "on", "temperature": 45},
+        {"entity_id": "sensor.sicaklik_salon", "state": "on"},
+        {"entity_id": "light.yok", "state": "on"},
+        {"entity_id": "switch.kahve_makinesi", "state": "on", "brightness_pct": 50},
+        {"entity_id": "climate.klima", "state": "on", "temperature": 22},
+    ], registry=registry)
+    assert [(c.service, c.entity_ids, c.data) for _, c in calls] == [("set_temperature", ["climate.klima"], {"temperature": 22})]
+    assert [eid for eid, _ in report.rejected] == ["climate.klima", "sensor.sicaklik_salon", "light.yok", "switch.kahve_makinesi"]
+    assert report.rejected[0][1] == "sıcaklık 16-30°C aralığında olmalı"
+
+
+def state(entity_id, name):
+    return {"entity_id": entity_id, "state": "on", "attributes": {"friendly_name": name}}
+
+
+def test_on_state_updates_incrementally(ha, registry):
+    version = registry.version
+    registry.on_state("light.salon_isigi", None, ha.states["light.salon_isigi"])
+    assert registry.version == version  # değişmeyen entity: katalog yeniden üretilmez
+    registry.on_state("light.salon_isigi", None, state("light.salon_isigi", "Tavan Lambası"))
+    assert registry.version != version and registry.names["light.salon_isigi"].endswith("Tavan Lambası")
+    registry.on_state("light.yeni_lamba", None, state("light.yeni_lamba", "Yeni Lamba"))
+    assert "light.yeni_lamba" in registry.entities
+    registry.on_state("light.yeni_lamba", None, None)
+    assert "light.yeni_lamba" not in registry.entities and "light.yeni_lamba" not in registry.names
@@ -0,0 +1,85 @@
+import time
+
+import pytest
+
+from conftest import wait_for
+from plan_parser import validate_plan
+from rules import RuleEngine
+
+
+@pytest.fixture
+def fired():
+    return []
+
+
+@pytest.fixture
+def engine(mirror, fired):
+    engine = RuleEngine(lambda rule: fired.append(rule.id) or "ok", state_mirror=mirror).start()
+    mirror.add_listener(engine.on_state)
+    return engine
+
+
+def add(engine, spec):
+    plan, issues = validate_plan({"rules": [spec]})
+    assert not issues
+    return engine.add_from_plan(plan["rules"][0])[0]
+
+
+def test_trigger_to_and_condition(ha, engine, fired):
+    rule = add(engine, {"trigger": {"entity_id": "binary_sensor.hareket_salon", "to": "on"},
+                        "conditions": [{"entity_id": "light.salon_isigi", "state": "off"}],
+                        "actions": [{"entity_id": "light.salon_isigi", "state": "on"}], "cooldown_seconds": 0})
+    ha.set_state("sensor.nem_genel", "70")  # ilgisiz entity
+    ha.set_state("binary_sensor.hareket_salon", "on")
+    assert wait_for(lambda: fired == [rule.id])
+    ha.set_state("binary_sensor.hareket_salon", "off")
+    ha.set_state("light.salon_isigi", "on")  # koşul artık yanlış
+    ha.set_state("binary_sensor.hareket_salon", "on")
+    time.sleep(0.2)
+    assert fired == [rule.id]
+    assert engine.history[0][2] == "ok"
+
+
+def test_trigger_from(ha, engine, fired):
+    rule = add(engine, {"trigger": {"entity_id": "cover.perde_salon", "from": "closed"}, "reminder": "Perde açıldı"})
+    ha.set_state("cover.perde_salon", "opening")
+    assert wait_for(lambda: fired == [rule.id])
+    ha.set_state("cover.perde_salon", "open")
+    time.sleep(0.2)
+    assert fired == [rule.id]
+
+
+def test_for_seconds(ha, engine, fired):
+    rule = add(engine, {"trigger": {"entity_id": "binary_sensor.hareket_salon", "to": "on"}, "for_seconds": 0.4,
+                        "actions": [{"entity_id": "light.salon_isigi", "state": "off"}]})
+    ha.set_state("binary_sensor.hareket_salon", "on")
+    time.sleep(0.1)
+    ha.set_state("binary_sensor.hareket_salon", "off")  # süre dolmadan koşul bozuldu
+    time.sleep(0.5)
+    assert fired == []
+    ha.set_state("binary_sensor.hareket_salon", "on")
+    time.sleep(0.2)
+    assert fired == []
+    assert wait_for(lambda: fired == [rule.id])
+
+
+def test_condition_edge_and_once(ha, engine, fired):
+    rule = add(engine, {"conditions": [{"entity_id": "sensor.sicaklik_salon", "above": 26}],
+                        "actions": [{"entity_id": "climate.klima", "state": "on", "mode": "cool"}], "once": True})
+    assert not engine.is_active(rule.id)
+    ha.set_state("sensor.sicaklik_salon", "27")
+    assert wait_for(lambda: fired == [rule.id])
+    assert wait_for(lambda: len(engine) == 0)  # tek seferlik kural çalışınca silinir
+
+
+def test_condition_fires_once_per_edge(ha, engine, fired):
+    rule = add(engine, {"conditions": [{"entity_id": "sensor.nem_genel", "above": 60}], "reminder": "Nem yüksek",
+                        "cooldown_seconds": 0})
+    ha.set_state("sensor.nem_genel", "65")
+    assert wait_for(lambda: fired == [rule.id])
+    ha.set_state("sensor.nem_genel", "70")  # hâlâ doğru: yeniden çalışmaz
+    time.sleep(0.2)
+    assert fired == [rule.id] and engine.is_active(rule.id)
+    ha.set_state("sensor.nem_genel", "50")
+    ha.set_state("sensor.nem_genel", "66")
+    assert wait_for(lambda: fired == [rule.id, rule.id])
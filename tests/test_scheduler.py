@@ -0,0 +1,81 @@
+import json
+import threading
+import time
+
+import pytest
+
+from conftest import wait_for
+from scheduler import Timer, TimerScheduler, timer_from_plan
+
+
+def stored(path):
+    with open(path, encoding="utf-8") as f: return json.load(f)
+
+
+def test_timer_from_plan():
+    timer = timer_from_plan({"entity_id": "light.salon_isigi", "state": "off", "delay_seconds": 30}, now=1000.0)
+    assert timer.due == 1030.0 and timer.action == {"state": "off"} and timer.repeat is None
+    repeating = timer_from_plan({"entity_id": "switch.cay_makinesi", "delay_seconds": 5, "repeat": "interval", "interval_seconds": 60}, now=0.0)
+    assert repeating.repeat == "interval" and repeating.period() == 60
+    with pytest.raises(ValueError): timer_from_plan({"entity_id": "light.a", "delay_seconds": "1 saat 30 dakika"})
+
+
+def test_one_shot_fires_and_is_removed(tmp_path):
+    path = str(tmp_path / "timers.json")
+    fired = []
+    scheduler = TimerScheduler(lambda t: fired.append(t.id) or "ok", path=path).start()
+    timer = scheduler.schedule(Timer(due=time.time() + 0.05, entity_id="light.salon_isigi"))
+    assert wait_for(lambda: fired == [timer.id])
+    assert wait_for(lambda: len(scheduler) == 0 and stored(path) == [])
+    assert scheduler.history[0][2] == "ok"
+
+
+def test_cancel_while_firing(tmp_path):
+    path = str(tmp_path / "timers.json")
+    started, release = threading.Event(), threading.Event()
+
+    def callback(timer):
+        started.set()
+        release.wait(2)
+        return "ok"
+
+    scheduler = TimerScheduler(callback, path=path).start()
+    timer = scheduler.schedule(Timer(due=time.time(), repeat="interval", interval=60, entity_id="switch.cay_makinesi"))
+    assert started.wait(2)
+    assert [t.id for t in scheduler.pending()] == [timer.id]  # çalışırken de listede ve dosyada
+    assert [t["id"] for t in stored(path)] == [timer.id]
+    assert scheduler.cancel(timer.id)
+    release.set()
+    time.sleep(0.1)
+    assert len(scheduler) == 0 and scheduler.fired == 1
+
+
+def test_repeat_advances_by_whole_periods():
+    fired = []
+    scheduler = TimerScheduler(lambda t: fired.append(t) or "ok").start()
+    due = time.time() - 3.5 * 86400  # süreç 3,5 gün kapalı kaldı
+    timer = scheduler.schedule(Timer(due=due, repeat="daily", reminder="Kahve"))
+    assert wait_for(lambda: fired)
+    assert wait_for(lambda: len(scheduler._heap) == 1)
+    assert timer.due == due + 4 * 86400  # aynı saatte, bir sonraki gün
+    assert fired == [timer]
+
+
+def test_count_limits_repeats():
+    fired = []
+    scheduler = TimerScheduler(lambda t: fired.append(t.id) or "ok").start()
+    scheduler.schedule(Timer(due=time.time(), repeat="interval", interval=0.05, count=3, reminder="Su iç"))
+    assert wait_for(lambda: len(fired) == 3 and len(scheduler) == 0)
+    time.sleep(0.1)
+    assert len(fired) == 3
+
+
+def test_save_error_keeps_worker_alive(tmp_path):
+    path = tmp_path / "timers.json"
+    (tmp_path / "timers.json.tmp").mkdir()  # geçici dosya yazılamaz
+    fired = []
+    scheduler = TimerScheduler(lambda t: fired.append(t.id) or "ok", path=str(path)).start()
+    first = scheduler.schedule(Timer(due=time.time(), reminder="bir"))
+    assert wait_for(lambda: fired == [first.id])
+    second = scheduler.schedule(Timer(due=time.time(), reminder="iki"))
+    assert wait_for(lambda: fired == [first.id, second.id])
@@ -0,0 +1,53 @@
+import pytest
+
+from timeseries import TimeSeriesStore
+
+DAY = 86400
+NOW = 100 * DAY
+
+
+def fill(store):
+    old = NOW - 2 * DAY  # ham saklama süresini aşmış, tek bir kovaya düşen kayıtlar
+    store.append("plan", "light.salon_isigi", "state", "on", ts=NOW - 20 * DAY)  # saklama süresini aşmış
+    store.append("state", "light.salon_isigi", "state", "on", ts=old + 10)
+    store.append("weather", "ankara", "temp", 10, ts=old + 60)
+    store.append("state", "light.salon_isigi", "state", "off", ts=old + 100)
+    store.append("weather", "ankara", "temp", 20, ts=old + 120)
+    store.append("weather", "ankara", "temp", 30, ts=NOW - 600)
+
+
+def rows(store):
+    return [(float(r["ts"]), store.series[int(r["series"])].field, store.decode(int(r["series"]), r["value"])) for r in store.range()]
+
+
+@pytest.fixture(params=["memory", "file"])
+def store(request, tmp_path):
+    path = str(tmp_path / "timeseries.bin") if request.param == "file" else None
+    return TimeSeriesStore(path, capacity=4, raw_retention=DAY, retention=10 * DAY, bucket=3600)
+
+
+def test_compact_reduces_and_drops(store):
+    fill(store)
+    assert len(store) == 6
+    assert store.compact(NOW) == 3
+    assert sorted(rows(store)) == [(NOW - 2 * DAY, "state", "off"), (NOW - 2 * DAY, "temp", 15.0), (NOW - 600, "temp", 30.0)]
+    assert store.compact(NOW) == 0  # zaten indirgenmiş
+
+
+def test_compact_keeps_recent(store):
+    store.append("weather", "ankara", "temp", 5, ts=NOW - 7200)
+    store.append("weather", "ankara", "temp", 7, ts=NOW - 7100)
+    assert store.compact(NOW) == 0
+    assert len(store) == 2
+
+
+def test_compacted_file_reopens(tmp_path):
+    path = str(tmp_path / "timeseries.bin")
+    store = TimeSeriesStore(path, capacity=4, raw_retention=DAY, retention=10 * DAY)
+    fill(store)
+    store.compact(NOW)
+    store.flush()
+    reopened = TimeSeriesStore(path, raw_retention=DAY, retention=10 * DAY)
+    assert rows(reopened) == rows(store)
+    reopened.append("weather", "ankara", "temp", 31, ts=NOW)
+    assert len(reopened) == 4
@@ -0,0 +1,72 @@
+import io
+import wave
+
+import numpy as np
+import pytest
+
+import voice
+from voice import VoicePipeline, decode_wav, resample, trim_silence
+
+
+def wav_bytes(samples, rate=44100, channels=1):
+    pcm = (np.repeat(samples, channels) * 32767).astype("<i2").tobytes()
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def speech(rate=44100, before=1.0, tone=0.5, after=1.0):
+    t = np.arange(int(tone * rate)) / rate
+    return np.concatenate([np.zeros(int(before * rate)), 0.5 * np.sin(2 * np.pi * 440 * t), np.zeros(int(after * rate))]).astype(np.float32)
+
+
+class Recognizer:
+    name = "test"
+    calls = []
+
+    def __init__(self, **_):
+        pass
+
+    def recognize(self, pcm, rate):
+        self.calls.append((len(pcm), rate))
+        return "salon ışığını aç"
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    Recognizer.calls = []
+    monkeypatch.setitem(voice.BACKENDS, "test", Recognizer)
+    return Recognizer
+
+
+def test_decode_stereo():
+    samples, rate = decode_wav(wav_bytes(speech(), channels=2))
+    assert rate == 44100 and len(samples) == int(2.5 * 44100)
+    assert abs(float(np.max(samples)) - 0.5) < 0.01
+
+
+def test_trim_and_resample():
+    trimmed = trim_silence(speech(), 44100)
+    assert 0.5 <= len(trimmed) / 44100 <= 0.9  # konuşma + iki yanda en çok 150 ms
+    assert len(resample(trimmed, 44100)) == round(len(trimmed) * 16000 / 44100)
+    assert len(trim_silence(np.zeros(44100, dtype=np.float32), 44100)) == 0
+
+
+def test_transcribe(backend):
+    result = VoicePipeline(names=("yok", "test")).transcribe(wav_bytes(speech()))
+    assert (result.status, result.backend, result.text) == ("ok", "test", "salon ışığını aç")
+    assert result.duration == pytest.approx(2.5) and result.speech < 1.0
+    pcm_bytes, rate = backend.calls[0]
+    assert rate == 16000 and pcm_bytes == 2 * round(result.speech * 16000)
+    assert set(result.timings) == {"decode", "vad", "resample", "recognize"}
+
+
+def test_transcribe_bad_input(backend):
+    pipeline = VoicePipeline(names=("test",))
+    assert pipeline.transcribe(b"RIFF bozuk").status == "bad_audio"
+    assert pipeline.transcribe(wav_bytes(np.zeros(16000, dtype=np.float32))).status == "no_speech"
+    assert backend.calls == []
@@ -0,0 +1,63 @@
+import pytest
+
+from weather import SIMULATED_READING, WeatherCache
+
+PAYLOAD = {"main": {"temp": 14.5, "humidity": 60}, "weather": [{"description": "hafif yağmur"}], "wind": {"speed": 3.2}}
+
+
+class Response:
+    def __init__(self, data):
+        self.data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.data
+
+
+class Session:
+    """requests.Session yerine geçer; her get() sıradaki yanıtı döner."""
+
+    def __init__(self, *payloads):
+        self.payloads = list(payloads)
+        self.requests = []
+
+    def get(self, url, params=None, timeout=None):
+        self.requests.append(params)
+        return Response(self.payloads.pop(0))
+
+
+def test_get_never_blocks():
+    cache = WeatherCache("anahtar", session=Session())
+    assert cache.get() is SIMULATED_READING
+    assert cache._wakeup.is_set()  # yenileyici uyandırıldı
+    assert cache.session.requests == []
+
+
+def test_refresh_notifies_listeners():
+    session = Session(PAYLOAD)
+    cache = WeatherCache("anahtar", city="İzmir", session=session)
+    seen = []
+    cache.add_listener(seen.append)
+    reading = cache.refresh()
+    assert (reading.temp, reading.desc, reading.hum, reading.wind) == (14.5, "hafif yağmur", 60, 3.2)
+    assert seen == [reading] and cache.get() is reading
+    assert session.requests[0]["q"] == "İzmir"
+    later = []
+    cache.add_listener(later.append)  # mevcut okuma hemen iletilir
+    assert later == [reading]
+
+
+def test_stale_reading_is_served_while_refreshing():
+    cache = WeatherCache("anahtar", ttl=0, retry_after=0, session=Session(PAYLOAD))
+    reading = cache.refresh()
+    cache._wakeup.clear()
+    assert cache.get() is reading
+    assert cache._wakeup.is_set()
+
+
+def test_unexpected_response():
+    cache = WeatherCache("anahtar", session=Session({"cod": 401, "message": "Invalid API key"}), retries=0)
+    with pytest.raises(ValueError, match="Invalid API key"): cache.refresh()
+    assert cache.get() is SIMULATED_READING
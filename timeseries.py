@@ -0,0 +1,364 @@
+"""Cihaz durumları, yürütülen planlar ve hava durumu için gömülü zaman serisi deposu.
+
+- Her kayıt sabit boyutludur (16 bayt: zaman, seri, değer) ve yalnızca sona eklenir;
+  dosya numpy.memmap ile belleğe eşlenir, ekleme tek bir dizi yazımıdır.
+- Seriler (kaynak, entity, öznitelik) ve kategorik değerler ("on", "heat") küçük bir
+  sembol tablosunda (`<dosya>.json`) tamsayıya çevrilir.
+- Kayıtlar zaman sıralıdır; aralık sorguları ikili aramayla O(log n) sürer.
+- compact(): `raw_retention`dan eski kayıtlar `bucket` saniyelik kovalara indirgenir
+  (sayısal: ortalama, kategorik: kovadaki son değer), `retention`dan eskiler silinir.
+- Alışkanlık özeti ("bu saatte genelde ne olur") saat başına bir kez hesaplanır ve
+  prompt'a ham geçmiş yerine bu kısa metin girer.
+
+Dosyaya tek süreç yazar; aynı dosyayı açan ikinci bir süreç desteklenmez.
+"""
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from registry import ATTRIBUTE_LABELS
+
+logger = logging.getLogger(__name__)
+
+RECORD = np.dtype([("ts", "<f8"), ("series", "<u4"), ("value", "<f4")])
+HEADER = np.dtype([("magic", "S8"), ("count", "<u8")])
+MAGIC = b"AEVTS001"
+SKIP_STATES = ["unavailable", "unknown", ""]
+STATE_WORDS = {"on": "açık", "off": "kapalı", "open": "açık", "closed": "kapalı", "playing": "çalıyor", "idle": "boşta"}
+PLAN_WORDS = {"on": "açılıyor", "off": "kapatılıyor", "open": "açılıyor", "closed": "kapatılıyor"}
+WEATHER_LABELS = {"temp": "dış sıcaklık", "hum": "dış nem", "wind": "rüzgar"}
+
+
+@dataclass(frozen=True)
+class Series:
+    source: str  # state | plan | weather
+    entity_id: str
+    field: str
+    categorical: bool
+
+
+def _number(value):
+    if isinstance(value, bool): return None
+    try: return float(value)
+    except (TypeError, ValueError): return None
+
+
+class TimeSeriesStore:
+    def __init__(self, path=None, capacity=4096, raw_retention=7 * 86400, retention=90 * 86400, bucket=3600,
+                 habit_days=28, min_days=3, names=None, maintenance_interval=300):
+        self.path = path  # None: yalnızca bellekte (ölçüm ve deneme için)
+        self.raw_retention = raw_retention
+        self.retention = retention
+        self.bucket = bucket
+        self.habit_days = habit_days
+        self.min_days = min_days  # özete girmek için gereken en az gün
+        self.names = names if names is not None else {}
+        self.maintenance_interval = maintenance_interval
+        self.series = []  # seri kimliği -> Series
+        self.values = []  # kategorik kod -> metin
+        self._series_ids = {}
+        self._value_codes = {}
+        self._categorical = np.zeros(0, dtype=bool)
+        self._count = 0
+        self._last_ts = 0.0
+        self._header = None
+        self._records = None
+        self._habits = (None, "")  # (saat başlangıcı, özet)
+        self._lock = threading.RLock()
+        self._thread = None
+        self._open(capacity)
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def nbytes(self):
+        return HEADER.itemsize + self._count * RECORD.itemsize
+
+    # --- dosya ---
+    def _open(self, capacity):
+        if not self.path:
+            self._records = np.zeros(capacity, dtype=RECORD)
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._load_symbols()
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= HEADER.itemsize:
+            header = np.memmap(self.path, dtype=HEADER, mode="r", shape=(1,))
+            if header["magic"][0] != MAGIC:
+                logger.warning("Zaman serisi dosyası tanınmadı, yeniden oluşturuluyor: %s", self.path)
+                del header
+                os.replace(self.path, f"{self.path}.bad")
+            else:
+                del header
+                self._map()
+                self._count = int(self._header["count"][0])
+                if self._count: self._last_ts = float(self._records["ts"][self._count - 1])
+                return
+        with open(self.path, "wb") as f:
+            f.write(np.array([(MAGIC, 0)], dtype=HEADER).tobytes())
+            f.truncate(HEADER.itemsize + capacity * RECORD.itemsize)
+        self._map()
+
+    def _map(self):
+        capacity = (os.path.getsize(self.path) - HEADER.itemsize) // RECORD.itemsize
+        self._header = np.memmap(self.path, dtype=HEADER, mode="r+", shape=(1,))
+        self._records = np.memmap(self.path, dtype=RECORD, mode="r+", offset=HEADER.itemsize, shape=(capacity,))
+
+    def _grow(self):
+        capacity = len(self._records) * 2
+        if not self.path:
+            self._records = np.resize(self._records, capacity)
+            return
+        self.flush()
+        self._header = self._records = None  # eşlemeler kapanmadan dosya büyütülmez
+        with open(self.path, "r+b") as f: f.truncate(HEADER.itemsize + capacity * RECORD.itemsize)
+        self._map()
+
+    def _rewrite(self, records):
+        """Sıkıştırma sonrası dosyayı geçici dosya + os.replace ile yeniden yazar."""
+        capacity = max(4096, len(records) * 2)
+        if not self.path:
+            self._records = np.zeros(capacity, dtype=RECORD)
+            self._records[:len(records)] = records
+        else:
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(np.array([(MAGIC, len(records))], dtype=HEADER).tobytes())
+                f.write(records.tobytes())
+                f.truncate(HEADER.itemsize + capacity * RECORD.itemsize)
+            self._header = self._records = None
+            os.replace(tmp, self.path)
+            self._map()
+        self._count = len(records)
+
+    def flush(self):
+        with self._lock:
+            if self.path and self._records is not None:
+                self._records.flush()
+                self._header.flush()
+
+    def _load_symbols(self):
+        try:
+            with open(f"{self.path}.json", encoding="utf-8") as f: data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning("Zaman serisi sembol tablosu okunamadı: %s", e)
+            return
+        self.series = [Series(*row) for row in data.get("series", [])]
+        self.values = data.get("values", [])
+        self._series_ids = {(s.source, s.entity_id, s.field): i for i, s in enumerate(self.series)}
+        self._value_codes = {v: i for i, v in enumerate(self.values)}
+        self._categorical = np.array([s.categorical for s in self.series], dtype=bool)
+
+    def _save_symbols(self):
+        if not self.path: return
+        tmp = f"{self.path}.json.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"series": [[s.source, s.entity_id, s.field, s.categorical] for s in self.series], "values": self.values},
+                          f, ensure_ascii=False)
+            os.replace(tmp, f"{self.path}.json")
+        except OSError as e:
+            logger.warning("Zaman serisi sembol tablosu yazılamadı: %s", e)
+
+    # --- yazma ---
+    def append(self, source, entity_id, field, value, ts=None):
+        """Tek bir örnek ekler; sayı olmayan değerler kategorik saklanır."""
+        number = _number(value)
+        with self._lock:
+            key = (source, entity_id, field)
+            sid = self._series_ids.get(key)
+            if sid is None:
+                sid = self._series_ids[key] = len(self.series)
+                self.series.append(Series(source, entity_id, field, number is None))
+                self._categorical = np.append(self._categorical, number is None)
+                self._save_symbols()
+            if self.series[sid].categorical:
+                text = str(value)
+                code = self._value_codes.get(text)
+                if code is None:
+                    code = self._value_codes[text] = len(self.values)
+                    self.values.append(text)
+                    self._save_symbols()
+                number = code
+            elif number is None: return  # sayısal seriye gelen metin (ör. "unavailable")
+            ts = max(time.time() if ts is None else ts, self._last_ts)  # zaman sırası korunur
+            if self._count == len(self._records): self._grow()
+            self._records[self._count] = (ts, sid, number)
+            self._count += 1
+            self._last_ts = ts
+            if self._header is not None: self._header["count"] = self._count
+
+    def on_state(self, entity_id, old, new):
+        """StateMirror dinleyicisi: yalnızca durum değişiklikleri kaydedilir (ilk okuma değişiklik sayılmaz)."""
+        if old is None: return
+        state = (new or {}).get("state")
+        if state in SKIP_STATES or state == (old or {}).get("state"): return
+        self.append("state", entity_id, "state", state)
+
+    def on_weather(self, reading):
+        for field in WEATHER_LABELS: self.append("weather", "ankara", field, getattr(reading, field), ts=reading.fetched_at)
+
+    def record_actions(self, actions, ts=None):
+        """Gönderilen plan eylemleri: durum kategorik, öznitelikler (parlaklık, sıcaklık...) sayısal."""
+        for action in actions:
+            entity_id = action.get("entity_id")
+            if not entity_id: continue
+            self.append("plan", entity_id, "state", action.get("state", "on"), ts)
+            for key, value in action.items():
+                if key not in ["entity_id", "state"] and _number(value) is not None: self.append("plan", entity_id, key, value, ts)
+
+    # --- okuma ---
+    def _view(self):
+        return self._records[:self._count]
+
+    def range(self, start=None, end=None, source=None, entity_id=None, field=None):
+        """[start, end) aralığındaki kayıtların kopyası; seri filtreleri isteğe bağlı."""
+        with self._lock:
+            records = self._view()
+            ts = records["ts"]
+            lo = 0 if start is None else bisect.bisect_left(ts, start)
+            hi = len(records) if end is None else bisect.bisect_left(ts, end, lo)
+            out = np.array(records[lo:hi])
+            ids = [i for i, s in enumerate(self.series) if (source is None or s.source == source)
+                   and (entity_id is None or s.entity_id == entity_id) and (field is None or s.field == field)]
+        if len(ids) != len(self.series): out = out[np.isin(out["series"], ids)]
+        return out
+
+    def decode(self, series_id, value):
+        return self.values[int(value)] if self.series[series_id].categorical else float(value)
+
+    def downsample(self, start, end, bucket=None, source="state", entity_id=None, field="state"):
+        """{seri: [(kova başlangıcı, değer)]}; sayısal seriler ortalama, kategorikler kovadaki son değer."""
+        bucket = bucket or self.bucket
+        out = {}
+        for row in _reduce(self.range(start, end, source, entity_id, field), bucket, self._categorical):
+            series = self.series[int(row["series"])]
+            out.setdefault(series, []).append((float(row["ts"]), self.decode(int(row["series"]), row["value"])))
+        return out
+
+    # --- bakım ---
+    def compact(self, now=None):
+        """Eski kayıtları kovalara indirger ve saklama süresini aşanları siler; silinen kayıt sayısını döner."""
+        now = time.time() if now is None else now
+        with self._lock:
+            records = self._view()
+            ts = records["ts"]
+            drop = bisect.bisect_left(ts, now - self.retention)
+            # Kova sınırına hizala ki aynı kova iki kez (kısmen) indirgenmesin
+            raw = bisect.bisect_left(ts, (now - self.raw_retention) // self.bucket * self.bucket, drop)
+            if not drop and not raw: return 0
+            reduced = _reduce(np.array(records[drop:raw]), self.bucket, self._categorical)
+            if drop == 0 and len(reduced) == raw: return 0  # zaten indirgenmiş
+            before, merged = self._count, np.concatenate([reduced, records[raw:]])
+            del records, ts  # eski eşlemeye referans kalmasın
+            self._rewrite(merged)
+        logger.info("Zaman serisi sıkıştırıldı: %d → %d kayıt", before, self._count)
+        return before - self._count
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="timeseries", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            try:
+                self.compact()
+                self.habit_summary(refresh=True)
+                self.flush()
+            except Exception:
+                logger.exception("Zaman serisi bakımı başarısız")
+            time.sleep(self.maintenance_interval)
+
+    # --- alışkanlık özeti ---
+    def habit_summary(self, now=None, refresh=False, max_items=6):
+        """Şu anki saat dilimi için önceden hesaplanmış kısa özet; saat değişince yeniden hesaplanır."""
+        now = time.time() if now is None else now
+        hour_start = now - now % 3600
+        cached_hour, text = self._habits
+        if cached_hour == hour_start and not refresh: return text
+        text = self._compute_habits(now, max_items)
+        self._habits = (hour_start, text)
+        return text
+
+    def _compute_habits(self, now, max_items):
+        offset = time.localtime(now).tm_gmtoff
+        local = now + offset
+        day0 = local // 86400 - self.habit_days
+        hour = int(local % 86400 // 3600)
+        records = self.range(now - (self.habit_days + 1) * 86400, now)
+        if not len(records): return ""
+        local_ts = records["ts"] + offset
+        days = (local_ts // 86400).astype(np.int64)
+        past = days < local // 86400  # bugün hariç
+        observed = len(np.unique(days[past]))
+        if observed < self.min_days: return ""
+        in_hour = past & ((local_ts % 86400 // 3600).astype(np.int64) == hour)
+        items = []  # (güven, metin)
+
+        for sid in np.unique(records["series"]):
+            series = self.series[int(sid)]
+            name = self.names.get(series.entity_id, series.entity_id)
+            mask = records["series"] == sid
+            if series.source == "plan":
+                # Bu saatte kaç farklı günde aynı komut verildi
+                sel = mask & in_hour
+                if not sel.any(): continue
+                if series.categorical:
+                    for code in np.unique(records["value"][sel]):
+                        n = len(np.unique(days[sel & (records["value"] == code)]))
+                        if n >= self.min_days:
+                            word = PLAN_WORDS.get(self.values[int(code)], f"→ {self.values[int(code)]}")
+                            items.append((n / observed, f"{name} bu saatte {word} ({n}/{observed} gün)"))
+                elif len(np.unique(days[sel])) >= self.min_days:
+                    label = ATTRIBUTE_LABELS.get(series.field, series.field)
+                    items.append((0.5, f"{name} {label} genelde {float(np.mean(records['value'][sel])):.0f}"))
+            elif series.categorical:
+                # Her gün bu saatin ortasındaki durum: o ana kadarki son değişiklik
+                ts, values = records["ts"][mask], records["value"][mask]
+                probes = (np.arange(day0, local // 86400) * 86400 + hour * 3600 + 1800 - offset).astype(np.float64)
+                idx = np.searchsorted(ts, probes, side="right") - 1
+                known = values[idx[idx >= 0]].astype(np.int64)
+                if len(known) < self.min_days: continue
+                counts = np.bincount(known)
+                code = int(counts.argmax())
+                share = counts[code] / len(known)
+                if share >= 0.6:
+                    word = STATE_WORDS.get(self.values[code], self.values[code])
+                    items.append((share, f"{name} genelde {word} (%{share * 100:.0f})"))
+            else:
+                sel = mask & in_hour
+                if len(np.unique(days[sel])) < self.min_days: continue
+                label = WEATHER_LABELS.get(series.field, series.field) if series.source == "weather" else name
+                items.append((0.4, f"{label} ort. {float(np.mean(records['value'][sel])):.1f}"))
+
+        if not items: return ""
+        items.sort(key=lambda item: -item[0])
+        head = f"{hour:02d}:00-{(hour + 1) % 24:02d}:00 (son {observed} gün)"
+        return f"{head}: " + "; ".join(text for _, text in items[:max_items])
+
+
+def _reduce(records, bucket, categorical):
+    """(kova, seri) gruplarına indirger: sayısal ortalama, kategorik son değer; zaman sıralı döner."""
+    if not len(records): return records
+    buckets = (records["ts"] // bucket).astype(np.int64)
+    order = np.lexsort((np.arange(len(records)), records["series"], buckets))
+    b, s, v = buckets[order], records["series"][order], records["value"][order].astype(np.float64)
+    starts = np.flatnonzero(np.r_[True, (b[1:] != b[:-1]) | (s[1:] != s[:-1])])
+    ends = np.r_[starts[1:], len(order)]
+    means = np.add.reduceat(v, starts) / (ends - starts)
+    last = v[ends - 1]
+    out = np.empty(len(starts), dtype=RECORD)
+    out["ts"] = b[starts] * bucket
+    out["series"] = s[starts]
+    out["value"] = np.where(categorical[s[starts]], last, means)
+    return out
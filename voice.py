@@ -0,0 +1,226 @@
+"""Sesli komut hattı: WAV çözme → sessizlik kırpma (VAD) → 16 kHz mono → tanıma.
+
+Tanıyıcılar takılabilir; sırayla denenir, kullanılamayan (paket/model yok,
+ağ yok) bir sonrakine bırakır:
+- "vosk": tamamen çevrimdışı (`pip install vosk` + Türkçe model, VOSK_MODEL_PATH)
+- "google": SpeechRecognition üzerinden Google Web Speech (ağ gerekir)
+"""
+import io
+import json
+import logging
+import time
+import wave
+from dataclasses import dataclass, field
+
+from resilience import CircuitOpen, retry
+
+logger = logging.getLogger(__name__)
+
+TARGET_RATE = 16000
+
+
+class RecognizerUnavailable(Exception):
+    """Tanıyıcı bu istek için kullanılamıyor (paket/model eksik, servis erişilemez)."""
+
+
+# --- ses işleme (numpy ilk ses kaydında yüklenir; karşılama sayfası onu beklemesin) ---
+def decode_wav(data):
+    """WAV baytlarını [-1, 1] aralığında float32 mono örneklere çevirir; (örnekler, hız) döner."""
+    import numpy as np
+    with wave.open(io.BytesIO(data), "rb") as wav:
+        rate, channels, width = wav.getframerate(), wav.getnchannels(), wav.getsampwidth()
+        raw = wav.readframes(wav.getnframes())
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768
+    elif width == 3:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        samples = np.where(ints >= 1 << 23, ints - (1 << 24), ints).astype(np.float32) / (1 << 23)
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648
+    else:
+        raise ValueError(f"Desteklenmeyen örnek genişliği: {width} bayt")
+    if channels > 1: samples = samples[: len(samples) // channels * channels].reshape(-1, channels).mean(axis=1)
+    return samples, rate
+
+
+def trim_silence(samples, rate, frame_ms=30, padding_ms=150, min_rms=0.01, ratio=3.0):
+    """Enerji tabanlı VAD: baştaki ve sondaki sessizliği atar.
+
+    Eşik, çerçeve RMS'lerinin alt %20'lik diliminden tahmin edilen gürültü
+    tabanının `ratio` katıdır (en az `min_rms`). Konuşma yoksa boş dizi döner.
+    """
+    import numpy as np
+    frame = max(1, rate * frame_ms // 1000)
+    count = len(samples) // frame
+    if count == 0: return samples[:0]
+    rms = np.sqrt(np.mean(samples[: count * frame].reshape(count, frame) ** 2, axis=1))
+    threshold = max(min_rms, float(np.percentile(rms, 20)) * ratio)
+    voiced = np.flatnonzero(rms > threshold)
+    if not len(voiced): return samples[:0]
+    pad = rate * padding_ms // 1000
+    start = max(0, voiced[0] * frame - pad)
+    end = min(len(samples), (voiced[-1] + 1) * frame + pad)
+    return samples[start:end]
+
+
+def resample(samples, rate, target=TARGET_RATE):
+    """Doğrusal aradeğerleme ile yeniden örnekler; küçültmede önce kutu filtreyle örtüşmeyi azaltır."""
+    if rate == target or not len(samples): return samples
+    import numpy as np
+    if rate > target:
+        width = int(np.ceil(rate / target))
+        if width > 1: samples = np.convolve(samples, np.ones(width, dtype=np.float32) / width, mode="same")
+    count = int(round(len(samples) * target / rate))
+    positions = np.arange(count, dtype=np.float64) * rate / target
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def to_pcm16(samples):
+    import numpy as np
+    return (np.clip(samples, -1, 1) * 32767).astype("<i2").tobytes()
+
+
+# --- tanıyıcılar ---
+class GoogleRecognizer:
+    name = "google"
+
+    def __init__(self, language="tr-TR", timeout=8, **_):
+        import speech_recognition as sr
+        self.sr = sr
+        self.language = language
+        self.recognizer = sr.Recognizer()
+        self.recognizer.operation_timeout = timeout  # varsayılanı sınırsız; servis yavaşlarsa arayüz donmasın
+
+    def recognize(self, pcm, rate):
+        try:
+            return self.recognizer.recognize_google(self.sr.AudioData(pcm, rate, 2), language=self.language)
+        except self.sr.UnknownValueError:
+            return None
+        except self.sr.RequestError as e:
+            raise RecognizerUnavailable(f"Google servisine ulaşılamadı: {e}") from e
+
+
+class VoskRecognizer:
+    name = "vosk"
+
+    def __init__(self, vosk_model_path=None, **_):
+        try:
+            import vosk
+        except ImportError as e:
+            raise RecognizerUnavailable("vosk paketi kurulu değil") from e
+        if not vosk_model_path: raise RecognizerUnavailable("VOSK_MODEL_PATH ayarlı değil")
+        vosk.SetLogLevel(-1)
+        self.vosk = vosk
+        try:
+            self.model = vosk.Model(vosk_model_path)  # bir kez yüklenir (yüzlerce MB olabilir)
+        except Exception as e:
+            raise RecognizerUnavailable(f"Vosk modeli yüklenemedi ({vosk_model_path}): {e}") from e
+
+    def recognize(self, pcm, rate):
+        rec = self.vosk.KaldiRecognizer(self.model, rate)
+        rec.AcceptWaveform(pcm)
+        return json.loads(rec.FinalResult()).get("text") or None
+
+
+BACKENDS = {"google": GoogleRecognizer, "vosk": VoskRecognizer}
+
+
+@dataclass
+class Transcription:
+    text: str = None
+    backend: str = None
+    duration: float = 0.0  # kaydın süresi (sn)
+    speech: float = 0.0  # VAD sonrası gönderilen süre (sn)
+    processing: float = 0.0  # toplam işleme süresi (sn)
+    timings: dict = field(default_factory=dict)  # aşama -> sn
+    error: str = None
+    status: str = "ok"  # ok | bad_audio | no_speech | unrecognized | unavailable
+
+    @property
+    def realtime_factor(self):
+        return self.processing / self.duration if self.duration else None
+
+    def summary(self):
+        line = f"🎧 {self.duration:.1f} sn kayıt ({self.speech:.1f} sn konuşma) · {self.processing:.2f} sn işleme"
+        if self.backend: line += f" · {self.backend}"
+        return line
+
+
+class VoicePipeline:
+    """Arka uçları `names` sırasıyla dener; yüklenemeyen arka uç bir daha denenmez."""
+
+    def __init__(self, names=("google",), target_rate=TARGET_RATE, vad=True, breakers=None, retries=1, **options):
+        self.names = [n.strip() for n in names if n.strip()]
+        self.target_rate = target_rate
+        self.vad = vad
+        self.breakers = breakers  # resilience.CircuitBreakers; arka uç başına "stt_<ad>" devresi
+        self.retries = retries
+        self.options = options
+        self._backends = {}  # ad -> örnek ya da None (kullanılamaz)
+
+    def backend(self, name):
+        if name not in self._backends:
+            try:
+                self._backends[name] = BACKENDS[name](**self.options)
+            except KeyError:
+                logger.warning("Bilinmeyen ses tanıma arka ucu: %s", name)
+                self._backends[name] = None
+            except (RecognizerUnavailable, ImportError) as e:
+                logger.warning("Ses tanıma arka ucu '%s' kullanılamıyor: %s", name, e)
+                self._backends[name] = None
+        return self._backends[name]
+
+    def transcribe(self, audio_bytes):
+        result = Transcription()
+        start = time.perf_counter()
+
+        def mark(stage, t0):
+            result.timings[stage] = time.perf_counter() - t0
+            return time.perf_counter()
+
+        t = time.perf_counter()
+        try:
+            samples, rate = decode_wav(audio_bytes)
+        except (wave.Error, EOFError, ValueError) as e:
+            result.error, result.status = f"Ses kaydı çözülemedi: {e}", "bad_audio"
+            result.processing = time.perf_counter() - start
+            return result
+        result.duration = len(samples) / rate if rate else 0.0
+        t = mark("decode", t)
+        if self.vad: samples = trim_silence(samples, rate)
+        result.speech = len(samples) / rate if rate else 0.0
+        t = mark("vad", t)
+        if not len(samples):
+            result.error, result.status = "Konuşma algılanmadı", "no_speech"
+            result.processing = time.perf_counter() - start
+            return result
+        pcm = to_pcm16(resample(samples, rate, self.target_rate))
+        t = mark("resample", t)
+
+        for name in self.names:
+            backend = self.backend(name)
+            if backend is None: continue
+            recognize = lambda: backend.recognize(pcm, self.target_rate)
+            if self.breakers is not None:
+                breaker = self.breakers.get(f"stt_{name}")
+                recognize = lambda recognize=recognize: breaker.call(recognize)
+            try:
+                # Tanıma yan etkisizdir; geçici hatada sınırlı yeniden denenir, devre açıksa sıradakine geçilir
+                result.text, result.backend = retry(recognize, attempts=1 + self.retries), name
+                break
+            except (RecognizerUnavailable, CircuitOpen) as e:
+                logger.warning("Ses tanıma (%s) başarısız, sıradaki deneniyor: %s", name, e)
+                result.error = str(e)
+        else:
+            result.error, result.status = result.error or "Kullanılabilir ses tanıma arka ucu yok", "unavailable"
+        if result.backend:
+            result.error = None
+            if not result.text: result.status = "unrecognized"
+        mark("recognize", t)
+        result.processing = time.perf_counter() - start
+        logger.info("STT: %.2f sn kayıt, %.2f sn konuşma, %.3f sn işleme (%s)",
+                    result.duration, result.speech, result.processing, result.backend or result.error)
+        return result
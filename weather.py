@@ -0,0 +1,125 @@
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+import requests
+
+from resilience import CircuitOpen, retry
+
+logger = logging.getLogger(__name__)
+
+OPENWEATHER_URL = "http://api.openweathermap.org/data/2.5/weather"
+
+
+@dataclass(frozen=True)
+class WeatherReading:
+    temp: float
+    desc: str
+    hum: int
+    wind: float
+    fetched_at: float = None  # time.time(); simülasyonda None
+    simulated: bool = False
+
+    def age(self, now=None):
+        if self.fetched_at is None: return None
+        return max(0.0, (now or time.time()) - self.fetched_at)
+
+    def age_text(self):
+        age = self.age()
+        if age is None: return "simülasyon"
+        if age < 60: return "az önce"
+        if age < 3600: return f"{int(age // 60)} dk önce"
+        return f"{int(age // 3600)} sa önce"
+
+
+SIMULATED_READING = WeatherReading(22.0, "parçalı bulutlu (simülasyon)", 45, 12, simulated=True)
+
+
+class WeatherCache:
+    """Süreç genelinde paylaşılan hava durumu önbelleği.
+
+    get() ağa hiç çıkmaz; eskimiş veri varsa onu döndürür ve arka plandaki tek
+    yenileyici thread'i uyandırır (stale-while-revalidate).
+    """
+
+    def __init__(self, api_key, city="Ankara", ttl=600, timeout=3, retry_after=30, session=None, url=OPENWEATHER_URL,
+                 breaker=None, retries=1):
+        self.api_key = api_key
+        self.url = url
+        self.city = city
+        self.ttl = ttl
+        self.timeout = timeout
+        self.retry_after = min(retry_after, ttl)
+        self.session = session or requests.Session()
+        self.breaker = breaker
+        self.retries = retries
+        self._reading = None  # son başarılı okuma
+        self._listeners = []
+        self.failures = 0
+        self._last_attempt = 0.0
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None and self.api_key:
+                self._thread = threading.Thread(target=self._run, name="weather-refresher", daemon=True)
+                self._thread.start()
+        return self
+
+    def add_listener(self, callback):
+        """callback(WeatherReading) her başarılı okumada (arka plan thread'inde) çağrılır; mevcut okuma hemen iletilir."""
+        self._listeners.append(callback)
+        if self._reading is not None: callback(self._reading)
+        return self
+
+    def get(self):
+        reading = self._reading
+        stale = reading is None or reading.age() >= self.ttl
+        if stale and time.time() - self._last_attempt >= self.retry_after:
+            self._wakeup.set()
+        return reading or SIMULATED_READING
+
+    def refresh(self):
+        self._last_attempt = time.time()
+        params = {"q": self.city, "appid": self.api_key, "units": "metric", "lang": "tr"}
+
+        def fetch():
+            resp = self.session.get(self.url, params=params, timeout=self.timeout)
+            resp.raise_for_status()
+            return resp.json()
+
+        # GET idempotenttir: sınırlı jitter'lı yeniden deneme; devre açıksa hiç istek atılmaz
+        data = retry(fetch if self.breaker is None else lambda: self.breaker.call(fetch), attempts=1 + self.retries)
+        if not data.get("main"):
+            raise ValueError(f"Beklenmeyen hava durumu yanıtı: {data.get('message', data)}")
+        self._reading = WeatherReading(
+            temp=data["main"]["temp"],
+            desc=data["weather"][0]["description"],
+            hum=data["main"].get("humidity", 50),
+            wind=data.get("wind", {}).get("speed", 10),
+            fetched_at=time.time(),
+        )
+        for callback in self._listeners:
+            try:
+                callback(self._reading)
+            except Exception:
+                logger.exception("Hava durumu dinleyicisi hata verdi")
+        return self._reading
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+                wait = self.ttl
+            except CircuitOpen as e:
+                logger.info("Hava durumu atlandı: %s", e)
+                wait = max(1.0, e.breaker.retry_in())
+            except Exception as e:
+                logger.warning("Hava durumu alınamadı: %s", e)
+                self.failures += 1
+                wait = self.retry_after
+            self._wakeup.wait(wait)
+            self._wakeup.clear()